@@ -29,6 +29,11 @@ output "gm_public_ip" {
   value       = aws_eip.gm_eip.public_ip
 }
 
+output "gm_lan1_private_ip" {
+  description = "LAN1 address the Grid Master registers with in CSP"
+  value       = aws_network_interface.gm_lan1.private_ip
+}
+
 output "client_2_public_ip" {
   description = "Public IP for Windows client VM #2 (RDP access)"
   value       = aws_eip.client_2_eip.public_ip
@@ -13,184 +13,238 @@ Usage in Instruqt:
    - INSTRUQT_TRACK_SLUG (provided by Instruqt - lab identifier)
 
 2. Run this script in your Instruqt track setup
-3. Script will allocate a sandbox and save IDs to files
+3. Script will allocate a sandbox and save IDs to lab_state.json
 """
 
 import os
 import sys
 import time
-import random
 import requests
 
+from http_retry import BackoffPolicy, server_delay
+from lab_files import write_atomic
+from lab_state import LabState, STATE_FILE
+import lab_trace
+
 # ----------------------------------
 # Configuration
 # ----------------------------------
-BROKER_API_URL = os.environ.get(
-    "BROKER_API_URL",
-    "https://api-sandbox-broker.highvelocitynetworking.com/v1"
-)
-BROKER_API_TOKEN = os.environ.get("BROKER_API_TOKEN")
-
-# Instruqt provides these automatically
-INSTRUQT_SANDBOX_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID")
-INSTRUQT_TRACK_ID = os.environ.get("INSTRUQT_TRACK_SLUG", "unknown-lab")
-
+DEFAULT_BROKER_API_URL = "https://api-sandbox-broker.highvelocitynetworking.com/v1"
+DEFAULT_TRACK_ID = "unknown-lab"
 # Optional: Filter sandboxes by name prefix (e.g., "lab-adventure")
-SANDBOX_NAME_PREFIX = os.environ.get("SANDBOX_NAME_PREFIX", "lab")
-
-# Startup jitter (avoid collision when multiple students start simultaneously)
-time.sleep(random.uniform(1, 5))
-
-# ----------------------------------
-# Validation
-# ----------------------------------
-if not BROKER_API_TOKEN:
-    print("❌ BROKER_API_TOKEN environment variable not set", flush=True)
-    sys.exit(1)
-
-if not INSTRUQT_SANDBOX_ID:
-    print("❌ INSTRUQT_PARTICIPANT_ID not found (are you running in Instruqt?)", flush=True)
-    sys.exit(1)
+DEFAULT_NAME_PREFIX = "lab"
+
+# Contention signals from the broker: back off (with jitter) only when these
+# show up, instead of sleeping unconditionally before the first attempt
+CONTENTION_STATUSES = {403, 429}
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+
+
+class AllocationError(Exception):
+    """Allocation failed for good (pool exhausted, bad request, retries used up)"""
+
+    def __init__(self, message, stats=None):
+        super().__init__(message)
+        self.stats = stats
+
+
+def contention_signalled(resp) -> bool:
+    return resp.status_code in CONTENTION_STATUSES or server_delay(resp) is not None
+
+
+def allocate_sandbox(broker_url, token, participant_id, track_id, name_prefix=None,
+                     max_retries=5, session=None, policy=None, sleep=None):
+    """
+    Allocate a sandbox from the broker.
+    Returns (allocation_response, stats) where stats has attempts, retries,
+    waited and elapsed seconds and the HTTP status of every attempt.
+    Raises AllocationError on failure.
+    """
+    http = session or requests
+    sleep = sleep or time.sleep
+    policy = policy or BackoffPolicy(base_delay=1.0, max_delay=30.0)
+    allocate_url = f"{broker_url}/allocate"
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+        "X-Instruqt-Sandbox-ID": participant_id,
+        "X-Instruqt-Track-ID": track_id,
+    }
+
+    # Add optional name prefix filter
+    if name_prefix:
+        headers["X-Sandbox-Name-Prefix"] = name_prefix
+
+    stats = {"attempts": 0, "retries": 0, "waited": 0.0, "statuses": [], "elapsed": 0.0}
+    start = time.monotonic()
+
+    def backoff(reason, resp=None):
+        if stats["attempts"] >= max_retries:
+            print(f"⚠️ {reason}", flush=True)
+            return
+        delay = policy.next_delay(resp)
+        print(f"⚠️ {reason}, retrying in {delay:.1f}s...", flush=True)
+        stats["retries"] += 1
+        stats["waited"] += delay
+        sleep(delay)
 
-print(f"🎓 Student: {INSTRUQT_SANDBOX_ID}", flush=True)
-print(f"📚 Lab: {INSTRUQT_TRACK_ID}", flush=True)
-if SANDBOX_NAME_PREFIX:
-    print(f"🔍 Filter: Only allocate sandboxes starting with '{SANDBOX_NAME_PREFIX}'", flush=True)
-
-# ----------------------------------
-# Allocate Sandbox from Broker
-# ----------------------------------
-allocate_url = f"{BROKER_API_URL}/allocate"
-headers = {
-    "Authorization": f"Bearer {BROKER_API_TOKEN}",
-    "Content-Type": "application/json",
-    "X-Instruqt-Sandbox-ID": INSTRUQT_SANDBOX_ID,
-    "X-Instruqt-Track-ID": INSTRUQT_TRACK_ID,
-}
-
-# Add optional name prefix filter
-if SANDBOX_NAME_PREFIX:
-    headers["X-Sandbox-Name-Prefix"] = SANDBOX_NAME_PREFIX
-
-max_retries = 5
-retryable_statuses = {500, 502, 503, 504}
-
-allocation_response = None
-for attempt in range(max_retries):
     try:
-        print(f"🔄 Allocation attempt {attempt + 1}/{max_retries}...", flush=True)
-
-        resp = requests.post(
-            allocate_url,
-            headers=headers,
-            timeout=(5, 30),  # connect=5s, read=30s
-        )
-
-        if resp.status_code in (200, 201):
-            allocation_response = resp.json()
-            status_emoji = "✅" if resp.status_code == 201 else "🔄"
-            print(f"{status_emoji} Sandbox allocated (HTTP {resp.status_code})", flush=True)
-            break
-
-        elif resp.status_code == 409:
-            print("❌ Pool exhausted: No sandboxes available", flush=True)
-            sys.exit(1)
-
-        elif resp.status_code == 403:
-            print("⚠️ Rate limited by WAF, waiting before retry...", flush=True)
-            time.sleep(10)
-            continue
-
-        elif resp.status_code in retryable_statuses:
-            print(f"⚠️ Server error {resp.status_code}, retrying...", flush=True)
-            sleep_time = min(2 ** attempt + random.uniform(0, 1), 30)
-            time.sleep(sleep_time)
-            continue
-
-        else:
-            print(f"❌ Allocation failed with HTTP {resp.status_code}", flush=True)
-            print(f"   Response: {resp.text}", flush=True)
-            sys.exit(1)
-
-    except requests.exceptions.Timeout:
-        print(f"⚠️ Request timeout, retrying...", flush=True)
-        sleep_time = min(2 ** attempt + random.uniform(0, 1), 30)
-        time.sleep(sleep_time)
-
-    except Exception as e:
-        print(f"⚠️ Unexpected error: {e}", flush=True)
-        sleep_time = min(2 ** attempt + random.uniform(0, 1), 30)
-        time.sleep(sleep_time)
-
-else:
-    print("❌ Sandbox allocation failed after all retries", flush=True)
-    sys.exit(1)
-
-# ----------------------------------
-# Extract IDs from Response
-# ----------------------------------
-sandbox_id = allocation_response.get("sandbox_id")
-external_id = allocation_response.get("external_id")
-sandbox_name = allocation_response.get("name")
-expires_at = allocation_response.get("expires_at")
-
-if not sandbox_id or not external_id:
-    print("❌ Invalid response: missing sandbox_id or external_id", flush=True)
-    print(f"   Response: {allocation_response}", flush=True)
-    sys.exit(1)
-
-if external_id and "/" in external_id:
-    external_id = external_id.split("/")[-1]
-
-# ----------------------------------
-# Save to Files (UPDATED)
-# ----------------------------------
-
-# 1️⃣ Save sandbox_id to subtenant_id.txt
-with open("subtenant_id.txt", "w") as f:
-    f.write(sandbox_id)
-print(f"✅ Subtenant ID saved to subtenant_id.txt: {sandbox_id}", flush=True)
-
-# 2️⃣ Save external_id to external_id.txt
-with open("external_id.txt", "w") as f:
-    f.write(external_id)
-print(f"✅ External ID saved to external_id.txt: {external_id}", flush=True)
-
-# 3️⃣ Also save external_id again into sandbox_id.txt
-with open("sandbox_id.txt", "w") as f:
-    f.write(external_id)
-print(f"✅ Sandbox ID saved to sandbox_id.txt (same as external_id): {external_id}", flush=True)
-
-# 4️⃣ Save sandbox name
-with open("sandbox_name.txt", "w") as f:
-    f.write(sandbox_name)
-print(f"✅ Sandbox name saved to sandbox_name.txt: {sandbox_name}", flush=True)
-
-# ----------------------------------
-# Export as Environment Variables
-# ----------------------------------
-ENV_SCRIPT = "sandbox_env.sh"
-with open(ENV_SCRIPT, "w") as f:
-    f.write(f"#!/bin/bash\n")
-    f.write(f"# Auto-generated by instruqt_broker_allocation.py\n")
-    f.write(f"export STUDENT_TENANT={sandbox_name}\n")
-    f.write(f"export CSP_ACCOUNT_ID={external_id}\n")
-    f.write(f"export BROKER_SANDBOX_ID={sandbox_id}\n")
-
-print(f"\n💡 To use these variables in bash:", flush=True)
-print(f"   source {ENV_SCRIPT}", flush=True)
-print(f"\n   Or for Instruqt (persists across steps):", flush=True)
-print(f"   set-var STUDENT_TENANT {sandbox_name}", flush=True)
-print(f"   set-var CSP_ACCOUNT_ID {external_id}", flush=True)
-print(f"   set-var BROKER_SANDBOX_ID {sandbox_id}", flush=True)
-
-# ----------------------------------
-# Summary
-# ----------------------------------
-print("\n" + "="*60, flush=True)
-print("🎉 Sandbox Allocation Complete!", flush=True)
-print(f"   Name: {sandbox_name}", flush=True)
-print(f"   Subtenant ID: {sandbox_id}", flush=True)
-print(f"   External ID: {external_id} (use this to connect to CSP)", flush=True)
-print(f"   Expires: {time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime(expires_at))}", flush=True)
-print("="*60, flush=True)
+        for attempt in range(max_retries):
+            stats["attempts"] += 1
+            try:
+                print(f"🔄 Allocation attempt {attempt + 1}/{max_retries}...", flush=True)
+
+                resp = http.post(
+                    allocate_url,
+                    headers=headers,
+                    timeout=(5, 30),  # connect=5s, read=30s
+                )
+                stats["statuses"].append(resp.status_code)
+
+                if resp.status_code in (200, 201):
+                    status_emoji = "✅" if resp.status_code == 201 else "🔄"
+                    print(f"{status_emoji} Sandbox allocated (HTTP {resp.status_code})", flush=True)
+                    return resp.json(), stats
+
+                elif resp.status_code == 409:
+                    raise AllocationError("❌ Pool exhausted: No sandboxes available")
+
+                elif contention_signalled(resp):
+                    backoff(f"Broker signalled contention (HTTP {resp.status_code})", resp)
+                    continue
+
+                elif resp.status_code in RETRYABLE_STATUSES:
+                    backoff(f"Server error {resp.status_code}", resp)
+                    continue
+
+                else:
+                    raise AllocationError(f"❌ Allocation failed with HTTP {resp.status_code}\n   Response: {resp.text}")
+
+            except requests.exceptions.Timeout:
+                stats["statuses"].append("timeout")
+                backoff("Request timeout")
+
+            except AllocationError:
+                raise
+
+            except Exception as e:
+                stats["statuses"].append("error")
+                backoff(f"Unexpected error: {e}")
+
+        raise AllocationError("❌ Sandbox allocation failed after all retries")
+    except AllocationError as e:
+        e.stats = stats
+        raise
+    finally:
+        stats["elapsed"] = time.monotonic() - start
+        print(f"⏱️  Allocation took {stats['elapsed']:.2f}s "
+              f"({stats['attempts']} attempts, {stats['waited']:.1f}s backing off)", flush=True)
+
+
+def allocate_participant(broker_url, token, participant_id, track_id, name_prefix=None, state_file=STATE_FILE):
+    """
+    Allocate a sandbox for the participant and record it in lab state.
+    Returns the allocation response; raises AllocationError on failure.
+    """
+    print(f"🎓 Student: {participant_id}", flush=True)
+    print(f"📚 Lab: {track_id}", flush=True)
+    if name_prefix:
+        print(f"🔍 Filter: Only allocate sandboxes starting with '{name_prefix}'", flush=True)
+
+    allocation_response, _ = allocate_sandbox(broker_url, token, participant_id, track_id, name_prefix)
+    write_allocation(allocation_response, state_file)
+    return allocation_response
+
+
+def main():
+    # ----------------------------------
+    # Validation
+    # ----------------------------------
+    broker_url = os.environ.get("BROKER_API_URL", DEFAULT_BROKER_API_URL)
+    token = os.environ.get("BROKER_API_TOKEN")
+    # Instruqt provides these automatically
+    participant_id = os.environ.get("INSTRUQT_PARTICIPANT_ID")
+    track_id = os.environ.get("INSTRUQT_TRACK_SLUG", DEFAULT_TRACK_ID)
+    name_prefix = os.environ.get("SANDBOX_NAME_PREFIX", DEFAULT_NAME_PREFIX)
+
+    if not token:
+        print("❌ BROKER_API_TOKEN environment variable not set", flush=True)
+        sys.exit(1)
+
+    if not participant_id:
+        print("❌ INSTRUQT_PARTICIPANT_ID not found (are you running in Instruqt?)", flush=True)
+        sys.exit(1)
+
+    # ----------------------------------
+    # Allocate Sandbox from Broker
+    # ----------------------------------
+    try:
+        allocate_participant(broker_url, token, participant_id, track_id, name_prefix)
+    except AllocationError as e:
+        print(str(e), flush=True)
+        sys.exit(1)
+
+
+def write_allocation(allocation_response, state_file=STATE_FILE):
+    # ----------------------------------
+    # Extract IDs from Response
+    # ----------------------------------
+    sandbox_id = allocation_response.get("sandbox_id")
+    external_id = allocation_response.get("external_id")
+    sandbox_name = allocation_response.get("name")
+    expires_at = allocation_response.get("expires_at")
+
+    if not sandbox_id or not external_id:
+        raise AllocationError("❌ Invalid response: missing sandbox_id or external_id\n"
+                              f"   Response: {allocation_response}")
+
+    if external_id and "/" in external_id:
+        external_id = external_id.split("/")[-1]
+
+    # ----------------------------------
+    # Save State (single atomic JSON document)
+    # ----------------------------------
+    LabState(
+        subtenant_id=sandbox_id,
+        external_id=external_id,
+        sandbox_name=sandbox_name,
+        expires_at=expires_at,
+    ).save(state_file)
+    print(f"✅ Allocation saved to {state_file}", flush=True)
+    print(f"   Subtenant ID: {sandbox_id}", flush=True)
+    print(f"   External ID: {external_id}", flush=True)
+    print(f"   Sandbox name: {sandbox_name}", flush=True)
+
+    # ----------------------------------
+    # Export as Environment Variables
+    # ----------------------------------
+    ENV_SCRIPT = "sandbox_env.sh"
+    write_atomic(ENV_SCRIPT, (
+        f"#!/bin/bash\n"
+        f"# Auto-generated by allocation_broker_subtenant.py\n"
+        f"export STUDENT_TENANT={sandbox_name}\n"
+        f"export CSP_ACCOUNT_ID={external_id}\n"
+        f"export BROKER_SANDBOX_ID={sandbox_id}\n"
+    ))
+    print(f"\n💡 To use these variables in bash:", flush=True)
+    print(f"   source {ENV_SCRIPT}", flush=True)
+    print(f"\n   Or for Instruqt (persists across steps):", flush=True)
+    print(f"   set-var STUDENT_TENANT {sandbox_name}", flush=True)
+    print(f"   set-var CSP_ACCOUNT_ID {external_id}", flush=True)
+    print(f"   set-var BROKER_SANDBOX_ID {sandbox_id}", flush=True)
+
+    # ----------------------------------
+    # Summary
+    # ----------------------------------
+    print("\n" + "="*60, flush=True)
+    print("🎉 Sandbox Allocation Complete!", flush=True)
+    print(f"   Name: {sandbox_name}", flush=True)
+    print(f"   Subtenant ID: {sandbox_id}", flush=True)
+    print(f"   External ID: {external_id} (use this to connect to CSP)", flush=True)
+    print(f"   Expires: {time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime(expires_at))}", flush=True)
+    print("="*60, flush=True)
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
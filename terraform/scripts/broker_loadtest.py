@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Concurrent allocation load test against the sandbox broker (or the local
+stand-in from broker_stub.py).
+
+Runs N copies of the allocation_broker_subtenant.py logic at once, one thread
+and one connection per simulated student, and reports the latency
+distribution, retries, failures and duplicate allocations.
+
+Usage:
+  python3 broker_loadtest.py --students 300 --pool-size 300 --waf-limit 50 --error-rate 0.02
+  python3 broker_loadtest.py --url http://127.0.0.1:8080/v1 --students 300 --spread 10
+"""
+
+import io
+import sys
+import time
+import random
+import argparse
+import contextlib
+import collections
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+from allocation_broker_subtenant import allocate_sandbox, AllocationError
+from broker_stub import BrokerStub
+import lab_trace
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+
+def run_student(url, token, index, spread, max_retries):
+    time.sleep(random.uniform(0, spread))
+    participant_id = f"loadtest-{index:04d}"
+    session = requests.Session()
+    start = time.monotonic()
+    try:
+        response, stats = allocate_sandbox(url, token, participant_id, "loadtest",
+                                           max_retries=max_retries, session=session)
+        return {"participant": participant_id, "ok": True, "sandbox_id": response.get("sandbox_id"),
+                "elapsed": stats["elapsed"], "retries": stats["retries"], "statuses": stats["statuses"]}
+    except AllocationError as e:
+        stats = e.stats or {"elapsed": time.monotonic() - start, "retries": 0, "statuses": []}
+        return {"participant": participant_id, "ok": False, "error": str(e).splitlines()[0],
+                "elapsed": stats["elapsed"], "retries": stats["retries"], "statuses": stats["statuses"]}
+    finally:
+        session.close()
+
+
+def report(results, wall):
+    ok = [r for r in results if r["ok"]]
+    failed = [r for r in results if not r["ok"]]
+    latencies = [r["elapsed"] for r in ok]
+    owners = collections.defaultdict(list)
+    for r in ok:
+        owners[r["sandbox_id"]].append(r["participant"])
+    duplicates = {sid: p for sid, p in owners.items() if len(p) > 1}
+    statuses = collections.Counter(s for r in results for s in r["statuses"])
+    errors = collections.Counter(r["error"] for r in failed)
+
+    print("\n" + "=" * 60)
+    print(f"Students:     {len(results)}  (wall time {wall:.1f}s)")
+    print(f"Allocated:    {len(ok)}")
+    print(f"Failed:       {len(failed)}")
+    for error, count in errors.most_common():
+        print(f"   {count:4d} x {error}")
+    print(f"Duplicates:   {len(duplicates)}")
+    for sandbox_id, participants in duplicates.items():
+        print(f"   {sandbox_id}: {', '.join(participants)}")
+    print(f"Retries:      {sum(r['retries'] for r in results)}")
+    print(f"HTTP status:  {dict(statuses)}")
+    if latencies:
+        print("Latency (s):  "
+              f"p50={percentile(latencies, 50):.2f}  p90={percentile(latencies, 90):.2f}  "
+              f"p99={percentile(latencies, 99):.2f}  max={max(latencies):.2f}")
+    print("=" * 60)
+    return 1 if failed or duplicates else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent broker allocation load test')
+    parser.add_argument('--url', default=None, help='Broker API URL (default: start a local stand-in)')
+    parser.add_argument('--token', default='loadtest', help='Broker API token (default: loadtest)')
+    parser.add_argument('--students', type=int, default=300, help='Concurrent allocations (default: 300)')
+    parser.add_argument('--spread', type=float, default=0.0, help='Spread student start over N seconds (default: 0)')
+    parser.add_argument('--max-retries', type=int, default=5, help='Attempts per student (default: 5)')
+    parser.add_argument('--verbose', action='store_true', help='Show per-attempt output of every student')
+    stub_opts = parser.add_argument_group('local stand-in (when --url is not set)')
+    stub_opts.add_argument('--pool-size', type=int, default=300, help='Sandboxes in the pool (default: 300)')
+    stub_opts.add_argument('--waf-limit', type=int, default=0, help='Requests/second before 403 (default: off)')
+    stub_opts.add_argument('--error-rate', type=float, default=0.0, help='Probability of HTTP 503 (default: 0)')
+    stub_opts.add_argument('--latency', type=int, default=50, help='Base latency in ms (default: 50)')
+    args = parser.parse_args()
+
+    stub = None
+    url = args.url
+    if not url:
+        stub = BrokerStub(pool_size=args.pool_size, waf_limit=args.waf_limit,
+                          error_rate=args.error_rate, latency_ms=args.latency).start()
+        url = stub.url
+        print(f"Started local broker stand-in on {url} (pool={args.pool_size})")
+
+    print(f"Allocating for {args.students} students against {url}...", flush=True)
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.monotonic()
+    with output, ThreadPoolExecutor(max_workers=args.students) as pool:
+        results = list(pool.map(
+            lambda i: run_student(url, args.token, i, args.spread, args.max_retries),
+            range(args.students),
+        ))
+    wall = time.monotonic() - start
+
+    if stub:
+        print(f"Stand-in stats: {stub.state.stats()}")
+        stub.stop()
+    sys.exit(report(results, wall))
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Broker pool watermark monitor with predictive pre-warming.
+
+Polls the broker for available and allocated sandboxes, estimates the
+allocation arrival rate over a moving window and forecasts when the pool
+runs dry. When the expected demand over the provisioning lead time exceeds
+what is available (plus accounts already being created), extra sandbox
+accounts are created ahead of demand with SandboxAccountAPI.create_many,
+using the name prefix the broker allocates from. --min-available is a low
+watermark: the pool is topped up to it even while the observed rate is
+still zero, so a start-of-event spike does not drain the pool before the
+rate catches up.
+
+Over-provisioning is bounded: creation per cycle and per run is capped,
+and freshly created accounts count as in flight until the broker has had
+time to pick them up. With --reclaim, once a full window has been observed,
+pre-warmed accounts the broker still lists as available beyond the forecast
+demand plus --min-available are deleted again, capped per cycle.
+
+Usage:
+  export BROKER_API_TOKEN=... Infoblox_Token=...
+  python3 broker_pool_monitor.py --name-prefix lab --window 300 --lead-time 600
+  python3 broker_pool_monitor.py --reclaim --min-available 20
+  python3 broker_pool_monitor.py --dry-run --log pool.csv
+"""
+
+import os
+import sys
+import math
+import time
+import argparse
+import collections
+import requests
+
+from allocation_broker_subtenant import DEFAULT_BROKER_API_URL
+from cleanup_broker_allocation import ReleaseError, broker_headers, list_sandboxes, query_sandboxes
+from create_sandbox import sandbox_request_body
+from http_retry import RetryingSession
+from sandbox_api import SandboxAccountAPI
+import lab_trace
+
+CSP_URL = "https://csp.infoblox.com/v2"
+PREWARM_MARK = "-pw-"   # in the names of accounts this monitor creates
+
+
+class PoolForecaster:
+    """Moving-window arrival rate and shortfall forecast for the broker pool"""
+
+    def __init__(self, window=300.0, lead_time=600.0, safety=1.5):
+        self.window = window
+        self.lead_time = lead_time
+        self.safety = safety
+        self.samples = collections.deque()   # (time, cumulative allocations)
+        self.arrivals = 0
+        self.available = 0
+        self._last_allocated = None
+
+    def observe(self, available, allocated, now=None):
+        now = time.monotonic() if now is None else now
+        if self._last_allocated is not None and allocated > self._last_allocated:
+            # Releases lower the allocated count; only increases are arrivals
+            self.arrivals += allocated - self._last_allocated
+        self._last_allocated = allocated
+        self.available = available
+        self.samples.append((now, self.arrivals))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= self.window:
+            self.samples.popleft()
+
+    def arrival_rate(self):
+        """Allocations per second over the window"""
+        if len(self.samples) < 2:
+            return 0.0
+        (t0, a0), (t1, a1) = self.samples[0], self.samples[-1]
+        return (a1 - a0) / (t1 - t0) if t1 > t0 else 0.0
+
+    def seconds_to_exhaustion(self):
+        rate = self.arrival_rate()
+        return self.available / rate if rate > 0 else math.inf
+
+    def demand(self):
+        """Allocations expected over the lead time, with the safety factor"""
+        return self.arrival_rate() * self.lead_time * self.safety
+
+    def warmed_up(self):
+        """True once the samples span a full window"""
+        return len(self.samples) >= 2 and self.samples[-1][0] - self.samples[0][0] >= self.window
+
+    def shortfall(self, in_flight=0, min_available=0):
+        """Accounts to create now to cover demand over the lead time, and at least min_available"""
+        return max(0, math.ceil(max(self.demand(), min_available) - self.available - in_flight))
+
+    def surplus(self, keep=0):
+        """Available accounts beyond the demand over the lead time plus `keep`"""
+        return max(0, self.available - math.ceil(self.demand()) - keep)
+
+
+def pool_depth(http, broker_url, headers, name_prefix=None):
+    available = query_sandboxes(http, broker_url, headers, "available", name_prefix)
+    allocated = query_sandboxes(http, broker_url, headers, "allocated", name_prefix)
+    return len(available), len(allocated)
+
+
+def prewarm(api, count, name_prefix, admin_email, workers=8):
+    """Create `count` sandbox accounts the broker can allocate; returns how many succeeded"""
+    stamp = time.strftime("%Y%m%d%H%M%S", time.gmtime())
+    bodies = [sandbox_request_body(f"{name_prefix}{PREWARM_MARK}{stamp}-{i:03d}", admin_email)
+              for i in range(count)]
+    results = api.create_many(bodies, workers=workers)
+    return sum(1 for r in results if r.get("status") == "success")
+
+
+def reclaimable(http, broker_url, headers, name_prefix):
+    """CSP account ids of pre-warmed sandboxes the broker still lists as available, newest first"""
+    items = list_sandboxes(http, broker_url, headers, "available", f"{name_prefix}{PREWARM_MARK}")
+    items.sort(key=lambda item: item.get("name") or "", reverse=True)
+    ids = [(item.get("external_id") or "").split("/")[-1] for item in items]
+    return [i for i in ids if i]
+
+
+def reclaim(api, account_ids, workers=8):
+    """Delete surplus pre-warmed accounts; returns how many were deleted"""
+    return sum(api.delete_many(account_ids, workers=workers).values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Forecast broker pool exhaustion and pre-warm sandboxes')
+    parser.add_argument('--url', default=os.environ.get("BROKER_API_URL", DEFAULT_BROKER_API_URL),
+                        help='Broker API URL (default: $BROKER_API_URL or the production broker)')
+    parser.add_argument('--name-prefix', default=os.environ.get("SANDBOX_NAME_PREFIX", "lab"),
+                        help='Sandbox name prefix the broker allocates from (default: lab)')
+    parser.add_argument('--interval', type=float, default=15, help='Seconds between polls (default: 15)')
+    parser.add_argument('--window', type=float, default=300, help='Arrival-rate window in seconds (default: 300)')
+    parser.add_argument('--lead-time', type=float, default=600,
+                        help='Seconds until a new account is allocatable (default: 600)')
+    parser.add_argument('--safety', type=float, default=1.5, help='Demand multiplier (default: 1.5)')
+    parser.add_argument('--max-per-cycle', type=int, default=25, help='Accounts created per poll (default: 25)')
+    parser.add_argument('--max-total', type=int, default=200, help='Accounts created per run (default: 200)')
+    parser.add_argument('--admin-email', default=os.environ.get("INFOBLOX_EMAIL"),
+                        help='Admin user email for pre-warmed accounts (default: $INFOBLOX_EMAIL)')
+    parser.add_argument('--reclaim', action='store_true',
+                        help='Delete pre-warmed accounts the forecast no longer needs')
+    parser.add_argument('--min-available', type=int, default=20,
+                        help='Low watermark: pre-warm up to this many available sandboxes, and keep '
+                             'this many beyond the forecast when reclaiming (default: 20)')
+    parser.add_argument('--dry-run', action='store_true', help='Report decisions without creating or deleting accounts')
+    parser.add_argument('--log', default=None, help='Append samples to this CSV file')
+    args = parser.parse_args()
+
+    token = os.environ.get("BROKER_API_TOKEN")
+    if not token:
+        sys.exit("❌ BROKER_API_TOKEN environment variable not set")
+    api = None
+    if not args.dry_run:
+        if not os.environ.get("Infoblox_Token"):
+            sys.exit("❌ Infoblox_Token environment variable not set (or use --dry-run)")
+        if not args.admin_email:
+            sys.exit("❌ --admin-email or INFOBLOX_EMAIL not set (or use --dry-run)")
+        api = SandboxAccountAPI(base_url=CSP_URL, token=os.environ["Infoblox_Token"])
+
+    http = RetryingSession(retries=3, pool_size=2)
+    headers = broker_headers(token)
+    forecaster = PoolForecaster(args.window, args.lead_time, args.safety)
+    in_flight = collections.deque()   # (created at, count)
+    created_total = 0
+
+    print(f"📈 Watching pool '{args.name_prefix}' at {args.url} every {args.interval:.0f}s", flush=True)
+    while True:
+        try:
+            available, allocated = pool_depth(http, args.url, headers, args.name_prefix)
+        except ReleaseError as e:
+            sys.exit(f"❌ {e}")
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️ Broker query failed: {e}", flush=True)
+            time.sleep(args.interval)
+            continue
+
+        now = time.monotonic()
+        forecaster.observe(available, allocated, now)
+        while in_flight and now - in_flight[0][0] > args.lead_time:
+            in_flight.popleft()
+        pending = sum(n for _, n in in_flight)
+        rate = forecaster.arrival_rate()
+        eta = forecaster.seconds_to_exhaustion()
+        need = min(forecaster.shortfall(pending, args.min_available), args.max_per_cycle, args.max_total - created_total)
+
+        eta_text = "∞" if eta == math.inf else f"{eta:.0f}s"
+        print(f"📊 available={available} allocated={allocated} rate={rate * 60:.1f}/min "
+              f"exhaustion={eta_text} in_flight={pending} shortfall={need}", flush=True)
+        if args.log:
+            with open(args.log, "a") as f:
+                f.write(f"{time.time():.0f},{available},{allocated},{rate:.4f},{pending},{need}\n")
+
+        if need > 0:
+            if args.dry_run:
+                print(f"🔮 Would pre-warm {need} sandbox(es)", flush=True)
+            else:
+                print(f"🔥 Pre-warming {need} sandbox(es)...", flush=True)
+                created = prewarm(api, need, args.name_prefix, args.admin_email)
+                created_total += created
+                in_flight.append((now, created))
+                print(f"✅ Created {created}/{need} ({created_total}/{args.max_total} this run)", flush=True)
+        elif args.reclaim and not pending and forecaster.warmed_up():
+            surplus = min(forecaster.surplus(args.min_available), args.max_per_cycle)
+            if surplus > 0:
+                try:
+                    ids = reclaimable(http, args.url, headers, args.name_prefix)[:surplus]
+                except requests.exceptions.RequestException as e:
+                    print(f"⚠️ Broker query failed: {e}", flush=True)
+                    ids = []
+                if ids and args.dry_run:
+                    print(f"🔮 Would reclaim {len(ids)} pre-warmed sandbox(es)", flush=True)
+                elif ids:
+                    print(f"♻️ Reclaiming {len(ids)} pre-warmed sandbox(es)...", flush=True)
+                    deleted = reclaim(api, ids)
+                    print(f"✅ Deleted {deleted}/{len(ids)}", flush=True)
+
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
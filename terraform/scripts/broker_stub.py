@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the sandbox broker API, for load testing allocation
+without touching the production broker.
+
+Implements:
+  POST /v1/allocate                          -> 201 new / 200 existing allocation, 409 when the pool is empty
+  POST /v1/sandboxes/{id}/mark-for-deletion  -> 200, or 404 for unknown ids
+  GET  /v1/sandboxes?status=&name_prefix=    -> allocated / available sandboxes
+  GET  /v1/_stats                            -> counters for the load test
+
+Failure modelling:
+  --waf-limit N     more than N requests/second (sliding 1s window) get 403 with Retry-After
+  --error-rate P    probability of a 503 on any request
+  --latency MS      base service time per request (plus up to 50% jitter)
+
+Usage:
+  python3 broker_stub.py --port 8080 --pool-size 250 --waf-limit 50 --error-rate 0.02
+  BROKER_API_URL=http://127.0.0.1:8080/v1 BROKER_API_TOKEN=x python3 allocation_broker_subtenant.py
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+import collections
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import lab_trace
+
+
+class BrokerState:
+    def __init__(self, pool_size=100, waf_limit=0, error_rate=0.0, latency_ms=0, name_prefix="lab"):
+        self.lock = threading.Lock()
+        self.available = collections.deque(
+            {"sandbox_id": f"sbx-{i:05d}", "external_id": f"identity/accounts/{100000 + i}",
+             "name": f"{name_prefix}-{i:05d}"}
+            for i in range(pool_size)
+        )
+        self.allocations = {}   # participant id -> sandbox
+        self.allocated = {}     # sandbox id -> participant id
+        self.waf_limit = waf_limit
+        self.error_rate = error_rate
+        self.latency_ms = latency_ms
+        self.recent = collections.deque()
+        self.counters = collections.Counter()
+
+    def add_sandboxes(self, sandboxes):
+        with self.lock:
+            self.available.extend(sandboxes)
+
+    def waf_blocked(self):
+        if not self.waf_limit:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] > 1.0:
+                self.recent.popleft()
+            if len(self.recent) >= self.waf_limit:
+                return True
+            self.recent.append(now)
+            return False
+
+    def allocate(self, participant_id):
+        with self.lock:
+            if participant_id in self.allocations:
+                return 200, self.allocations[participant_id]
+            if not self.available:
+                return 409, None
+            sandbox = dict(self.available.popleft(), expires_at=int(time.time()) + 4 * 3600)
+            self.allocations[participant_id] = sandbox
+            self.allocated[sandbox["sandbox_id"]] = participant_id
+            return 201, sandbox
+
+    def release(self, sandbox_id):
+        with self.lock:
+            participant_id = self.allocated.pop(sandbox_id, None)
+            if participant_id is None:
+                return False
+            self.allocations.pop(participant_id, None)
+            return True
+
+    def list_sandboxes(self, status=None, name_prefix=None):
+        with self.lock:
+            sandboxes = []
+            if status in (None, "allocated"):
+                sandboxes += [dict(s, status="allocated") for s in self.allocations.values()]
+            if status in (None, "available"):
+                sandboxes += [dict(s, status="available") for s in self.available]
+        return [s for s in sandboxes if not name_prefix or s["name"].startswith(name_prefix)]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "available": len(self.available),
+                "allocated": len(self.allocated),
+                "counters": dict(self.counters),
+            }
+
+
+class BrokerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: BrokerState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None, headers=None):
+        data = json.dumps(body if body is not None else {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+        with self.state.lock:
+            self.state.counters[status] += 1
+
+    def _simulate(self):
+        """Apply latency and failure modelling; returns True if a failure was sent"""
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if self.state.latency_ms:
+            time.sleep(self.state.latency_ms * random.uniform(1.0, 1.5) / 1000)
+        if self.state.waf_blocked():
+            self._send(403, {"detail": {"message": "Rate limited by WAF"}}, {"Retry-After": "1"})
+            return True
+        if random.random() < self.state.error_rate:
+            self._send(503, {"detail": "Service unavailable"})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path.rstrip("/")
+        if path == "/v1/_stats":
+            return self._send(200, self.state.stats())
+        if path == "/v1/sandboxes":
+            query = dict(urllib.parse.parse_qsl(url.query))
+            sandboxes = self.state.list_sandboxes(query.get("status"), query.get("name_prefix"))
+            return self._send(200, {"sandboxes": sandboxes})
+        self._send(404, {"detail": "Not found"})
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if path == "/v1/allocate":
+            if self._simulate():
+                return
+            participant_id = self.headers.get("X-Instruqt-Sandbox-ID")
+            if not participant_id:
+                return self._send(400, {"detail": "X-Instruqt-Sandbox-ID header required"})
+            status, sandbox = self.state.allocate(participant_id)
+            if status == 409:
+                return self._send(409, {"detail": "No sandboxes available"})
+            return self._send(status, sandbox)
+
+        parts = path.split("/")
+        if len(parts) == 5 and parts[1] == "v1" and parts[2] == "sandboxes" and parts[4] == "mark-for-deletion":
+            if self._simulate():
+                return
+            if self.state.release(parts[3]):
+                return self._send(200, {"sandbox_id": parts[3], "status": "pending_deletion"})
+            return self._send(404, {"detail": "Sandbox not found"})
+
+        self._send(404, {"detail": "Not found"})
+
+
+class BrokerStub:
+    """Run the stand-in broker on a background thread"""
+
+    def __init__(self, host="127.0.0.1", port=0, **state_kwargs):
+        self.state = BrokerState(**state_kwargs)
+        handler = type("Handler", (BrokerHandler,), {"state": self.state})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the sandbox broker API')
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='Port (default: 8080)')
+    parser.add_argument('--pool-size', type=int, default=100, help='Sandboxes available (default: 100)')
+    parser.add_argument('--waf-limit', type=int, default=0, help='Requests/second before 403 (default: off)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability of HTTP 503 (default: 0)')
+    parser.add_argument('--latency', type=int, default=0, help='Base latency in ms (default: 0)')
+    args = parser.parse_args()
+
+    stub = BrokerStub(args.host, args.port, pool_size=args.pool_size, waf_limit=args.waf_limit,
+                      error_rate=args.error_rate, latency_ms=args.latency)
+    print(f"Broker stand-in listening on {stub.url} (pool={args.pool_size})", flush=True)
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
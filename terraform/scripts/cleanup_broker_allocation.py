@@ -4,8 +4,8 @@ Instruqt Sandbox Cleanup via Broker API
 
 This script marks a sandbox for deletion when a student stops their lab.
 It now aligns with the updated allocation logic:
- - subtenant_id.txt contains the Broker sandbox ID
- - sandbox_id.txt and external_id.txt contain the external CSP account ID
+ - lab_state.json holds the Broker sandbox ID (subtenant_id) and the
+   external CSP account ID (external_id)
 
 Usage in Instruqt:
 1. Set environment variables (same as allocation):
@@ -14,97 +14,245 @@ Usage in Instruqt:
    - INSTRUQT_PARTICIPANT_ID
 
 2. Run this script in your Instruqt track stop/cleanup lifecycle hook
+
+Bulk release at the end of an event (no INSTRUQT_PARTICIPANT_ID needed):
+   python3 cleanup_broker_allocation.py --ids sbx-1 sbx-2
+   python3 cleanup_broker_allocation.py --ids-file subtenants.txt --workers 32
+   python3 cleanup_broker_allocation.py --query-status allocated --name-prefix lab
+
+--query-status/--name-prefix need a broker that lists sandboxes
+(GET /sandboxes). The production broker only documents /allocate and
+mark-for-deletion, so against it the query fails with an error; pass the
+ids with --ids/--ids-file instead.
 """
 
 import os
 import sys
+import time
+import argparse
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from http_retry import IDEMPOTENT_METHODS, BackoffPolicy, RetryingSession, server_delay
+from allocation_broker_subtenant import DEFAULT_BROKER_API_URL
+from lab_state import LabState, STATE_FILE
+import lab_trace
+
+
+class ReleaseError(Exception):
+    pass
+
+
+def broker_headers(token, participant_id=None):
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+    }
+    if participant_id:
+        headers["X-Instruqt-Sandbox-ID"] = participant_id
+    return headers
+
+
+def contention_signalled(resp) -> bool:
+    """The broker asked us to slow down: 429, or a 403/5xx from the WAF with a delay header"""
+    return resp.status_code == 429 or server_delay(resp) is not None
+
 
-# ----------------------------------
-# Configuration
-# ----------------------------------
-BROKER_API_URL = os.environ.get(
-    "BROKER_API_URL",
-    "https://api-sandbox-broker.highvelocitynetworking.com/v1"
-)
-BROKER_API_TOKEN = os.environ.get("BROKER_API_TOKEN")
-INSTRUQT_SANDBOX_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID")
-
-# Updated input file (from allocation script)
-SUBTENANT_ID_FILE = "subtenant_id.txt"
-
-# ----------------------------------
-# Validation
-# ----------------------------------
-if not BROKER_API_TOKEN:
-    print("❌ BROKER_API_TOKEN environment variable not set", flush=True)
-    sys.exit(1)
-
-if not INSTRUQT_SANDBOX_ID:
-    print("❌ INSTRUQT_PARTICIPANT_ID not found", flush=True)
-    sys.exit(1)
-
-# Read subtenant_id (actual Broker sandbox ID)
-try:
-    with open(SUBTENANT_ID_FILE, "r") as f:
-        subtenant_id = f.read().strip()
-except FileNotFoundError:
-    print(f"⚠️ {SUBTENANT_ID_FILE} not found, nothing to clean up", flush=True)
-    sys.exit(0)  # Not an error - sandbox may not have been allocated
-
-if not subtenant_id:
-    print("⚠️ subtenant_id.txt is empty, nothing to clean up", flush=True)
-    sys.exit(0)
-
-print(f"🧹 Marking sandbox (Broker subtenant ID: {subtenant_id}) for deletion...", flush=True)
-
-# ----------------------------------
-# Mark Sandbox for Deletion
-# ----------------------------------
-delete_url = f"{BROKER_API_URL}/sandboxes/{subtenant_id}/mark-for-deletion"
-headers = {
-    "Authorization": f"Bearer {BROKER_API_TOKEN}",
-    "X-Instruqt-Sandbox-ID": INSTRUQT_SANDBOX_ID,
-    "Content-Type": "application/json",
-}
-
-try:
-    resp = requests.post(
-        delete_url,
-        headers=headers,
-        timeout=(5, 15),
-    )
+def release_sandbox(http, broker_url, headers, subtenant_id, max_retries=8, policy=None, sleep=None):
+    """
+    Mark one broker sandbox for deletion.
+    Returns the broker response for a release, or None if the sandbox was
+    already released (404). Contention (WAF 403 with Retry-After, 429) is
+    retried with the same backoff as allocation. Raises ReleaseError otherwise.
+    """
+    sleep = sleep or time.sleep
+    policy = policy or BackoffPolicy(base_delay=1.0, max_delay=30.0)
+    for attempt in range(max_retries):
+        resp = http.post(
+            f"{broker_url}/sandboxes/{subtenant_id}/mark-for-deletion",
+            headers=headers,
+            timeout=(5, 15),
+        )
+        if not contention_signalled(resp) or attempt == max_retries - 1:
+            break
+        delay = policy.next_delay(resp)
+        print(f"⚠️ {subtenant_id}: broker signalled contention (HTTP {resp.status_code}), "
+              f"retrying in {delay:.1f}s", flush=True)
+        sleep(delay)
 
     if resp.status_code == 200:
-        result = resp.json()
+        return resp.json()
+    if resp.status_code == 404:
+        return None
+    if contention_signalled(resp):
+        raise ReleaseError(f"Broker still signalling contention after {max_retries} attempts "
+                           f"(HTTP {resp.status_code}): {resp.text}")
+    if resp.status_code == 403:
+        try:
+            message = resp.json().get('detail', {}).get('message', 'Unknown error')
+        except Exception:
+            message = f"(HTTP 403): {resp.text}"
+        raise ReleaseError(f"Authorization error: {message}")
+    raise ReleaseError(f"HTTP {resp.status_code}: {resp.text}")
+
+
+def list_sandboxes(http, broker_url, headers, status=None, name_prefix=None):
+    """
+    Sandboxes matching a broker query (GET /sandboxes), as the broker returns them.
+    Raises ReleaseError if the broker has no list endpoint.
+    """
+    params = {}
+    if status:
+        params["status"] = status
+    if name_prefix:
+        params["name_prefix"] = name_prefix
+    resp = http.get(f"{broker_url}/sandboxes", headers=headers, params=params, timeout=(5, 30))
+    if resp.status_code in (404, 405, 501):
+        raise ReleaseError(f"Broker at {broker_url} does not list sandboxes (GET /sandboxes: HTTP "
+                           f"{resp.status_code}); pass the subtenant ids with --ids or --ids-file")
+    resp.raise_for_status()
+    data = resp.json()
+    items = data if isinstance(data, list) else data.get("sandboxes") or data.get("results") or []
+    if name_prefix:
+        # Filter locally too, in case the broker ignores the parameter
+        items = [item for item in items if (item.get("name") or "").startswith(name_prefix)]
+    return items
+
+
+def query_sandboxes(http, broker_url, headers, status=None, name_prefix=None):
+    """Subtenant ids matching a broker query (see list_sandboxes)"""
+    items = list_sandboxes(http, broker_url, headers, status, name_prefix)
+    return [i for i in (item.get("sandbox_id") or item.get("id") for item in items) if i]
+
+
+def bulk_release(subtenant_ids, broker_url, token, workers=16, participant_id=None):
+    """
+    Release many sandboxes concurrently over one pooled session.
+    Returns {"released": [...], "already_released": [...], "failed": {id: error}}.
+    """
+    # mark-for-deletion is safe to resend: a repeat answers 404 (already released)
+    session = RetryingSession(retries=3, pool_size=workers, timeout=(5, 15),
+                              allowed_methods=IDEMPOTENT_METHODS | {"POST"})
+    headers = broker_headers(token, participant_id)
+    summary = {"released": [], "already_released": [], "failed": {}}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(release_sandbox, session, broker_url, headers, sid): sid
+                   for sid in subtenant_ids}
+        for future in as_completed(futures):
+            sid = futures[future]
+            try:
+                result = future.result()
+            except (ReleaseError, requests.exceptions.RequestException) as e:
+                summary["failed"][sid] = str(e)
+                print(f"❌ {sid}: {e}", flush=True)
+                continue
+            if result is None:
+                summary["already_released"].append(sid)
+            else:
+                summary["released"].append(sid)
+    return summary
+
+
+def read_ids_file(path):
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def release_current(broker_url, token, participant_id, state_file=STATE_FILE):
+    """
+    Release the sandbox recorded in lab state (stop hook mode).
+    Returns the released subtenant id, or None if there was nothing to
+    release. Raises ReleaseError if the release failed.
+    """
+    # Read subtenant_id (actual Broker sandbox ID)
+    subtenant_id = LabState.load(state_file).subtenant_id
+
+    if not subtenant_id:
+        # Not an error - sandbox may not have been allocated
+        print("⚠️ No subtenant ID in lab state, nothing to clean up", flush=True)
+        return None
+
+    print(f"🧹 Marking sandbox (Broker subtenant ID: {subtenant_id}) for deletion...", flush=True)
+
+    try:
+        result = release_sandbox(requests, broker_url, broker_headers(token, participant_id), subtenant_id)
+    except requests.exceptions.RequestException as e:
+        raise ReleaseError(f"Network or request error: {e}") from e
+    if result is None:
+        print(f"⚠️ Sandbox {subtenant_id} not found (may have already been cleaned up)", flush=True)
+    else:
         print(f"✅ Sandbox marked for deletion", flush=True)
         print(f"   Status: {result.get('status', 'unknown')}", flush=True)
         print("   Cleanup: Background job will delete from CSP within ~5 minutes", flush=True)
+    LabState.update(state_file, subtenant_id=None)
+    return subtenant_id
 
-    elif resp.status_code == 404:
-        print(f"⚠️ Sandbox {subtenant_id} not found (may have already been cleaned up)", flush=True)
 
-    elif resp.status_code == 403:
-        try:
-            error = resp.json()
-            print(f"❌ Authorization error: {error.get('detail', {}).get('message', 'Unknown error')}", flush=True)
-        except Exception:
-            print(f"❌ Authorization error (HTTP 403): {resp.text}", flush=True)
-        sys.exit(1)
+def main():
+    parser = argparse.ArgumentParser(description='Release broker sandboxes (this lab, or many at once)')
+    parser.add_argument('--ids', nargs='+', default=[], help='Subtenant ids to release')
+    parser.add_argument('--ids-file', default=None, help='File with one subtenant id per line')
+    parser.add_argument('--query-status', default=None, help='Release sandboxes the broker lists with this status')
+    parser.add_argument('--name-prefix', default=None, help='Restrict the broker query to this name prefix')
+    parser.add_argument('--workers', type=int, default=16, help='Concurrent requests in bulk mode (default: 16)')
+    args = parser.parse_args()
 
-    else:
-        print(f"❌ Failed to mark sandbox for deletion: HTTP {resp.status_code}", flush=True)
-        print(f"   Response: {resp.text}", flush=True)
+    broker_url = os.environ.get("BROKER_API_URL", DEFAULT_BROKER_API_URL)
+    token = os.environ.get("BROKER_API_TOKEN")
+    participant_id = os.environ.get("INSTRUQT_PARTICIPANT_ID")
+    if not token:
+        print("❌ BROKER_API_TOKEN environment variable not set", flush=True)
         sys.exit(1)
 
-except requests.exceptions.RequestException as e:
-    print(f"❌ Network or request error: {e}", flush=True)
-    sys.exit(1)
+    if not (args.ids or args.ids_file or args.query_status or args.name_prefix):
+        if not participant_id:
+            print("❌ INSTRUQT_PARTICIPANT_ID not found", flush=True)
+            sys.exit(1)
+        try:
+            released = release_current(broker_url, token, participant_id)
+        except ReleaseError as e:
+            print(f"❌ Failed to mark sandbox for deletion: {e}", flush=True)
+            sys.exit(1)
+        except Exception as e:
+            print(f"❌ Unexpected error: {e}", flush=True)
+            sys.exit(1)
+        if released:
+            print("=" * 60, flush=True)
+            print("✅ Cleanup request successful", flush=True)
+            print("=" * 60, flush=True)
+        return
+
+    ids = list(args.ids)
+    if args.ids_file:
+        ids += read_ids_file(args.ids_file)
+    if args.query_status or args.name_prefix:
+        try:
+            ids += query_sandboxes(requests, broker_url, broker_headers(token, participant_id),
+                                   args.query_status, args.name_prefix)
+        except ReleaseError as e:
+            print(f"❌ {e}", flush=True)
+            sys.exit(1)
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        print("⚠️ No sandboxes selected, nothing to release", flush=True)
+        return
+
+    print(f"🧹 Releasing {len(ids)} sandbox(es) with {args.workers} workers...", flush=True)
+    start = time.monotonic()
+    summary = bulk_release(ids, broker_url, token, args.workers, participant_id)
+    elapsed = time.monotonic() - start
+
+    print("=" * 60, flush=True)
+    print(f"✅ Released:          {len(summary['released'])}", flush=True)
+    print(f"⚠️ Already released:  {len(summary['already_released'])}", flush=True)
+    print(f"❌ Failed:            {len(summary['failed'])}", flush=True)
+    print(f"⏱️  {elapsed:.1f}s", flush=True)
+    print("=" * 60, flush=True)
+    if summary["failed"]:
+        sys.exit(1)
 
-except Exception as e:
-    print(f"❌ Unexpected error: {e}", flush=True)
-    sys.exit(1)
 
-print("=" * 60, flush=True)
-print("✅ Cleanup request successful", flush=True)
-print("=" * 60, flush=True)
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
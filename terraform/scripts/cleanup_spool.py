@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Durable teardown spool for the Instruqt stop hook.
+
+The stop hook only records teardown jobs in a local SQLite database and
+returns in milliseconds. A background worker drains the spool, running each
+teardown script with retries and backoff, so a slow remote API no longer
+stalls the hook or leaks resources when the hook is killed.
+
+- Jobs are keyed by an idempotency key (<group>:<script>); enqueueing the same
+  teardown again while it is still queued or running is a no-op. Once it is
+  done or failed, enqueueing it again starts a new run.
+- A job is leased while it runs. If the worker dies, the lease expires and
+  the job is picked up again, so no job is lost across restarts.
+- Jobs in a later stage of the same group wait for the earlier stage to
+  finish: the user and security policies are removed before the broker
+  sandbox is released. If an earlier stage fails for good, the later stages
+  of that group fail with it instead of running.
+
+Usage (stop hook):
+  python3 cleanup_spool.py enqueue --spawn-worker
+Worker / inspection:
+  python3 cleanup_spool.py worker [--forever] [--parallel 4]
+  python3 cleanup_spool.py status
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import subprocess
+import threading
+import lab_trace
+
+SPOOL_DB = os.environ.get("CLEANUP_SPOOL_DB", os.path.expanduser("~/.cleanup_spool.db"))
+
+# Teardown scripts by stage; a stage starts once the previous one is finished
+TEARDOWN_STAGES = [
+    ["cleanup_dns_records.py", "clean_dns_niosx.py", "delete_user.py", "delete_security_policies.py"],
+    ["cleanup_broker_allocation.py"],
+]
+
+# Environment captured at enqueue time and replayed for the worker
+ENV_PREFIXES = ("INFOBLOX_", "Infoblox_", "INSTRUQT_", "BROKER_", "DEMO_AWS_", "DEMO_HOSTED_", "TF_VAR_", "SANDBOX_", "LAB_TRACE")
+
+MAX_ATTEMPTS = 8
+JOB_TIMEOUT = 600
+LEASE_SECONDS = JOB_TIMEOUT + 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    grp TEXT NOT NULL,
+    stage INTEGER NOT NULL DEFAULT 0,
+    script TEXT NOT NULL,
+    args TEXT NOT NULL DEFAULT '[]',
+    cwd TEXT NOT NULL,
+    env TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    leased_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, next_attempt_at);
+"""
+
+
+def connect(path=SPOOL_DB):
+    # The database and its -wal/-shm files hold credentials from the job environment
+    old_umask = os.umask(0o077)
+    try:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.executescript(SCHEMA)
+    finally:
+        os.umask(old_umask)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.chmod(path + suffix, 0o600)
+    return conn
+
+
+def capture_env():
+    return {k: v for k, v in os.environ.items() if k.startswith(ENV_PREFIXES)}
+
+
+def enqueue(conn, group, stages=TEARDOWN_STAGES, cwd=None, env=None):
+    """Record teardown jobs for a group; returns the number of new or restarted jobs"""
+    now = time.time()
+    cwd = cwd or os.getcwd()
+    env = json.dumps(env if env is not None else capture_env())
+    added = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for stage, scripts in enumerate(stages):
+            for script in scripts:
+                # A finished job (done or failed) is reset for the new run
+                cur = conn.execute(
+                    "INSERT INTO jobs (idempotency_key, grp, stage, script, cwd, env, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (idempotency_key) DO UPDATE SET"
+                    "  stage=excluded.stage, cwd=excluded.cwd, env=excluded.env, status='pending', attempts=0,"
+                    "  next_attempt_at=0, leased_until=0, last_error=NULL, updated_at=excluded.updated_at"
+                    " WHERE jobs.status IN ('done', 'failed')",
+                    (f"{group}:{script}", group, stage, script, cwd, env, now, now),
+                )
+                added += cur.rowcount
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return added
+
+
+def claim(conn):
+    """Lease the next runnable job, or return None"""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Recover jobs whose worker died mid-run
+        conn.execute("UPDATE jobs SET status='pending' WHERE status='running' AND leased_until < ?", (now,))
+        row = conn.execute(
+            "SELECT id, idempotency_key, script, args, cwd, env, attempts FROM jobs j"
+            " WHERE status='pending' AND next_attempt_at <= ?"
+            " AND NOT EXISTS (SELECT 1 FROM jobs e WHERE e.grp = j.grp AND e.stage < j.stage"
+            "                 AND e.status IN ('pending', 'running', 'failed'))"
+            " ORDER BY stage, id LIMIT 1",
+            (now,),
+        ).fetchone()
+        if row:
+            conn.execute("UPDATE jobs SET status='running', leased_until=?, updated_at=? WHERE id=?",
+                         (now + LEASE_SECONDS, now, row[0]))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    if not row:
+        return None
+    keys = ("id", "key", "script", "args", "cwd", "env", "attempts")
+    return dict(zip(keys, row))
+
+
+def finish(conn, job, ok, error=None, max_attempts=MAX_ATTEMPTS):
+    now = time.time()
+    attempts = job["attempts"] + 1
+    if ok:
+        status, next_at = "done", 0
+    elif attempts >= max_attempts:
+        status, next_at = "failed", 0
+    else:
+        status, next_at = "pending", now + min(300, 2 ** attempts + random.uniform(0, 1))
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "UPDATE jobs SET status=?, attempts=?, next_attempt_at=?, leased_until=0, last_error=?, updated_at=? WHERE id=?",
+            (status, attempts, next_at, error, now, job["id"]),
+        )
+        if status == "failed":
+            # Later stages of the group must not run after an earlier stage gave up
+            conn.execute(
+                "UPDATE jobs SET status='failed', last_error=?, updated_at=?"
+                " WHERE status='pending' AND grp=(SELECT grp FROM jobs WHERE id=?)"
+                " AND stage > (SELECT stage FROM jobs WHERE id=?)",
+                (f"blocked: {job['key']} failed", now, job["id"], job["id"]),
+            )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return status
+
+
+def run_job(job):
+    """Run one teardown script; returns (ok, error)"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, **json.loads(job["env"]))
+    cmd = [sys.executable, os.path.join(script_dir, job["script"])] + json.loads(job["args"])
+    try:
+        proc = subprocess.run(cmd, cwd=job["cwd"], env=env, capture_output=True, text=True, timeout=JOB_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return False, f"timed out after {JOB_TIMEOUT}s"
+    if proc.returncode == 0:
+        return True, None
+    output = (proc.stdout + proc.stderr).strip().splitlines()
+    return False, f"exit {proc.returncode}: {' | '.join(output[-3:])}"
+
+
+def pending_count(conn):
+    return conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')").fetchone()[0]
+
+
+def worker_loop(path, forever=False, poll=2.0):
+    conn = connect(path)
+    while True:
+        job = claim(conn)
+        if job is None:
+            if not forever and pending_count(conn) == 0:
+                return
+            time.sleep(poll)
+            continue
+        print(f"▶️  {job['key']} (attempt {job['attempts'] + 1})", flush=True)
+        ok, error = run_job(job)
+        status = finish(conn, job, ok, error)
+        print(f"{'✅' if ok else '⚠️'} {job['key']}: {status}{'' if ok else f' ({error})'}", flush=True)
+
+
+def spawn_worker(path):
+    """Start a detached worker that outlives the stop hook"""
+    log = open(os.path.join(os.path.dirname(os.path.abspath(path)), "cleanup_spool_worker.log"), "a")
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--db", path, "worker"],
+        stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True,
+    )
+
+
+def print_status(conn):
+    rows = conn.execute(
+        "SELECT idempotency_key, stage, status, attempts, last_error FROM jobs ORDER BY grp, stage, id"
+    ).fetchall()
+    for key, stage, status, attempts, error in rows:
+        line = f"  [{stage}] {key:55s} {status:8s} attempts={attempts}"
+        print(line + (f"  {error}" if error and status != "done" else ""))
+    if not rows:
+        print("  (spool is empty)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Durable teardown spool for lab stop hooks')
+    parser.add_argument('--db', default=SPOOL_DB, help=f'Spool database (default: {SPOOL_DB})')
+    sub = parser.add_subparsers(dest='command', required=True)
+    enq = sub.add_parser('enqueue', help='Record teardown jobs for this lab and return')
+    enq.add_argument('--group', default=None, help='Job group (default: $INSTRUQT_PARTICIPANT_ID)')
+    enq.add_argument('--scripts', nargs='+', default=None, help='Only these teardown scripts (single stage)')
+    enq.add_argument('--spawn-worker', action='store_true', help='Start a detached worker after enqueueing')
+    work = sub.add_parser('worker', help='Drain the spool')
+    work.add_argument('--forever', action='store_true', help='Keep polling after the spool is empty')
+    work.add_argument('--parallel', type=int, default=1, help='Jobs run at the same time (default: 1)')
+    sub.add_parser('status', help='List jobs')
+    args = parser.parse_args()
+
+    if args.command == 'enqueue':
+        group = args.group or os.environ.get("INSTRUQT_PARTICIPANT_ID") or "default"
+        stages = [args.scripts] if args.scripts else TEARDOWN_STAGES
+        added = enqueue(connect(args.db), group, stages)
+        print(f"🧾 Enqueued {added} teardown job(s) for '{group}' in {args.db}", flush=True)
+        if args.spawn_worker:
+            spawn_worker(args.db)
+            print("🚚 Background worker started", flush=True)
+    elif args.command == 'worker':
+        threads = [threading.Thread(target=worker_loop, args=(args.db, args.forever))
+                   for _ in range(max(1, args.parallel))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        conn = connect(args.db)
+        failed = conn.execute("SELECT COUNT(*) FROM jobs WHERE status='failed'").fetchone()[0]
+        sys.exit(1 if failed else 0)
+    else:
+        print_status(connect(args.db))
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
@@ -1,110 +1,59 @@
 #!/usr/bin/env python3
 """
 Creates DNS A records for the 2 NIOS-X servers in Route 53.
-Reads NIOSX_1_IP and NIOSX_2_IP from environment variables.
+Reads NIOSX_1_IP and NIOSX_2_IP from the terraform outputs (tf_outputs.py).
 """
 
 import os
-import boto3
 import sys
-from datetime import datetime
-
-# ---------------------------
-# Setup logging
-# ---------------------------
-log_file = "dns_log_niosx.txt"
-timestamp = datetime.utcnow().isoformat()
-log_lines = [f"\n--- NIOS-X DNS Record Log [{timestamp}] ---\n"]
-
-def log(message):
-    print(message)
-    log_lines.append(message + "\n")
-
-# ---------------------------
-# AWS credentials and config
-# ---------------------------
-aws_access_key_id = os.getenv("DEMO_AWS_ACCESS_KEY_ID")
-aws_secret_access_key = os.getenv("DEMO_AWS_SECRET_ACCESS_KEY")
-region = os.getenv("DEMO_AWS_REGION", "us-east-1")
-hosted_zone_id = os.getenv("DEMO_HOSTED_ZONE_ID")
-
-if not aws_access_key_id or not aws_secret_access_key or not hosted_zone_id:
-    log("ERROR: Missing AWS credentials or Hosted Zone ID in environment")
-    sys.exit(1)
-
-niosx_1_ip = os.getenv("NIOSX_1_IP")
-niosx_2_ip = os.getenv("NIOSX_2_IP")
-
-if not niosx_1_ip or not niosx_2_ip:
-    log("ERROR: NIOSX_1_IP and NIOSX_2_IP must be set in the environment")
-    sys.exit(1)
+from route53_records import RecordLog, record_name, route53_client, upsert_a_record
+from tf_outputs import host_ips
+import lab_trace
+
+LOG_FILE = "dns_log_niosx.txt"
+
+
+def create_niosx_records(route53, hosted_zone_id, niosx_ips, participant_id=None, log=print):
+    """UPSERT the niosx-1/niosx-2 A records; niosx_ips is (NIOSX_1_IP, NIOSX_2_IP)"""
+    for n, ip in enumerate(niosx_ips, start=1):
+        fqdn = record_name(f"NIOSX_{n}_IP", participant_id)
+        log(f"Creating A record: {fqdn} -> {ip}")
+        try:
+            status = upsert_a_record(route53, hosted_zone_id, fqdn, ip,
+                                     comment=f"A record for NIOS-X server #{n}")
+        except Exception as e:
+            log(f"ERROR: Failed to create A record for {fqdn}: {e}")
+            raise
+        # clean_dns_niosx.py finds the records to delete by this line
+        log(f"A record created: {fqdn} -> {ip}")
+        log(f"Change status: {status}")
 
-# ---------------------------
-# Build FQDN mappings
-# ---------------------------
-prefix = os.getenv("INSTRUQT_PARTICIPANT_ID", "").strip()
-prefix_str = f"{prefix}-" if prefix else ""
 
-records = [
-    {
-        "fqdn": f"{prefix_str}niosx-1.iracictechguru.com.",
-        "ip": niosx_1_ip,
-        "comment": "A record for NIOS-X server #1"
-    },
-    {
-        "fqdn": f"{prefix_str}niosx-2.iracictechguru.com.",
-        "ip": niosx_2_ip,
-        "comment": "A record for NIOS-X server #2"
-    }
-]
+def main():
+    log = RecordLog("NIOS-X DNS Record Log")
 
-# ---------------------------
-# Create boto3 session
-# ---------------------------
-session = boto3.Session(
-    aws_access_key_id=aws_access_key_id,
-    aws_secret_access_key=aws_secret_access_key,
-    region_name=region
-)
+    route53 = route53_client()
+    hosted_zone_id = os.getenv("DEMO_HOSTED_ZONE_ID")
+    if route53 is None or not hosted_zone_id:
+        log("ERROR: Missing AWS credentials or Hosted Zone ID in environment")
+        sys.exit(1)
 
-route53 = session.client("route53")
+    ips = host_ips()
+    niosx_1_ip = ips.get("NIOSX_1_IP")
+    niosx_2_ip = ips.get("NIOSX_2_IP")
+    if not niosx_1_ip or not niosx_2_ip:
+        log("ERROR: NIOSX_1_IP and NIOSX_2_IP not found in the environment or the terraform outputs")
+        sys.exit(1)
 
-# ---------------------------
-# Create A records
-# ---------------------------
-for record in records:
-    fqdn = record["fqdn"]
-    ip = record["ip"]
-    log(f"Creating A record: {fqdn} -> {ip}")
     try:
-        response = route53.change_resource_record_sets(
-            HostedZoneId=hosted_zone_id,
-            ChangeBatch={
-                "Comment": record["comment"],
-                "Changes": [
-                    {
-                        "Action": "UPSERT",
-                        "ResourceRecordSet": {
-                            "Name": fqdn,
-                            "Type": "A",
-                            "TTL": 300,
-                            "ResourceRecords": [{"Value": ip}]
-                        }
-                    }
-                ]
-            }
-        )
-        status = response['ChangeInfo']['Status']
-        log(f"A record created: {fqdn} -> {ip}")
-        log(f"Change status: {status}")
-    except Exception as e:
-        log(f"ERROR: Failed to create A record for {fqdn}: {e}")
+        create_niosx_records(route53, hosted_zone_id, (niosx_1_ip, niosx_2_ip), log=log)
+    except Exception:
         sys.exit(1)
 
-# ---------------------------
-# Write log to file
-# ---------------------------
-with open(log_file, "a") as f:
-    f.writelines(log_lines)
+    log.write(LOG_FILE)
+    log(f"Log written to {LOG_FILE}")
+
 
-log(f"Log written to {log_file}")
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
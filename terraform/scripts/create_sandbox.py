@@ -1,32 +1,35 @@
 import os
 import json
 from sandbox_api import SandboxAccountAPI
+from lab_state import LabState, STATE_FILE
+import lab_trace
 
 # Configuration
 BASE_URL = "https://csp.infoblox.com/v2"
-TOKEN = os.environ.get('Infoblox_Token')
-TEAM_ID = os.environ.get('INSTRUQT_PARTICIPANT_ID', 'default-team')
-SANDBOX_ID_FILE = "sandbox_id.txt"
-EXTERNAL_ID_FILE = "external_id.txt"
-
-# Request body for sandbox creation
-sandbox_request_body = {
-    "name": TEAM_ID,
-    "description": "Created via Python script Instruqt Demo",
-    "state": "active",
-    "tags": {"instruqt": "igor"},
-    "admin_user": {
-        "email": os.environ.get("INFOBLOX_EMAIL"),
-        "name": TEAM_ID
+
+
+def sandbox_request_body(team_id, admin_email):
+    """Request body for sandbox creation"""
+    return {
+        "name": team_id,
+        "description": "Created via Python script Instruqt Demo",
+        "state": "active",
+        "tags": {"instruqt": "igor"},
+        "admin_user": {
+            "email": admin_email,
+            "name": team_id
+        }
     }
-}
 
-# API client initialization
-api = SandboxAccountAPI(base_url=BASE_URL, token=TOKEN)
-create_response = api.create_sandbox_account(sandbox_request_body)
 
-# Response handling
-if create_response["status"] == "success":
+def create_sandbox(api: SandboxAccountAPI, team_id, admin_email, state_file=STATE_FILE):
+    """Create the sandbox and record its account id in lab state; returns the id or None"""
+    create_response = api.create_sandbox_account(sandbox_request_body(team_id, admin_email))
+
+    if create_response["status"] != "success":
+        print(f"❌ Sandbox creation failed: {create_response['error']}")
+        return None
+
     print("✅ Sandbox created successfully.")
     sandbox_data = create_response["data"]
     sandbox_id = None
@@ -44,9 +47,7 @@ if create_response["status"] == "success":
         sandbox_id = sandbox_id.split("/")[-1]
 
     if sandbox_id:
-        with open(SANDBOX_ID_FILE, "w") as f:
-            f.write(sandbox_id)
-        print(f"📁 Sandbox ID saved to {SANDBOX_ID_FILE}: {sandbox_id}")
+        print(f"📁 Sandbox ID: {sandbox_id}")
     else:
         print("⚠️ Sandbox ID not found.")
 
@@ -56,10 +57,24 @@ if create_response["status"] == "success":
         external_id = admin_user["account_id"].split("/")[-1]
 
     if external_id:
-        with open(EXTERNAL_ID_FILE, "w") as f:
-            f.write(external_id)
-        print(f"🔐 External ID saved to {EXTERNAL_ID_FILE}: {external_id}")
+        print(f"🔐 External ID: {external_id}")
     else:
         print("⚠️ External ID not found in admin_user.account_id.")
-else:
-    print(f"❌ Sandbox creation failed: {create_response['error']}")
+
+    # The account id is what later steps switch into and delete
+    account_id = sandbox_id or external_id
+    if account_id:
+        LabState(external_id=account_id, sandbox_name=team_id).save(state_file)
+        print(f"💾 Sandbox state saved to {state_file}")
+    return account_id
+
+
+def main():
+    team_id = os.environ.get('INSTRUQT_PARTICIPANT_ID', 'default-team')
+    api = SandboxAccountAPI(base_url=BASE_URL, token=os.environ.get('Infoblox_Token'))
+    create_sandbox(api, team_id, os.environ.get("INFOBLOX_EMAIL"))
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
@@ -1,87 +1,237 @@
 import os
+import sys
+import csv
 import json
 import requests
 import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from csp_groups import GroupResolver
+from csp_session import CSPSession
+from http_retry import RetryingSession
+from lab_files import write_atomic
+from lab_state import LabState
+import lab_trace
 
-# === Required Environment Variables ===
 BASE_URL = "https://csp.infoblox.com"
-EMAIL = os.getenv("INFOBLOX_EMAIL")
-PASSWORD = os.getenv("INFOBLOX_PASSWORD")
-USER_EMAIL = os.getenv("INSTRUQT_EMAIL")
-USER_NAME = os.getenv("INSTRUQT_PARTICIPANT_ID")
-SANDBOX_ID_FILE = "sandbox_id.txt"
-USER_ID_FILE = "user_id.txt"
-
-# === Validate Required Inputs ===
-if not all([EMAIL, PASSWORD, USER_EMAIL, USER_NAME]):
-    raise RuntimeError("❌ Missing one of: INFOBLOX_EMAIL, INFOBLOX_PASSWORD, INSTRUQT_EMAIL, INSTRUQT_PARTICIPANT_ID")
-
-# === Step 1: Authenticate ===
-auth_url = f"{BASE_URL}/v2/session/users/sign_in"
-auth_resp = requests.post(auth_url, json={"email": EMAIL, "password": PASSWORD})
-auth_resp.raise_for_status()
-jwt = auth_resp.json()["jwt"]
-headers = {
-    "Authorization": f"Bearer {jwt}",
-    "Content-Type": "application/json"
-}
-print("✅ Logged in and obtained JWT")
-
-# === Step 2: Switch Account ===
-with open(SANDBOX_ID_FILE, "r") as f:
-    sandbox_id = f.read().strip()
-switch_url = f"{BASE_URL}/v2/session/account_switch"
-switch_payload = {"id": f"identity/accounts/{sandbox_id}"}
-switch_resp = requests.post(switch_url, headers=headers, json=switch_payload)
-switch_resp.raise_for_status()
-jwt = switch_resp.json()["jwt"]
-headers["Authorization"] = f"Bearer {jwt}"
-print(f"🔁 Switched to sandbox account {sandbox_id}")
-time.sleep(3)
-
-# === Step 3: Get Groups and Extract "user" and "act_admin" ===
-group_url = f"{BASE_URL}/v2/groups"
-group_resp = requests.get(group_url, headers=headers)
-group_resp.raise_for_status()
-groups = group_resp.json().get("results", [])
-
-user_group_id = None
-admin_group_id = None
-
-for group in groups:
-    if group.get("name") == "user":
-        user_group_id = group["id"]
-    elif group.get("name") == "act_admin":
-        admin_group_id = group["id"]
-
-if not user_group_id or not admin_group_id:
-    raise RuntimeError(f"❌ Could not find required groups. user: {user_group_id}, admin: {admin_group_id}")
-
-print(f"✅ Found user group: {user_group_id}")
-print(f"✅ Found admin group: {admin_group_id}")
-
-# === Step 4: Create User ===
-user_payload = {
-    "name": USER_NAME,
-    "email": USER_EMAIL,
-    "type": "interactive",
-    "group_ids": [user_group_id, admin_group_id]
-}
-
-print(f"📤 Creating user '{USER_NAME}'...")
-user_url = f"{BASE_URL}/v2/users"
-user_resp = requests.post(user_url, headers=headers, json=user_payload)
-user_resp.raise_for_status()
-user_data = user_resp.json()
-print("✅ User created successfully.")
-print(json.dumps(user_data, indent=2))
-
-# === Step 5: Save user_id.txt ===
-user_id = user_data.get("result", {}).get("id")
-if user_id and user_id.startswith("identity/users/"):
-    user_id = user_id.split("/")[-1]
-    with open(USER_ID_FILE, "w") as f:
-        f.write(user_id)
-    print(f"📝 User ID saved to {USER_ID_FILE}: {user_id}")
-else:
-    print("⚠️ User ID not found or unexpected format.")
+REQUIRED_GROUPS = ("user", "act_admin")
+BULK_RESULTS_FILE = "bulk_user_results.json"
+
+
+def get_group_ids(http, headers, account_id, base_url=BASE_URL, resolver=None):
+    """Return (user_group_id, admin_group_id) for the current account"""
+    resolver = resolver or GroupResolver(http, base_url)
+    groups = resolver.resolve(account_id, headers, REQUIRED_GROUPS)
+    user_group_id = groups["user"]
+    admin_group_id = groups["act_admin"]
+
+    print(f"✅ Found user group: {user_group_id}")
+    print(f"✅ Found admin group: {admin_group_id}")
+    return user_group_id, admin_group_id
+
+
+def create_user(http, headers, user_name, user_email, account_id, base_url=BASE_URL, resolver=None) -> str:
+    """Create an interactive user in the current account and return its short id"""
+    user_group_id, admin_group_id = get_group_ids(http, headers, account_id, base_url, resolver)
+
+    user_payload = {
+        "name": user_name,
+        "email": user_email,
+        "type": "interactive",
+        "group_ids": [user_group_id, admin_group_id]
+    }
+
+    print(f"📤 Creating user '{user_name}'...")
+    user_url = f"{base_url}/v2/users"
+    user_resp = http.post(user_url, headers=headers, json=user_payload)
+    user_resp.raise_for_status()
+    user_data = user_resp.json()
+    print("✅ User created successfully.")
+    print(json.dumps(user_data, indent=2))
+
+    user_id = user_data.get("result", {}).get("id")
+    if user_id and user_id.startswith("identity/users/"):
+        return user_id.split("/")[-1]
+    return None
+
+
+def create_participant_user(email, password, user_name, user_email, sandbox_id, base_url=BASE_URL) -> str:
+    """Sign in as email/password, switch into the sandbox and create the user; returns its short id"""
+    # === Step 1: Authenticate ===
+    auth_url = f"{base_url}/v2/session/users/sign_in"
+    auth_resp = requests.post(auth_url, json={"email": email, "password": password})
+    auth_resp.raise_for_status()
+    jwt = auth_resp.json()["jwt"]
+    headers = {
+        "Authorization": f"Bearer {jwt}",
+        "Content-Type": "application/json"
+    }
+    print("✅ Logged in and obtained JWT")
+
+    # === Step 2: Switch Account ===
+    switch_url = f"{base_url}/v2/session/account_switch"
+    switch_payload = {"id": f"identity/accounts/{sandbox_id}"}
+    switch_resp = requests.post(switch_url, headers=headers, json=switch_payload)
+    switch_resp.raise_for_status()
+    jwt = switch_resp.json()["jwt"]
+    headers["Authorization"] = f"Bearer {jwt}"
+    print(f"🔁 Switched to sandbox account {sandbox_id}")
+    time.sleep(3)
+
+    # === Steps 3-4: Resolve groups and create user ===
+    return create_user(requests, headers, user_name, user_email, sandbox_id, base_url)
+
+
+def find_user_id(http, headers, user_email, base_url=BASE_URL) -> str:
+    """Look up the short id of an existing user by email"""
+    params = {"_filter": f'email=="{user_email}"', "_fields": "id"}
+    resp = http.get(f"{base_url}/v2/users", headers=headers, params=params)
+    resp.raise_for_status()
+    results = resp.json().get("results", [])
+    if results and results[0].get("id"):
+        return results[0]["id"].split("/")[-1]
+    return None
+
+
+class BulkResults:
+    """
+    Per-user result file for bulk create/delete, keyed by user name.
+    Rewritten atomically after every update so an interrupted run can resume.
+    """
+
+    def __init__(self, path: str = BULK_RESULTS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+
+    def status(self, name):
+        return self.entries.get(name, {}).get("status")
+
+    def update(self, name, **fields):
+        with self._lock:
+            entry = self.entries.setdefault(name, {})
+            entry.update(fields)
+            entry["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            write_atomic(self.path, json.dumps(self.entries, indent=2, sort_keys=True))
+
+    def counts(self):
+        counts = {}
+        for entry in self.entries.values():
+            counts[entry.get("status")] = counts.get(entry.get("status"), 0) + 1
+        return counts
+
+
+def read_roster(path):
+    """Read a CSV roster with at least `name` and `email` columns"""
+    with open(path, "r", newline="") as f:
+        reader = csv.DictReader(f)
+        missing = {"name", "email"} - set(reader.fieldnames or [])
+        if missing:
+            raise RuntimeError(f"❌ Roster {path} is missing column(s): {', '.join(sorted(missing))}")
+        return [(row["name"].strip(), row["email"].strip()) for row in reader if row.get("name", "").strip()]
+
+
+def bulk_create_users(roster_file, sandbox_id=None, workers=8, results_file=BULK_RESULTS_FILE,
+                      email=None, password=None):
+    """Create every user in the roster concurrently on one session signed in as email/password"""
+    roster = read_roster(roster_file)
+    results = BulkResults(results_file)
+    pending = [(name, email) for name, email in roster if results.status(name) not in ("created", "exists")]
+    print(f"📋 Roster: {len(roster)} users, {len(roster) - len(pending)} already done, {len(pending)} to create")
+    if not pending:
+        return results
+
+    session = CSPSession(session=RetryingSession(pool_size=workers), email=email, password=password)
+    session.login()
+    session.switch_account(sandbox_id)
+    time.sleep(3)
+
+    headers = session._auth_headers()
+    resolver = GroupResolver(session.session, session.base_url)
+    # Resolve groups once up front instead of once per user
+    get_group_ids(session.session, headers, session.account_id, session.base_url, resolver)
+
+    def existing(name, email):
+        user_id = find_user_id(session.session, headers, email, session.base_url)
+        if user_id:
+            results.update(name, email=email, status="exists", user_id=user_id, error=None)
+        return user_id
+
+    def create_one(name, email):
+        # A create that failed on an earlier run may still have gone through
+        if results.status(name) == "failed" and existing(name, email):
+            return
+        try:
+            user_id = create_user(session.session, headers, name, email,
+                                  session.account_id, session.base_url, resolver)
+            results.update(name, email=email, status="created", user_id=user_id, error=None)
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 409:
+                if not existing(name, email):
+                    results.update(name, email=email, status="exists", user_id=None, error=None)
+            elif e.response is not None and e.response.status_code >= 500 and existing(name, email):
+                pass
+            else:
+                raise
+        except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
+            # The POST is not resent (it may have been committed); check whether it was
+            if not existing(name, email):
+                raise
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(create_one, name, email): (name, email) for name, email in pending}
+        for future in as_completed(futures):
+            name, email = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                results.update(name, email=email, status="failed", error=str(e))
+                print(f"❌ {name}: {e}", flush=True)
+
+    print(f"📊 Results written to {results_file}: {results.counts()}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create the Instruqt participant user, or a cohort from a roster')
+    parser.add_argument('--roster', default=None, help='CSV roster with name,email columns (bulk mode)')
+    parser.add_argument('--sandbox-id', default=None, help='Sandbox account id (default: from lab state)')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent requests in bulk mode (default: 8)')
+    parser.add_argument('--results', default=BULK_RESULTS_FILE, help=f'Bulk result file (default: {BULK_RESULTS_FILE})')
+    args = parser.parse_args()
+
+    email = os.getenv("INFOBLOX_EMAIL")
+    password = os.getenv("INFOBLOX_PASSWORD")
+    if args.roster:
+        results = bulk_create_users(args.roster, args.sandbox_id, args.workers, args.results, email, password)
+        if results.counts().get("failed"):
+            sys.exit("❌ Some users failed, re-run the same command to resume")
+        return
+
+    # === Validate Required Inputs ===
+    user_email = os.getenv("INSTRUQT_EMAIL")
+    user_name = os.getenv("INSTRUQT_PARTICIPANT_ID")
+    if not all([email, password, user_email, user_name]):
+        raise RuntimeError("❌ Missing one of: INFOBLOX_EMAIL, INFOBLOX_PASSWORD, INSTRUQT_EMAIL, INSTRUQT_PARTICIPANT_ID")
+
+    sandbox_id = args.sandbox_id or LabState.load().sandbox_id
+    if not sandbox_id:
+        raise RuntimeError("❌ No sandbox id in lab state. Run create_sandbox.py or the broker allocation first.")
+    user_id = create_participant_user(email, password, user_name, user_email, sandbox_id)
+
+    # === Step 5: Save user_id to lab state ===
+    if user_id:
+        LabState.update(user_id=user_id)
+        print(f"📝 User ID saved to lab state: {user_id}")
+    else:
+        print("⚠️ User ID not found or unexpected format.")
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
@@ -0,0 +1,60 @@
+"""
+Resolve CSP group names to ids with a server-side _filter instead of
+downloading the whole /v2/groups collection.
+
+Results are cached per sandbox account, so creating many users in the same
+account resolves each group once. Pass cache_file to keep the mapping
+between runs.
+"""
+
+import json
+import os
+import threading
+
+from csp_pagination import iter_results
+from lab_files import write_atomic
+
+BASE_URL = "https://csp.infoblox.com"
+
+
+class GroupResolver:
+    def __init__(self, http, base_url: str = BASE_URL, cache_file: str = None):
+        self.http = http
+        self.base_url = base_url
+        self.cache_file = cache_file
+        self._cache = {}
+        self._lock = threading.Lock()
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, "r") as f:
+                self._cache = json.load(f)
+
+    def resolve(self, account_id: str, headers: dict, names) -> dict:
+        """Return {name: id} for the given group names in account_id"""
+        names = list(names)
+        with self._lock:
+            cached = self._cache.setdefault(account_id, {})
+            missing = [n for n in names if n not in cached]
+            if missing:
+                cached.update(self._fetch(headers, missing))
+                if self.cache_file:
+                    write_atomic(self.cache_file, json.dumps(self._cache, indent=2))
+            unresolved = [n for n in names if n not in cached]
+            if unresolved:
+                raise RuntimeError(f"❌ Could not find required groups: {', '.join(unresolved)}")
+            return {n: cached[n] for n in names}
+
+    def invalidate(self, account_id: str = None):
+        with self._lock:
+            if account_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(account_id, None)
+
+    def _fetch(self, headers: dict, names) -> dict:
+        name_filter = " or ".join(f'name=="{n}"' for n in names)
+        params = {"_filter": name_filter, "_fields": "id,name"}
+        found = {}
+        for group in iter_results(self.http, f"{self.base_url}/v2/groups", headers=headers, params=params):
+            if group.get("name") in names:
+                found[group["name"]] = group["id"]
+        return found
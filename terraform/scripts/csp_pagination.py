@@ -0,0 +1,110 @@
+"""
+Streaming iterator over paginated CSP collection endpoints.
+
+CSP list endpoints only return the first page of `results` unless asked for
+more. iter_results() walks the whole collection with _limit/_offset, or with
+_page_token when the response carries a next-page token, and yields items one
+at a time so callers can stop early without holding everything in memory.
+With prefetch=True the next page is requested in the background while the
+caller is still consuming the current one.
+
+A short page does not end the walk, since servers may cap _limit below the
+requested page size. It ends on an empty page, when the total count the
+server reports is reached, or when the server repeats the previous page or
+hands back the token it was just given (an endpoint that ignores _offset
+or _page_token).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PAGE_SIZE = 100
+
+# Response fields CSP services use for the next-page token
+PAGE_TOKEN_FIELDS = ("next_page_token", "page_token", "page")
+# Response fields CSP services use for the collection size
+TOTAL_FIELDS = ("total_size", "total_count", "total")
+
+
+def _next_token(body):
+    for field in PAGE_TOKEN_FIELDS:
+        token = body.get(field)
+        if isinstance(token, str) and token:
+            return token
+    return None
+
+
+def _total(body):
+    for field in TOTAL_FIELDS:
+        total = body.get(field)
+        if isinstance(total, int) and not isinstance(total, bool):
+            return total
+    return None
+
+
+def iter_pages(http, url, headers=None, params=None, page_size=DEFAULT_PAGE_SIZE,
+               prefetch=True, results_key="results"):
+    """
+    Yield each page of a CSP collection as a list.
+    `http` is anything with a requests-style get() (a Session or the requests module).
+    """
+    base_params = dict(params or {})
+
+    def fetch(offset, token):
+        page_params = dict(base_params, _limit=page_size)
+        if token:
+            page_params["_page_token"] = token
+        else:
+            page_params["_offset"] = offset
+        resp = http.get(url, headers=headers, params=page_params)
+        resp.raise_for_status()
+        body = resp.json()
+        return body.get(results_key) or [], _next_token(body), _total(body)
+
+    def follow(offset, token, page, previous):
+        # Where the next page starts, or None if this was the last one
+        items, next_token, total = page
+        if not items or items == previous:
+            return None
+        if next_token:
+            return None if next_token == token else (offset + len(items), next_token)
+        if total is not None and offset + len(items) >= total:
+            return None
+        return offset + len(items), None
+
+    if not prefetch:
+        offset, token, previous = 0, None, None
+        while True:
+            page = fetch(offset, token)
+            cursor = follow(offset, token, page, previous)
+            if page[0] and page[0] != previous:
+                yield page[0]
+            if cursor is None:
+                return
+            previous = page[0]
+            offset, token = cursor
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        offset, token, previous = 0, None, None
+        page = fetch(offset, token)
+        while True:
+            cursor = follow(offset, token, page, previous)
+            pending = pool.submit(fetch, *cursor) if cursor else None
+            try:
+                if page[0] and page[0] != previous:
+                    yield page[0]
+            except GeneratorExit:
+                if pending:
+                    pending.cancel()
+                raise
+            if pending is None:
+                return
+            previous = page[0]
+            offset, token = cursor
+            page = pending.result()
+
+
+def iter_results(http, url, headers=None, params=None, page_size=DEFAULT_PAGE_SIZE,
+                 prefetch=True, results_key="results"):
+    """Yield every item of a CSP collection, page by page"""
+    for page in iter_pages(http, url, headers, params, page_size, prefetch, results_key):
+        yield from page
@@ -0,0 +1,56 @@
+"""
+Shared Infoblox CSP session: sign in, switch into the sandbox account and
+reuse one pooled requests.Session for every call made afterwards.
+"""
+
+import os
+import requests
+
+from lab_files import write_atomic
+from lab_state import LabState
+
+BASE_URL = "https://csp.infoblox.com"
+
+
+class CSPSession:
+    def __init__(self, base_url: str = BASE_URL, session: requests.Session = None,
+                 email: str = None, password: str = None):
+        self.base_url = base_url
+        self.email = email or os.getenv("INFOBLOX_EMAIL")
+        self.password = password or os.getenv("INFOBLOX_PASSWORD")
+        self.jwt = None
+        self.account_id = None
+        self.session = session or requests.Session()
+        self.headers = {"Content-Type": "application/json"}
+
+    def login(self):
+        payload = {"email": self.email, "password": self.password}
+        response = self.session.post(f"{self.base_url}/v2/session/users/sign_in",
+                                     headers=self.headers, json=payload)
+        response.raise_for_status()
+        self.jwt = response.json().get("jwt")
+        print("✅ Logged in and JWT acquired", flush=True)
+
+    def switch_account(self, sandbox_id: str = None):
+        sandbox_id = sandbox_id or LabState.load().sandbox_id
+        if not sandbox_id:
+            raise RuntimeError("No sandbox id in lab state. Run create_sandbox.py or the broker allocation first.")
+        payload = {"id": f"identity/accounts/{sandbox_id}"}
+        headers = self._auth_headers()
+        response = self.session.post(f"{self.base_url}/v2/session/account_switch",
+                                     headers=headers, json=payload)
+        response.raise_for_status()
+        self.jwt = response.json().get("jwt")
+        self.account_id = sandbox_id
+        self._save_to_file("jwt.txt", self.jwt)
+        print(f"✅ Switched to sandbox {sandbox_id} and updated JWT", flush=True)
+
+    def _auth_headers(self):
+        return {"Content-Type": "application/json", "Authorization": f"Bearer {self.jwt}"}
+
+    def _save_to_file(self, filename, content):
+        write_atomic(filename, content.strip())
+
+    def _read_file(self, filename):
+        with open(filename, "r") as f:
+            return f.read().strip()
@@ -1,22 +1,9 @@
 import os
-import requests
 from sandbox_api import SandboxAccountAPI
+from lab_state import LabState
+import lab_trace
 
 BASE_URL = "https://csp.infoblox.com/v2"
-TOKEN = os.environ.get('Infoblox_Token')
-SANDBOX_ID_FILE = "sandbox_id.txt"
-
-# Read sandbox ID from file
-try:
-    with open(SANDBOX_ID_FILE, "r") as f:
-        sandbox_id = f.read().strip()
-except FileNotFoundError:
-    print(f"ERROR: {SANDBOX_ID_FILE} not found. You must run create_sandbox.py first.")
-    exit(1)
-
-if not sandbox_id:
-    print("WARNING: Empty sandbox ID. File is corrupted or empty.")
-    exit(1)
 
 
 # Updated deletion logic
@@ -24,7 +11,7 @@ def delete_sandbox(api: SandboxAccountAPI, sandbox_id: str) -> bool:
     endpoint = f"{api.base_url}/sandbox/accounts/{sandbox_id}"
     try:
         print(f"Sending DELETE request to: {endpoint}")
-        response = requests.delete(endpoint, headers=api._headers())
+        response = api.session.delete(endpoint)
 
         if response.status_code in [200, 204]:
             print(f"Sandbox {sandbox_id} deleted successfully.")
@@ -38,15 +25,27 @@ def delete_sandbox(api: SandboxAccountAPI, sandbox_id: str) -> bool:
         return False
 
 
-# Run delete
-api = SandboxAccountAPI(base_url=BASE_URL, token=TOKEN)
-deleted = delete_sandbox(api, sandbox_id)
+def main():
+    # Read sandbox ID from lab state
+    sandbox_id = LabState.load().sandbox_id
 
-if deleted:
-    try:
-        os.remove(SANDBOX_ID_FILE)
-        print(f"Removed file: {SANDBOX_ID_FILE}")
-    except OSError as e:
-        print(f"WARNING: Could not remove file: {e}")
-else:
-    print(f"WARNING: Sandbox {sandbox_id} may still exist. Please verify manually.")
+    if not sandbox_id:
+        print("ERROR: No sandbox ID in lab state. You must run create_sandbox.py first.")
+        exit(1)
+
+    api = SandboxAccountAPI(base_url=BASE_URL, token=os.environ.get('Infoblox_Token'))
+    deleted = delete_sandbox(api, sandbox_id)
+
+    if deleted:
+        try:
+            LabState.update(external_id=None)
+            print("Cleared sandbox ID from lab state")
+        except OSError as e:
+            print(f"WARNING: Could not update lab state: {e}")
+    else:
+        print(f"WARNING: Sandbox {sandbox_id} may still exist. Please verify manually.")
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
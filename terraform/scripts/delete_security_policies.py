@@ -3,24 +3,27 @@
 Deletes the TD-Policy-1, TD-Policy-2, TD-Policy-3 security policies.
 Before deletion, removes any DFP associations to avoid 403 errors.
 Skips the Default Global Policy and any other non-TD policies.
+
+--pattern deletes every policy whose name matches a glob instead, e.g. the
+policies created by `triple_security_policy.py --count 200`:
+  python3 delete_security_policies.py --pattern 'TD-Policy-*'
 """
 
 import os
 import sys
 import json
+import argparse
+import fnmatch
 import requests
+from concurrent.futures import ThreadPoolExecutor
 
-BASE_URL = "https://csp.infoblox.com"
-POLICIES_ENDPOINT = f"{BASE_URL}/api/atcfw/v1/security_policies"
+from csp_pagination import iter_results
+from http_retry import RetryingSession
+from security_policies import POLICIES_ENDPOINT, SCOPE_FIELDS
+import lab_trace
 
 TD_POLICY_NAMES = {"TD-Policy-1", "TD-Policy-2", "TD-Policy-3"}
 
-# Read-only fields to strip when updating a policy via PUT
-READONLY_FIELDS = {
-    "id", "created_time", "updated_time", "is_default",
-    "agents", "dfps", "migration_status", "scope_expr", "tags",
-}
-
 
 def get_api_key():
     api_key = os.environ.get("TF_VAR_ddi_api_key")
@@ -30,7 +33,31 @@ def get_api_key():
     return api_key
 
 
+def is_scoped(policy):
+    return any(policy.get(field) for field in SCOPE_FIELDS)
+
+
+def clear_scope(http, headers, policy):
+    print(f"Clearing scope from '{policy['name']}' (id={policy['id']})...")
+    payload = {field: [] for field in SCOPE_FIELDS}
+    r = http.put(f"{POLICIES_ENDPOINT}/{policy['id']}", headers=headers, json=payload)
+    r.raise_for_status()
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Delete lab security policies')
+    parser.add_argument('--pattern', action='append', default=None,
+                        help='Glob of policy names to delete (repeatable, default: the TD-Policy-1..3 names)')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent scope-clearing requests (default: 8)')
+    args = parser.parse_args()
+
+    if args.pattern:
+        def selected(name):
+            return any(fnmatch.fnmatchcase(name, pattern) for pattern in args.pattern)
+    else:
+        def selected(name):
+            return name in TD_POLICY_NAMES
+
     api_key = get_api_key()
     headers = {
         "Content-Type": "application/json",
@@ -38,30 +65,21 @@ def main():
     }
 
     print("Fetching security policies...")
-    resp = requests.get(POLICIES_ENDPOINT, headers=headers)
-    resp.raise_for_status()
-
-    td_policies = [p for p in resp.json()["results"] if p["name"] in TD_POLICY_NAMES]
+    td_policies = [p for p in iter_results(requests, POLICIES_ENDPOINT, headers=headers)
+                   if selected(p["name"]) and not p.get("is_default")]
 
     if not td_policies:
-        print("No TD-Policies found. Nothing to delete.")
+        print("No matching policies found. Nothing to delete.")
         return
 
     # Remove DFP/scope associations first to avoid 403 on delete
-    for p in td_policies:
-        if p.get("dfp_services") or p.get("roaming_device_groups") or p.get("network_lists"):
-            print(f"Clearing scope from '{p['name']}' (id={p['id']})...")
-            payload = {k: v for k, v in p.items() if k not in READONLY_FIELDS}
-            payload["dfp_services"] = []
-            payload["dfps"] = []
-            payload["network_lists"] = []
-            payload["roaming_device_groups"] = []
-            payload["user_groups"] = []
-            payload["net_address_dfps"] = []
-            r = requests.put(f"{POLICIES_ENDPOINT}/{p['id']}", headers=headers, json=payload)
-            r.raise_for_status()
-
-    # Delete all TD policies
+    scoped = [p for p in td_policies if is_scoped(p)]
+    if scoped:
+        http = RetryingSession(pool_size=args.workers)
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(lambda p: clear_scope(http, headers, p), scoped))
+
+    # Delete all matching policies in one bulk request
     ids = [p["id"] for p in td_policies]
     names = [p["name"] for p in td_policies]
     print(f"Deleting {', '.join(names)} (ids={ids})...")
@@ -71,9 +89,8 @@ def main():
 
     # Verify
     print("\nRemaining policies:")
-    resp = requests.get(POLICIES_ENDPOINT, headers=headers)
-    resp.raise_for_status()
-    for p in sorted(resp.json()["results"], key=lambda x: x["precedence"]):
+    policies = iter_results(requests, POLICIES_ENDPOINT, headers=headers)
+    for p in sorted(policies, key=lambda x: x["precedence"]):
         default = " (DEFAULT)" if p.get("is_default") else ""
         print(f"  prec={p['precedence']}  name='{p['name']}'{default}")
 
@@ -81,4 +98,5 @@ def main():
 
 
 if __name__ == "__main__":
+    lab_trace.install()
     main()
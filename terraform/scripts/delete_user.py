@@ -1,55 +1,122 @@
-import os, sys, time, random, requests
+import os, sys, time, random, argparse, requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from create_user import BulkResults, BULK_RESULTS_FILE
+from csp_session import CSPSession
+from http_retry import RetryingSession
+from lab_state import LabState
+import lab_trace
 
 BASE_URL = "https://csp.infoblox.com"
-EMAIL = os.getenv("INFOBLOX_EMAIL")
-PASSWORD = os.getenv("INFOBLOX_PASSWORD")
-SANDBOX_ID_FILE = "sandbox_id.txt"
-USER_ID_FILE = "user_id.txt"
-
-# --- Read IDs ---
-try:
-    sandbox_id = open(SANDBOX_ID_FILE).read().strip()
-    user_id = open(USER_ID_FILE).read().strip()
-except FileNotFoundError:
-    sys.exit("❌ sandbox_id.txt or user_id.txt not found. Run create scripts first.")
-
-if not sandbox_id or not user_id:
-    sys.exit("❌ Missing sandbox_id or user_id in file(s).")
-
-# --- Step 1: Login ---
-auth_url = f"{BASE_URL}/v2/session/users/sign_in"
-auth_resp = requests.post(auth_url, json={"email": EMAIL, "password": PASSWORD})
-auth_resp.raise_for_status()
-jwt = auth_resp.json()["jwt"]
-headers = {"Authorization": f"Bearer {jwt}", "Content-Type": "application/json"}
-print("✅ Authenticated.", flush=True)
-
-# --- Step 2: Switch account ---
-switch_url = f"{BASE_URL}/v2/session/account_switch"
-switch_resp = requests.post(switch_url, headers=headers, json={"id": f"identity/accounts/{sandbox_id}"})
-switch_resp.raise_for_status()
-jwt = switch_resp.json()["jwt"]
-headers["Authorization"] = f"Bearer {jwt}"
-print(f"🔁 Switched to sandbox account {sandbox_id}", flush=True)
-
-# --- Step 3: Delete user with retries ---
-endpoint = f"{BASE_URL}/v2/users/{user_id}"
-max_retries = 5
-
-for attempt in range(max_retries):
-    try:
-        print(f"🔗 DELETE {endpoint} (attempt {attempt+1})", flush=True)
-        resp = requests.delete(endpoint, headers=headers)
-
-        if resp.status_code == 204:
-            print(f"✅ User {user_id} deleted.", flush=True)
-            os.remove(USER_ID_FILE)
-            print(f"📁 Removed {USER_ID_FILE}", flush=True)
-            sys.exit(0)
+
+
+def delete_participant_user(email, password, sandbox_id, user_id, base_url=BASE_URL, max_retries=5) -> bool:
+    """Sign in as email/password, switch into the sandbox and delete the user; True once it is gone"""
+    # --- Step 1: Login ---
+    auth_url = f"{base_url}/v2/session/users/sign_in"
+    auth_resp = requests.post(auth_url, json={"email": email, "password": password})
+    auth_resp.raise_for_status()
+    jwt = auth_resp.json()["jwt"]
+    headers = {"Authorization": f"Bearer {jwt}", "Content-Type": "application/json"}
+    print("✅ Authenticated.", flush=True)
+
+    # --- Step 2: Switch account ---
+    switch_url = f"{base_url}/v2/session/account_switch"
+    switch_resp = requests.post(switch_url, headers=headers, json={"id": f"identity/accounts/{sandbox_id}"})
+    switch_resp.raise_for_status()
+    jwt = switch_resp.json()["jwt"]
+    headers["Authorization"] = f"Bearer {jwt}"
+    print(f"🔁 Switched to sandbox account {sandbox_id}", flush=True)
+
+    # --- Step 3: Delete user with retries ---
+    endpoint = f"{base_url}/v2/users/{user_id}"
+
+    for attempt in range(max_retries):
+        try:
+            print(f"🔗 DELETE {endpoint} (attempt {attempt+1})", flush=True)
+            resp = requests.delete(endpoint, headers=headers)
+
+            if resp.status_code == 204:
+                print(f"✅ User {user_id} deleted.", flush=True)
+                return True
+            else:
+                print(f"⚠️ Status {resp.status_code}: {resp.text}", flush=True)
+        except Exception as e:
+            print(f"⚠️ Error: {e}", flush=True)
+        time.sleep((2**attempt) + random.random())
+    return False
+
+
+def bulk_delete_users(sandbox_id=None, workers=8, results_file=BULK_RESULTS_FILE, email=None, password=None):
+    """Delete every user recorded by `create_user.py --roster` concurrently"""
+    results = BulkResults(results_file)
+    pending = [(name, entry["user_id"]) for name, entry in results.entries.items()
+               if entry.get("status") in ("created", "exists", "delete_failed") and entry.get("user_id")]
+    print(f"📋 {len(pending)} users to delete from {results_file}", flush=True)
+    if not pending:
+        return results
+
+    session = CSPSession(session=RetryingSession(pool_size=workers), email=email, password=password)
+    session.login()
+    session.switch_account(sandbox_id)
+    headers = session._auth_headers()
+
+    def delete_one(name, user_id):
+        resp = session.session.delete(f"{session.base_url}/v2/users/{user_id}", headers=headers)
+        if resp.status_code in (200, 204, 404):
+            results.update(name, status="deleted", error=None)
         else:
-            print(f"⚠️ Status {resp.status_code}: {resp.text}", flush=True)
-    except Exception as e:
-        print(f"⚠️ Error: {e}", flush=True)
-    time.sleep((2**attempt) + random.random())
+            raise RuntimeError(f"Status {resp.status_code}: {resp.text}")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(delete_one, name, user_id): name for name, user_id in pending}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                results.update(name, status="delete_failed", error=str(e))
+                print(f"⚠️ {name}: {e}", flush=True)
+
+    print(f"📊 Results written to {results_file}: {results.counts()}", flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Delete the participant user, or every user from a bulk run')
+    parser.add_argument('--bulk', action='store_true', help='Delete all users recorded in the bulk result file')
+    parser.add_argument('--sandbox-id', default=None, help='Sandbox account id (default: from lab state)')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent requests in bulk mode (default: 8)')
+    parser.add_argument('--results', default=BULK_RESULTS_FILE, help=f'Bulk result file (default: {BULK_RESULTS_FILE})')
+    args = parser.parse_args()
+
+    email = os.getenv("INFOBLOX_EMAIL")
+    password = os.getenv("INFOBLOX_PASSWORD")
+    if args.bulk:
+        results = bulk_delete_users(args.sandbox_id, args.workers, args.results, email, password)
+        if results.counts().get("delete_failed"):
+            sys.exit("❌ Some users could not be deleted, re-run the same command to retry")
+        sys.exit(0)
+
+    # --- Read IDs ---
+    state = LabState.load()
+    sandbox_id, user_id = state.sandbox_id, state.user_id
+
+    if not user_id:
+        # Not an error - the user may never have been created, or is already gone
+        print("⚠️ No user id in lab state, nothing to delete", flush=True)
+        sys.exit(0)
+    if not sandbox_id:
+        sys.exit("❌ Missing sandbox id in lab state. Run create scripts first.")
+
+    if delete_participant_user(email, password, sandbox_id, user_id):
+        LabState.update(user_id=None)
+        print("📁 Cleared user id from lab state", flush=True)
+        sys.exit(0)
+
+    sys.exit("❌ User deletion failed after retries")
+
 
-sys.exit("❌ User deletion failed after retries")
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
@@ -1,38 +1,9 @@
-import os
-import json
-import requests
-import time
-import subprocess
+from csp_session import CSPSession
+from lab_files import export_to_bashrc
+import lab_trace
 
-class InfobloxSession:
-    def __init__(self):
-        self.base_url = "https://csp.infoblox.com"
-        self.email = os.getenv("INFOBLOX_EMAIL")
-        self.password = os.getenv("INFOBLOX_PASSWORD")
-        self.jwt = None
-        self.session = requests.Session()
-        self.headers = {"Content-Type": "application/json"}
-
-    def login(self):
-        payload = {"email": self.email, "password": self.password}
-        response = self.session.post(f"{self.base_url}/v2/session/users/sign_in",
-                                     headers=self.headers, json=payload)
-        response.raise_for_status()
-        self.jwt = response.json().get("jwt")
-        print("Logged in and JWT acquired")
-
-    def switch_account(self):
-        sandbox_id = self._read_file("sandbox_id.txt")
-        payload = {"id": f"identity/accounts/{sandbox_id}"}
-        headers = self._auth_headers()
-        response = self.session.post(f"{self.base_url}/v2/session/account_switch",
-                                     headers=headers, json=payload)
-        response.raise_for_status()
-        self.jwt = response.json().get("jwt")
-        self._save_to_file("jwt.txt", self.jwt)
-        print(f"Switched to sandbox {sandbox_id} and updated JWT")
-
-    def create_api_key_and_export_env(self, key_name="Instruqt", expiration="2026-12-31T23:59:59.000Z"):
+class InfobloxSession(CSPSession):
+    def create_api_key(self, key_name="Instruqt", expiration="2026-12-31T23:59:59.000Z") -> str:
         url = f"{self.base_url}/v2/current_api_keys"
         headers = self._auth_headers()
         payload = {
@@ -49,35 +20,18 @@ class InfobloxSession:
 
         if not api_key:
             raise RuntimeError("Failed to extract API key from response.")
+        return api_key
 
-        # Save API key to ~/.bashrc
-        bashrc_path = os.path.expanduser("~/.bashrc")
-        export_line = f'export TF_VAR_ddi_api_key="{api_key}"\n'
-
-        with open(bashrc_path, "r") as f:
-            lines = f.readlines()
-
-        if export_line not in lines:
-            with open(bashrc_path, "a") as f:
-                f.write(f"\n# Exported by InfobloxSession on {time.ctime()}\n")
-                f.write(export_line)
+    def create_api_key_and_export_env(self, key_name="Instruqt", expiration="2026-12-31T23:59:59.000Z"):
+        api_key = self.create_api_key(key_name, expiration)
 
-        # Set in current process environment
-        os.environ["TF_VAR_ddi_api_key"] = api_key
+        # Save API key to ~/.bashrc and set in current process environment
+        export_to_bashrc({"TF_VAR_ddi_api_key": api_key})
         print("API Key stored as TF_VAR_ddi_api_key in ~/.bashrc")
 
-    def _auth_headers(self):
-        return {"Content-Type": "application/json", "Authorization": f"Bearer {self.jwt}"}
-    def _save_to_file(self, filename, content):
-        with open(filename, "w") as f:
-            f.write(content.strip())
-
-    def _read_file(self, filename):
-        with open(filename, "r") as f:
-            return f.read().strip()
-
 
 if __name__ == "__main__":
+    lab_trace.install()
     session = InfobloxSession()
     session.login()
     session.switch_account()
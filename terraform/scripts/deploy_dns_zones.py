@@ -5,35 +5,24 @@ Deploy DNS zones and records on both NIOS Grid Masters via WAPI.
 GM1 ($GM_IP)  -> test.com  (zone + A, CNAME, MX, TXT records)
 GM2 ($GM2_IP) -> jag.com   (zone + A, CNAME, MX, TXT records)
 
-All config from environment variables — no CLI args, no interactive input.
-Required env vars: GM_IP, GM2_IP, TF_VAR_windows_admin_password
+All config from the terraform outputs and environment variables — no CLI
+args, no interactive input. GM_IP comes from the terraform outputs when
+there is state (tf_outputs.py), otherwise from the environment.
+Required env vars: GM2_IP, TF_VAR_windows_admin_password
 """
 
 import os
 import sys
 import requests
 import urllib3
+from tf_outputs import host_ips
+import lab_trace
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 WAPI_VERSIONS = ["v2.14", "v2.13.1", "v2.13", "v2.12"]
 USERNAME = "admin"
 
-# ---------------------------
-# Environment variables
-# ---------------------------
-gm1_ip = os.getenv("GM_IP")
-gm2_ip = os.getenv("GM2_IP")
-password = os.getenv("TF_VAR_windows_admin_password")
-
-if not gm1_ip or not gm2_ip:
-    print("ERROR: GM_IP and GM2_IP must be set")
-    sys.exit(1)
-
-if not password:
-    print("ERROR: TF_VAR_windows_admin_password must be set")
-    sys.exit(1)
-
 # ---------------------------
 # Zone and record definitions
 # ---------------------------
@@ -123,13 +112,20 @@ def log(msg, ok=True):
     print(f"  [{tag}] {msg}")
 
 
-def find_wapi_version(gm_ip):
-    auth = (USERNAME, password)
+def wapi_session(password, username=USERNAME):
+    """Keep-alive session with the WAPI credentials, shared by every call to both GMs"""
+    http = requests.Session()
+    http.auth = (username, password)
+    http.verify = False
+    return http
+
+
+def find_wapi_version(http, gm_ip):
     for v in WAPI_VERSIONS:
         try:
-            r = requests.get(
+            r = http.get(
                 f"https://{gm_ip}/wapi/{v}/grid",
-                auth=auth, verify=False, timeout=10,
+                timeout=10,
             )
             if r.status_code == 200:
                 log(f"WAPI version: {v}")
@@ -143,10 +139,10 @@ def find_wapi_version(gm_ip):
     return None
 
 
-def wapi_post(gm_ip, wapi, path, payload):
-    return requests.post(
+def wapi_post(http, gm_ip, wapi, path, payload):
+    return http.post(
         f"https://{gm_ip}/wapi/{wapi}/{path}",
-        auth=(USERNAME, password), json=payload, verify=False, timeout=15,
+        json=payload, timeout=15,
     )
 
 
@@ -154,8 +150,8 @@ def wapi_post(gm_ip, wapi, path, payload):
 # Deploy logic
 # ---------------------------
 
-def create_zone(gm_ip, wapi, fqdn):
-    r = wapi_post(gm_ip, wapi, "zone_auth", {"fqdn": fqdn})
+def create_zone(http, gm_ip, wapi, fqdn):
+    r = wapi_post(http, gm_ip, wapi, "zone_auth", {"fqdn": fqdn})
     if r.status_code == 201:
         log(f"Zone created: {fqdn}")
         return True
@@ -167,11 +163,11 @@ def create_zone(gm_ip, wapi, fqdn):
         return False
 
 
-def create_records(gm_ip, wapi, records):
+def create_records(http, gm_ip, wapi, records):
     for record_type, entries in records.items():
         for payload in entries:
             name = payload.get("name", "?")
-            r = wapi_post(gm_ip, wapi, record_type, payload)
+            r = wapi_post(http, gm_ip, wapi, record_type, payload)
             if r.status_code == 201:
                 log(f"{record_type:15s} {name}")
             elif r.status_code == 400 and "already exists" in r.text.lower():
@@ -180,23 +176,23 @@ def create_records(gm_ip, wapi, records):
                 log(f"{record_type:15s} {name} — HTTP {r.status_code}: {r.text[:200]}", ok=False)
 
 
-def deploy_gm(label, gm_ip, zone, records):
+def deploy_gm(http, label, gm_ip, zone, records):
     print(f"\n{'='*50}")
     print(f"  {label}: {gm_ip} -> {zone}")
     print(f"{'='*50}\n")
 
-    wapi = find_wapi_version(gm_ip)
+    wapi = find_wapi_version(http, gm_ip)
     if not wapi:
         print(f"  Skipping {label} — cannot connect\n")
         return
 
     print(f"\n  --- Zone ---")
-    if not create_zone(gm_ip, wapi, zone):
+    if not create_zone(http, gm_ip, wapi, zone):
         print(f"  Skipping records — zone creation failed\n")
         return
 
     print(f"\n  --- Records ---")
-    create_records(gm_ip, wapi, records)
+    create_records(http, gm_ip, wapi, records)
     print()
 
 
@@ -204,14 +200,34 @@ def deploy_gm(label, gm_ip, zone, records):
 # Main
 # ---------------------------
 
-def main():
+def deploy_dns_zones(gm1_ip, gm2_ip, password, http=None):
+    """Create the test.com zone on GM1 and jag.com on GM2 with their records"""
+    http = http or wapi_session(password)
     print("=== Deploy DNS Zones on NIOS Grid Masters ===")
 
-    deploy_gm("GM1", gm1_ip, GM1_ZONE, GM1_RECORDS)
-    deploy_gm("GM2", gm2_ip, GM2_ZONE, GM2_RECORDS)
+    deploy_gm(http, "GM1", gm1_ip, GM1_ZONE, GM1_RECORDS)
+    deploy_gm(http, "GM2", gm2_ip, GM2_ZONE, GM2_RECORDS)
 
     print("=== DNS deployment complete ===")
 
 
+def main():
+    ips = host_ips()
+    gm1_ip = ips.get("GM_IP")
+    gm2_ip = ips.get("GM2_IP")
+    password = os.getenv("TF_VAR_windows_admin_password")
+
+    if not gm1_ip or not gm2_ip:
+        print("ERROR: GM_IP and GM2_IP must be set")
+        sys.exit(1)
+
+    if not password:
+        print("ERROR: TF_VAR_windows_admin_password must be set")
+        sys.exit(1)
+
+    deploy_dns_zones(gm1_ip, gm2_ip, password)
+
+
 if __name__ == "__main__":
+    lab_trace.install()
     main()
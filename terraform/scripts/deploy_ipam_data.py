@@ -5,35 +5,24 @@ Deploy IPAM data (network containers, networks, fixed addresses, DHCP ranges) on
 GM1 ($GM_IP)  -> 10.10.0.0/16 corporate space (correlated with test.com DNS)
 GM2 ($GM2_IP) -> 172.16.0.0/16 branch space   (correlated with jag.com DNS)
 
-All config from environment variables — no CLI args, no interactive input.
-Required env vars: GM_IP, GM2_IP, TF_VAR_windows_admin_password
+All config from the terraform outputs and environment variables — no CLI
+args, no interactive input. GM_IP comes from the terraform outputs when
+there is state (tf_outputs.py), otherwise from the environment.
+Required env vars: GM2_IP, TF_VAR_windows_admin_password
 """
 
 import os
 import sys
 import requests
 import urllib3
+from tf_outputs import host_ips
+import lab_trace
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 WAPI_VERSIONS = ["v2.14", "v2.13.1", "v2.13", "v2.12"]
 USERNAME = "admin"
 
-# ---------------------------
-# Environment variables
-# ---------------------------
-gm1_ip = os.getenv("GM_IP")
-gm2_ip = os.getenv("GM2_IP")
-password = os.getenv("TF_VAR_windows_admin_password")
-
-if not gm1_ip or not gm2_ip:
-    print("ERROR: GM_IP and GM2_IP must be set")
-    sys.exit(1)
-
-if not password:
-    print("ERROR: TF_VAR_windows_admin_password must be set")
-    sys.exit(1)
-
 # ---------------------------
 # IPAM definitions — GM1 (test.com / 10.10.x.x)
 # ---------------------------
@@ -199,13 +188,20 @@ def log(msg, ok=True):
     print(f"  [{tag}] {msg}")
 
 
-def find_wapi_version(gm_ip):
-    auth = (USERNAME, password)
+def wapi_session(password, username=USERNAME):
+    """Keep-alive session with the WAPI credentials, shared by every call to both GMs"""
+    http = requests.Session()
+    http.auth = (username, password)
+    http.verify = False
+    return http
+
+
+def find_wapi_version(http, gm_ip):
     for v in WAPI_VERSIONS:
         try:
-            r = requests.get(
+            r = http.get(
                 f"https://{gm_ip}/wapi/{v}/grid",
-                auth=auth, verify=False, timeout=10,
+                timeout=10,
             )
             if r.status_code == 200:
                 log(f"WAPI version: {v}")
@@ -219,15 +215,15 @@ def find_wapi_version(gm_ip):
     return None
 
 
-def wapi_post(gm_ip, wapi, path, payload):
-    return requests.post(
+def wapi_post(http, gm_ip, wapi, path, payload):
+    return http.post(
         f"https://{gm_ip}/wapi/{wapi}/{path}",
-        auth=(USERNAME, password), json=payload, verify=False, timeout=15,
+        json=payload, timeout=15,
     )
 
 
-def create_object(gm_ip, wapi, obj_type, payload, label):
-    r = wapi_post(gm_ip, wapi, obj_type, payload)
+def create_object(http, gm_ip, wapi, obj_type, payload, label):
+    r = wapi_post(http, gm_ip, wapi, obj_type, payload)
     if r.status_code == 201:
         log(label)
         return True
@@ -243,29 +239,29 @@ def create_object(gm_ip, wapi, obj_type, payload, label):
 # Deploy logic
 # ---------------------------
 
-def deploy_gm(label, gm_ip, containers, networks, fixed_addrs, dhcp_ranges):
+def deploy_gm(http, label, gm_ip, containers, networks, fixed_addrs, dhcp_ranges):
     print(f"\n{'='*50}")
     print(f"  {label}: {gm_ip}")
     print(f"{'='*50}")
 
-    wapi = find_wapi_version(gm_ip)
+    wapi = find_wapi_version(http, gm_ip)
     if not wapi:
         print(f"  Skipping {label} — cannot connect\n")
         return
 
     print(f"\n  --- Network containers ---")
     for c in containers:
-        create_object(gm_ip, wapi, "networkcontainer", c,
+        create_object(http, gm_ip, wapi, "networkcontainer", c,
                        f"Container {c['network']:18s} {c['comment']}")
 
     print(f"\n  --- Networks ---")
     for n in networks:
-        create_object(gm_ip, wapi, "network", n,
+        create_object(http, gm_ip, wapi, "network", n,
                        f"Network   {n['network']:18s} {n['comment']}")
 
     print(f"\n  --- Fixed addresses ---")
     for fa in fixed_addrs:
-        create_object(gm_ip, wapi, "fixedaddress", fa,
+        create_object(http, gm_ip, wapi, "fixedaddress", fa,
                        f"Fixed     {fa['ipv4addr']:18s} {fa['name']}")
 
     print(f"\n  --- DHCP ranges ---")
@@ -275,7 +271,7 @@ def deploy_gm(label, gm_ip, containers, networks, fixed_addrs, dhcp_ranges):
             "end_addr": dr["end_addr"],
             "comment": dr["comment"],
         }
-        create_object(gm_ip, wapi, "range", payload,
+        create_object(http, gm_ip, wapi, "range", payload,
                        f"Range     {dr['start_addr']} — {dr['end_addr']}  {dr['comment']}")
 
     print()
@@ -285,17 +281,37 @@ def deploy_gm(label, gm_ip, containers, networks, fixed_addrs, dhcp_ranges):
 # Main
 # ---------------------------
 
-def main():
+def deploy_ipam_data(gm1_ip, gm2_ip, password, http=None):
+    """Create the GM1 and GM2 IPAM objects"""
+    http = http or wapi_session(password)
     print("=== Deploy IPAM Data on NIOS Grid Masters ===")
 
-    deploy_gm("GM1 (test.com)", gm1_ip,
+    deploy_gm(http, "GM1 (test.com)", gm1_ip,
               GM1_CONTAINERS, GM1_NETWORKS, GM1_FIXED, GM1_RANGES)
 
-    deploy_gm("GM2 (jag.com)", gm2_ip,
+    deploy_gm(http, "GM2 (jag.com)", gm2_ip,
               GM2_CONTAINERS, GM2_NETWORKS, GM2_FIXED, GM2_RANGES)
 
     print("=== IPAM deployment complete ===")
 
 
+def main():
+    ips = host_ips()
+    gm1_ip = ips.get("GM_IP")
+    gm2_ip = ips.get("GM2_IP")
+    password = os.getenv("TF_VAR_windows_admin_password")
+
+    if not gm1_ip or not gm2_ip:
+        print("ERROR: GM_IP and GM2_IP must be set")
+        sys.exit(1)
+
+    if not password:
+        print("ERROR: TF_VAR_windows_admin_password must be set")
+        sys.exit(1)
+
+    deploy_ipam_data(gm1_ip, gm2_ip, password)
+
+
 if __name__ == "__main__":
+    lab_trace.install()
     main()
@@ -11,6 +11,7 @@ import requests
 import urllib3
 import argparse
 import sys
+import lab_trace
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -111,4 +112,5 @@ def main():
 
 
 if __name__ == "__main__":
+    lab_trace.install()
     main()
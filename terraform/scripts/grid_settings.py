@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Apply the CSP join token and Cloud Grid Management in one grid update.
+
+Replaces running set_csp_join_token.py and enable_nios_management.py back
+to back: the grid ref and current settings are read with a single GET, both
+csp_grid_setting.csp_join_token and enable_federation go out in one PUT,
+and the PUT's _return_fields response is what gets verified. The token is
+merged into the csp_grid_setting struct read from the grid, so the PUT does
+not reset the struct's other fields.
+
+The WAPI version is detected like enable_nios_management.py does (highest
+of v2.14, v2.13.1, v2.13, v2.12 that answers) unless --wapi-version is
+given. On a version without enable_federation the federation setting is
+skipped with a warning and only the join token is applied.
+
+Usage:
+  python3 grid_settings.py --gm <IP> --password <pass>
+  python3 grid_settings.py --gm <IP> --password <pass> --federation keep
+"""
+
+import os
+import sys
+import argparse
+import requests
+import urllib3
+from enable_nios_management import find_wapi_version
+import lab_trace
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+GRID_FIELDS = "csp_grid_setting,enable_federation"
+CSP_FIELDS = "csp_grid_setting"
+
+
+def read_join_token(token_file: str) -> str:
+    """Read join token from file"""
+    with open(token_file, 'r') as f:
+        return f.read().strip()
+
+
+def read_grid(http, gm_ip: str, wapi_version: str) -> dict:
+    """
+    Grid object with its _ref and current CSP/federation settings.
+    Without enable_federation on this WAPI version, the grid comes back
+    without that key.
+    """
+    response = http.get(
+        f"https://{gm_ip}/wapi/{wapi_version}/grid",
+        params={"_return_fields": GRID_FIELDS},
+        timeout=15
+    )
+    if response.status_code == 400 and "enable_federation" in response.text:
+        print(f"⚠️ enable_federation not available on WAPI {wapi_version}")
+        response = http.get(
+            f"https://{gm_ip}/wapi/{wapi_version}/grid",
+            params={"_return_fields": CSP_FIELDS},
+            timeout=15
+        )
+    response.raise_for_status()
+    grid_objects = response.json()
+
+    if not grid_objects:
+        raise Exception("No grid object found")
+
+    return grid_objects[0]
+
+
+def grid_changes(grid: dict, join_token: str = None, federation: bool = None) -> dict:
+    """PUT payload for the settings that differ from the current grid"""
+    payload = {}
+    csp_setting = grid.get("csp_grid_setting") or {}
+    if join_token is not None and csp_setting.get("csp_join_token") != join_token:
+        payload["csp_grid_setting"] = {**csp_setting, "csp_join_token": join_token}
+    if federation is not None and grid.get("enable_federation") != federation:
+        payload["enable_federation"] = federation
+    return payload
+
+
+def update_grid(http, gm_ip: str, grid_ref: str, payload: dict, wapi_version: str) -> dict:
+    """PUT the changes; returns the updated settings from the response"""
+    response = http.put(
+        f"https://{gm_ip}/wapi/{wapi_version}/{grid_ref}",
+        params={"_return_fields": GRID_FIELDS if "enable_federation" in payload else CSP_FIELDS},
+        json=payload,
+        timeout=15
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Set the CSP join token and Cloud Grid Management in one update')
+    parser.add_argument('--gm', required=True, help='Grid Master IP or hostname')
+    parser.add_argument('--user', default='admin', help='WAPI username (default: admin)')
+    parser.add_argument('--password', required=True, help='WAPI password')
+    parser.add_argument('--token-file', default='join_token.txt', help='Path to join token file')
+    parser.add_argument('--wapi-version', default=None, help='WAPI version (auto-detect if not set)')
+    parser.add_argument('--federation', choices=['on', 'off', 'keep'], default='on',
+                        help='Cloud Grid Management (enable_federation) setting (default: on)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.token_file):
+        print(f"ERROR: Token file not found: {args.token_file}")
+        sys.exit(1)
+
+    join_token = read_join_token(args.token_file)
+    print(f"Read join token from {args.token_file} ({len(join_token)} chars)")
+    federation = {"on": True, "off": False, "keep": None}[args.federation]
+
+    http = requests.Session()
+    http.auth = (args.user, args.password)
+    http.verify = False
+
+    wapi_version = args.wapi_version or find_wapi_version(args.gm, args.user, args.password)
+
+    try:
+        grid = read_grid(http, args.gm, wapi_version)
+        print(f"Found Grid: {grid['_ref']}")
+        if federation is not None and "enable_federation" not in grid:
+            print("⚠️ Skipping Cloud Grid Management: enable_federation field not available")
+            federation = None
+
+        payload = grid_changes(grid, join_token, federation)
+        if not payload:
+            print("Grid settings already up to date")
+            return
+
+        print(f"Updating {', '.join(payload)} on {args.gm}...")
+        updated = update_grid(http, args.gm, grid["_ref"], payload, wapi_version)
+
+        print("Updated CSP Settings:")
+        for key, value in (updated.get("csp_grid_setting") or {}).items():
+            print(f"  {key}: {value}")
+        if (updated.get("csp_grid_setting") or {}).get("csp_join_token") != join_token:
+            print("ERROR: csp_join_token on the grid does not match the join token after the update")
+            sys.exit(1)
+        if federation is not None:
+            if updated.get("enable_federation") != federation:
+                print(f"ERROR: enable_federation is {updated.get('enable_federation')} after the update")
+                sys.exit(1)
+            print(f"Cloud Grid Management: {'ENABLED' if federation else 'DISABLED'}")
+
+    except requests.exceptions.HTTPError as e:
+        print(f"HTTP Error: {e}")
+        print(f"Response: {e.response.text}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Wait for the Grid Masters and NIOS-X hosts to come up, all at once.
+
+Every host is polled in its own thread with short connect timeouts and
+jittered backoff between attempts:
+
+  GM1, GM2         WAPI answers GET /grid with 200 on a supported version
+  NIOSX-1, NIOSX-2 the host is registered in CSP and its status is online
+
+The moment a host is ready a "✅ <host> ready" line is printed, its
+--on-ready command (if any) starts, and --ready-dir gets a <host>.ready
+file, so that host's configuration does not wait for the slowest one.
+
+Usage:
+  python3 host_readiness.py                          # all four hosts
+  python3 host_readiness.py --hosts GM1 GM2
+  python3 host_readiness.py --hosts GM1 --ready-dir ready/
+  python3 host_readiness.py --on-ready "GM1=python3 deploy_dns_zones.py"
+"""
+
+import os
+import sys
+import time
+import shlex
+import argparse
+import threading
+import subprocess
+import requests
+import urllib3
+
+from http_retry import BackoffPolicy
+from lab_files import write_atomic
+from tf_outputs import host_ips
+import lab_trace
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+CSP_URL = "https://csp.infoblox.com"
+WAPI_VERSIONS = ["v2.14", "v2.13.1", "v2.13", "v2.12"]
+USERNAME = "admin"
+PROBE_TIMEOUT = (3, 10)    # (connect, read): a host that is still booting fails fast
+
+# host -> IP variable
+GM_HOSTS = {"GM1": "GM_IP", "GM2": "GM2_IP"}
+# host -> private address it registers with in CSP (niosx.tf)
+NIOSX_HOSTS = {"NIOSX-1": "10.100.0.200", "NIOSX-2": "10.100.1.200"}
+CSP_ONLINE = "online"
+
+
+def wapi_probe(http, gm_ip, versions=WAPI_VERSIONS, timeout=PROBE_TIMEOUT):
+    """() -> (ready, detail): WAPI on gm_ip answers on one of the versions"""
+    def probe():
+        for v in versions:
+            try:
+                r = http.get(f"https://{gm_ip}/wapi/{v}/grid", timeout=timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                # Nothing listening yet; the other versions would only time out too
+                return False, "unreachable"
+            if r.status_code == 200:
+                return True, f"WAPI {v}"
+            if r.status_code in (401, 403):
+                return False, f"HTTP {r.status_code} (admin account not ready)"
+        return False, "no supported WAPI version"
+    return probe
+
+
+def csp_host_probe(http, api_key, address, base_url=CSP_URL, timeout=PROBE_TIMEOUT):
+    """() -> (ready, detail): the CSP host with this address reports online"""
+    headers = {"Authorization": f"Token {api_key}"}
+
+    def probe():
+        try:
+            r = http.get(f"{base_url}/api/infra/v1/detail_hosts", headers=headers, timeout=timeout,
+                         params={"_filter": f'ip_address=="{address}"'})
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            return False, "CSP unreachable"
+        if r.status_code != 200:
+            return False, f"CSP HTTP {r.status_code}"
+        hosts = r.json().get("results", [])
+        if not hosts:
+            return False, "not registered in CSP"
+        status = hosts[0].get("composite_status", "unknown")
+        return status == CSP_ONLINE, f"{hosts[0].get('display_name', address)} {status}"
+    return probe
+
+
+class ReadinessPoller:
+    """Poll every probe concurrently and report each host as soon as it is ready"""
+
+    def __init__(self, probes, on_ready=None, base_delay=2.0, max_delay=20.0, timeout=1800):
+        self.probes = probes
+        self.on_ready = on_ready
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.events = {name: threading.Event() for name in probes}
+        self.ready_after = {}
+        self.stop = threading.Event()
+        self.t0 = time.monotonic()
+
+    def _watch(self, name, probe):
+        backoff = BackoffPolicy(self.base_delay, self.max_delay)
+        last = None
+        while not self.stop.is_set():
+            with lab_trace.span(f"probe {name}", cat="readiness"):
+                ready, detail = probe()
+            elapsed = time.monotonic() - self.t0
+            if ready:
+                self.ready_after[name] = elapsed
+                print(f"✅ {name} ready after {elapsed:.0f}s ({detail})", flush=True)
+                self.events[name].set()
+                if self.on_ready:
+                    self.on_ready(name, detail)
+                return
+            if detail != last:
+                print(f"⏳ {name}: {detail} (+{elapsed:.0f}s)", flush=True)
+                last = detail
+            if elapsed >= self.timeout:
+                print(f"❌ {name} not ready after {elapsed:.0f}s ({detail})", flush=True)
+                return
+            self.stop.wait(backoff.next_delay())
+
+    def wait(self, name, timeout=None):
+        return self.events[name].wait(timeout)
+
+    def run(self):
+        """Block until every host is ready or timed out; returns the hosts that are ready"""
+        threads = [threading.Thread(target=self._watch, args=(name, probe), daemon=True, name=name)
+                   for name, probe in self.probes.items()]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                t.join()
+        except KeyboardInterrupt:
+            self.stop.set()
+            raise
+        return set(self.ready_after)
+
+
+def build_probes(hosts, ips, password, api_key, http=None):
+    """{host: probe} for the requested hosts; raises ValueError for missing settings"""
+    http = http or requests.Session()
+    http.verify = False
+    probes = {}
+    for host in hosts:
+        if host in GM_HOSTS:
+            if not ips.get(GM_HOSTS[host]) or not password:
+                raise ValueError(f"{host} needs {GM_HOSTS[host]} and TF_VAR_windows_admin_password")
+            gm_http = requests.Session()
+            gm_http.auth = (USERNAME, password)
+            gm_http.verify = False
+            probes[host] = wapi_probe(gm_http, ips[GM_HOSTS[host]])
+        elif host in NIOSX_HOSTS:
+            if not api_key:
+                raise ValueError(f"{host} needs TF_VAR_ddi_api_key")
+            probes[host] = csp_host_probe(http, api_key, NIOSX_HOSTS[host])
+        else:
+            raise ValueError(f"Unknown host {host}")
+    return probes
+
+
+def parse_on_ready(values):
+    commands = {}
+    for value in values or ():
+        host, sep, command = value.partition("=")
+        if not sep or not command:
+            raise ValueError(f"--on-ready expects HOST=COMMAND, got {value!r}")
+        commands[host] = shlex.split(command)
+    return commands
+
+
+def main():
+    all_hosts = [*GM_HOSTS, *NIOSX_HOSTS]
+    parser = argparse.ArgumentParser(description='Wait for the GMs and NIOS-X hosts to be ready, concurrently')
+    parser.add_argument('--hosts', nargs='+', choices=all_hosts, default=all_hosts, help='Hosts to wait for (default: all)')
+    parser.add_argument('--timeout', type=float, default=1800, help='Give up on a host after this many seconds (default: 1800)')
+    parser.add_argument('--max-delay', type=float, default=20.0, help='Longest wait between polls of one host (default: 20s)')
+    parser.add_argument('--on-ready', action='append', metavar='HOST=COMMAND',
+                        help='Command started as soon as HOST is ready (repeatable)')
+    parser.add_argument('--ready-dir', help='Write <host>.ready into this directory when a host is ready')
+    args = parser.parse_args()
+
+    try:
+        commands = parse_on_ready(args.on_ready)
+        probes = build_probes(args.hosts, host_ips(), os.getenv("TF_VAR_windows_admin_password"),
+                              os.getenv("TF_VAR_ddi_api_key"))
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    if args.ready_dir:
+        os.makedirs(args.ready_dir, exist_ok=True)
+
+    started = []
+
+    def on_ready(host, detail):
+        if args.ready_dir:
+            write_atomic(os.path.join(args.ready_dir, f"{host}.ready"), f"{detail}\n")
+        if host in commands:
+            print(f"🚀 {host}: {shlex.join(commands[host])}", flush=True)
+            started.append((host, subprocess.Popen(commands[host])))
+
+    poller = ReadinessPoller(probes, on_ready=on_ready, max_delay=args.max_delay, timeout=args.timeout)
+    ready = poller.run()
+
+    failed = [host for host, proc in started if proc.wait() != 0]
+    for host in failed:
+        print(f"❌ {host}: on-ready command failed", flush=True)
+    not_ready = [host for host in args.hosts if host not in ready]
+    if not_ready or failed:
+        sys.exit(1)
+    print(f"✅ All hosts ready in {max(poller.ready_after.values()):.0f}s", flush=True)
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
@@ -0,0 +1,171 @@
+"""
+Retrying HTTP session for CSP calls made in bulk.
+
+RetryingSession is a drop-in requests.Session that retries 429 and 5xx
+responses (and connection errors) with jittered exponential backoff,
+honoring Retry-After when the server sends it. Only idempotent methods are
+retried on every failure: a POST that timed out or got a 5xx may already have
+been committed, so it is retried only when it never reached the server
+(connect timeout/refused) or was rejected with 429.
+
+BackoffPolicy is the building block for callers that run their own retry
+loop (broker allocation): decorrelated jitter, with any server-requested
+delay (Retry-After, RateLimit-Reset) as a floor. A server-requested delay is
+capped at SERVER_DELAY_CAP_FACTOR x max_delay, so a bad header (a far-off
+date, an epoch misread as a delta) cannot park a caller for hours.
+"""
+
+import random
+import time
+import email.utils
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Longest server-requested delay honored, as a multiple of the caller's max_delay
+SERVER_DELAY_CAP_FACTOR = 10
+
+
+RATE_LIMIT_REMAINING_HEADERS = ("RateLimit-Remaining", "X-RateLimit-Remaining")
+RATE_LIMIT_RESET_HEADERS = ("RateLimit-Reset", "X-RateLimit-Reset")
+
+
+def retry_after_seconds(response):
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP-date), or None"""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _header_number(response, names):
+    for name in names:
+        value = response.headers.get(name)
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                continue
+    return None
+
+
+def rate_limit_reset_seconds(response):
+    """Seconds until the rate-limit window resets, when the quota is used up, or None"""
+    if response is None or _header_number(response, RATE_LIMIT_REMAINING_HEADERS) != 0:
+        return None
+    reset = _header_number(response, RATE_LIMIT_RESET_HEADERS)
+    if reset is None:
+        return None
+    # Some servers send an epoch timestamp instead of a delta
+    if reset > 10 ** 9:
+        reset -= time.time()
+    return max(0.0, reset)
+
+
+def server_delay(response, cap=None):
+    """Delay the server asked for via Retry-After or rate-limit headers (at most cap), or None"""
+    delays = [d for d in (retry_after_seconds(response), rate_limit_reset_seconds(response)) if d is not None]
+    if not delays:
+        return None
+    return min(max(delays), cap) if cap is not None else max(delays)
+
+
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 30.0) -> float:
+    """Full-jitter exponential backoff for the given 0-based attempt"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class BackoffPolicy:
+    """
+    Decorrelated-jitter backoff: each delay is uniform(base, previous * 3),
+    capped at max_delay. A delay requested by the server is used as a floor
+    (and is honored beyond max_delay, up to SERVER_DELAY_CAP_FACTOR x max_delay).
+    """
+
+    def __init__(self, base_delay: float = 1.0, max_delay: float = 30.0, logger=None):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.logger = logger
+        self._previous = base_delay
+
+    def next_delay(self, response=None) -> float:
+        self._previous = min(self.max_delay, random.uniform(self.base_delay, self._previous * 3))
+        requested = server_delay(response)
+        if requested is None:
+            return self._previous
+        cap = self.max_delay * SERVER_DELAY_CAP_FACTOR
+        if requested > cap:
+            if self.logger:
+                self.logger.warning("Server asked to wait %.0fs, capping at %.0fs", requested, cap)
+            else:
+                print(f"⚠️ Server asked to wait {requested:.0f}s, capping at {cap:.0f}s", flush=True)
+            requested = cap
+        return max(requested, self._previous)
+
+    def reset(self):
+        self._previous = self.base_delay
+
+
+class RetryingSession(requests.Session):
+    def __init__(self, retries: int = 5, statuses=RETRY_STATUSES, base_delay: float = 1.0,
+                 max_delay: float = 30.0, pool_size: int = 10, timeout=(5, 30), logger=None,
+                 allowed_methods=IDEMPOTENT_METHODS):
+        super().__init__()
+        self.logger = logger
+        self.retries = retries
+        self.statuses = set(statuses)
+        self.allowed_methods = {m.upper() for m in allowed_methods}
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def _retryable_error(self, method, error):
+        if method.upper() in self.allowed_methods:
+            return True
+        # The request never left: a connect timeout, or the connection was refused
+        return (isinstance(error, requests.exceptions.ConnectTimeout)
+                or (isinstance(error, requests.exceptions.ConnectionError)
+                    and isinstance(getattr(error.args[0] if error.args else None, "reason", None),
+                                   urllib3.exceptions.NewConnectionError)))
+
+    def _retryable_status(self, method, status_code):
+        if status_code not in self.statuses:
+            return False
+        return method.upper() in self.allowed_methods or status_code == 429
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.retries + 1):
+            try:
+                response = super().request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.retries or not self._retryable_error(method, e):
+                    raise
+                time.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+                continue
+
+            if not self._retryable_status(method, response.status_code) or attempt == self.retries:
+                return response
+
+            delay = retry_after_seconds(response)
+            if delay is None:
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+            delay = min(delay, self.max_delay)
+            if self.logger:
+                self.logger.warning("HTTP %s on %s %s, retrying in %.1fs", response.status_code, method, url, delay)
+            else:
+                print(f"⚠️ HTTP {response.status_code} on {method} {url}, retrying in {delay:.1f}s", flush=True)
+            time.sleep(delay)
+        return response
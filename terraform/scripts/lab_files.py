@@ -0,0 +1,88 @@
+"""
+Helpers for writing lab artifacts (ID files, tokens, ~/.bashrc exports).
+
+Every write goes through a temp file in the same directory followed by
+os.replace(), so a crashed or killed step never leaves a half-written file
+behind for the next step to read.
+"""
+
+import os
+import stat
+import tempfile
+import threading
+import time
+
+_bashrc_lock = threading.Lock()
+
+
+def write_atomic(path: str, content: str):
+    """Write content to path atomically (temp file + rename)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        if os.path.exists(path):
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def export_to_bashrc(variables: dict, source: str = "InfobloxSession", bashrc_path: str = None) -> bool:
+    """
+    Add `export NAME="value"` lines to ~/.bashrc for every variable not already
+    exported with the same value, and set them in os.environ.
+    Returns True if ~/.bashrc was changed.
+    """
+    bashrc_path = os.path.realpath(bashrc_path or os.path.expanduser("~/.bashrc"))
+
+    with _bashrc_lock:
+        try:
+            with open(bashrc_path, "r") as f:
+                content = f.read()
+        except FileNotFoundError:
+            content = ""
+
+        lines = content.splitlines(keepends=True)
+        new_lines = []
+        for name, value in variables.items():
+            os.environ[name] = value
+            export_line = f'export {name}="{value}"\n'
+            if export_line not in lines:
+                new_lines.append(export_line)
+
+        if not new_lines:
+            return False
+
+        if content and not content.endswith("\n"):
+            content += "\n"
+        content += f"\n# Exported by {source} on {time.ctime()}\n"
+        content += "".join(new_lines)
+        write_atomic(bashrc_path, content)
+        return True
+
+
+def read_bashrc_exports(names=None, bashrc_path: str = None) -> dict:
+    """Values of `export NAME="value"` lines in ~/.bashrc (the last one wins)"""
+    bashrc_path = os.path.realpath(bashrc_path or os.path.expanduser("~/.bashrc"))
+    exports = {}
+    try:
+        with open(bashrc_path, "r") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return exports
+    for line in lines:
+        line = line.strip()
+        if not line.startswith("export ") or "=" not in line:
+            continue
+        name, value = line[len("export "):].split("=", 1)
+        if names is None or name in names:
+            exports[name] = value.strip().strip('"')
+    return exports
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Run the whole lab provisioning flow as a dependency graph.
+
+Each step declares the steps whose outputs it needs; every step whose
+dependencies have finished starts right away, so independent work runs in
+parallel:
+
+  sandbox ─┬─ user
+           ├─ api_key ──── security_policies
+           └─ join_token ─ terraform ─┬─ setup_dns
+                                      ├─ create_dns_niosx
+                                      ├─ niosx_ready
+                                      ├─ gm1_ready ─┬─ grid_settings ─ csp_connected
+                                      │             └─ deploy_ipam_data, deploy_dns_zones
+                                      └─ gm2_ready ───────────────┘
+
+Values a step publishes (API key and join token via ~/.bashrc, host IPs via
+terraform outputs) are passed to the steps after it through the environment.
+Step output goes to <log-dir>/<step>.log. When a step fails, the steps that
+depend on it are skipped and everything else still runs. The critical path
+is printed at the end.
+
+Completed steps are checkpointed in lab_checkpoints.json with a fingerprint
+of their inputs (environment values, input files and the outputs of the
+steps they depend on) and of their outputs. A re-run skips a step when its
+inputs are unchanged and its outputs still verify, so a failed run resumes
+at the first incomplete step instead of creating a second API key or user.
+Steps without outputs to verify (DNS upserts, readiness checks, ...) always
+run again. Fingerprints are HMAC-SHA256 digests under a random key kept in
+the checkpoint file, so stored digests cannot be matched against guessed
+passwords; the values themselves are never stored. A --skip step passes its
+checkpointed fingerprint on to its dependents.
+
+Usage:
+  python3 lab_orchestrator.py
+  python3 lab_orchestrator.py --sandbox-source create --skip security_policies
+  python3 lab_orchestrator.py --dry-run
+  python3 lab_orchestrator.py --fresh        # ignore checkpoints
+"""
+
+import os
+import sys
+import glob
+import json
+import hmac
+import hashlib
+import secrets
+import string
+import time
+import argparse
+import threading
+import subprocess
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Optional
+
+from lab_files import read_bashrc_exports, write_atomic
+from lab_state import LabState
+from tf_outputs import TERRAFORM_DIR, TERRAFORM_OUTPUT_ENV, terraform_outputs
+import lab_trace
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = "lab_logs"
+CHECKPOINT_FILE = "lab_checkpoints.json"
+
+
+@dataclass
+class Step:
+    name: str
+    command: list                      # "{VAR}" placeholders are filled from the environment
+    deps: tuple = ()
+    cwd: str = SCRIPT_DIR
+    publish: Optional[Callable] = None  # env -> values the step exported, added to the shared env
+    inputs: tuple = ()                  # environment variables the step reads
+    input_files: tuple = ()             # files (globs, relative to cwd) the step reads
+    outputs: Optional[Callable] = None  # () -> values the step produced, for verification
+    status: str = "pending"
+    start: float = 0.0
+    end: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def duration(self):
+        return self.end - self.start if self.end else 0.0
+
+
+def script(name, *args):
+    return [sys.executable, os.path.join(SCRIPT_DIR, name), *args]
+
+
+def publish_bashrc(*names, aliases=None):
+    """Values a step exported to ~/.bashrc, to pass on to later steps"""
+    def publish(env):
+        values = read_bashrc_exports(names)
+        missing = [n for n in names if n not in values]
+        if missing:
+            raise RuntimeError(f"step did not export {', '.join(missing)}")
+        for source, target in (aliases or {}).items():
+            values[target] = values[source]
+        return values
+    return publish
+
+
+def publish_terraform_outputs(env):
+    # Also leaves the cache the scripts read their IPs from current. IPs the
+    # operator set in the environment win, as in tf_outputs.host_ips()
+    return {TERRAFORM_OUTPUT_ENV[name]: str(value)
+            for name, value in terraform_outputs(env=env).items()
+            if name in TERRAFORM_OUTPUT_ENV and value and not env.get(TERRAFORM_OUTPUT_ENV[name])}
+
+
+def state_fields(*names):
+    """Output check: lab_state.json fields, which must all be set"""
+    def outputs():
+        state = LabState.load(os.path.join(SCRIPT_DIR, "lab_state.json"))
+        values = {name: getattr(state, name) for name in names}
+        if not all(values.values()):
+            raise RuntimeError(f"lab state is missing {', '.join(n for n, v in values.items() if not v)}")
+        return values
+    return outputs
+
+
+def file_contents(*paths):
+    """Output check: contents of files the step wrote"""
+    def outputs():
+        values = {}
+        for path in paths:
+            with open(os.path.join(SCRIPT_DIR, path), "r") as f:
+                values[path] = f.read()
+        return values
+    return outputs
+
+
+def fingerprint(values: dict, key: bytes) -> str:
+    return hmac.new(key, json.dumps(values, sort_keys=True, default=str).encode(), hashlib.sha256).hexdigest()
+
+
+class Checkpoints:
+    """Input/output fingerprints of completed steps, persisted atomically"""
+
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, "r") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            saved = {}
+        if "key" in saved:
+            self.key = bytes.fromhex(saved["key"])
+            self.entries = saved.get("steps", {})
+        else:
+            # New file, or one from before keyed fingerprints: nothing in it can verify
+            self.key = secrets.token_bytes(32)
+            self.entries = {}
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def record(self, name, inputs, outputs):
+        with self.lock:
+            self.entries[name] = {"inputs": inputs, "outputs": outputs, "completed_at": time.time()}
+            saved = {"key": self.key.hex(), "steps": self.entries}
+            write_atomic(self.path, json.dumps(saved, indent=2, sort_keys=True) + "\n")
+
+    def clear(self):
+        with self.lock:
+            self.key = secrets.token_bytes(32)
+            self.entries = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def build_steps(sandbox_source="broker", stream_terraform=False):
+    sandbox = "allocation_broker_subtenant.py" if sandbox_source == "broker" else "create_sandbox.py"
+    # tf_stream.py creates each host's DNS record while the apply is still running;
+    # the DNS steps after it then only re-upsert and record what teardown removes
+    apply = script("tf_stream.py") if stream_terraform else ["terraform", "apply", "-auto-approve", "-input=false"]
+    return [
+        Step("sandbox", script(sandbox),
+             inputs=("INSTRUQT_PARTICIPANT_ID", "INSTRUQT_TRACK_SLUG", "SANDBOX_NAME_PREFIX"),
+             outputs=state_fields("external_id")),
+        Step("user", script("create_user.py"), deps=("sandbox",),
+             inputs=("INSTRUQT_PARTICIPANT_ID", "INSTRUQT_EMAIL"), outputs=state_fields("user_id")),
+        Step("api_key", script("deploy_api_key.py"), deps=("sandbox",),
+             publish=publish_bashrc("TF_VAR_ddi_api_key")),
+        Step("join_token", script("infoblox_create_join_token.py"), deps=("sandbox",),
+             publish=publish_bashrc("INFOBLOX_JOIN_TOKEN",
+                                    aliases={"INFOBLOX_JOIN_TOKEN": "TF_VAR_infoblox_join_token"}),
+             outputs=file_contents("join_token.txt")),
+        Step("security_policies", script("triple_security_policy.py"), deps=("api_key",)),
+        Step("terraform", apply, deps=("join_token",), cwd=TERRAFORM_DIR,
+             inputs=("TF_VAR_windows_admin_password",), input_files=("*.tf",),
+             publish=publish_terraform_outputs),
+        Step("setup_dns", script("setup_dns.py"), deps=("terraform",),
+             inputs=("INSTRUQT_PARTICIPANT_ID", "DEMO_HOSTED_ZONE_ID", "GM2_IP")),
+        Step("create_dns_niosx", script("create_dns_niosx.py"), deps=("terraform",),
+             inputs=("INSTRUQT_PARTICIPANT_ID", "DEMO_HOSTED_ZONE_ID")),
+        # Each host's configuration starts as soon as that host answers
+        Step("gm1_ready", script("host_readiness.py", "--hosts", "GM1"), deps=("terraform",),
+             inputs=("TF_VAR_windows_admin_password",)),
+        # GM2 is outside this terraform configuration, but host_readiness.py resolves
+        # IPs through tf_outputs, which runs `terraform output`: wait for the apply to
+        # release the state. Without GM2_IP the step fails at once instead of polling
+        # (the GM2 deploy steps need it too)
+        Step("gm2_ready", script("host_readiness.py", "--hosts", "GM2"), deps=("terraform",),
+             inputs=("GM2_IP", "TF_VAR_windows_admin_password")),
+        Step("niosx_ready", script("host_readiness.py", "--hosts", "NIOSX-1", "NIOSX-2"),
+             deps=("terraform", "api_key")),
+        Step("deploy_ipam_data", script("deploy_ipam_data.py"), deps=("terraform", "gm1_ready", "gm2_ready"),
+             inputs=("GM2_IP", "TF_VAR_windows_admin_password")),
+        Step("deploy_dns_zones", script("deploy_dns_zones.py"), deps=("terraform", "gm1_ready", "gm2_ready"),
+             inputs=("GM2_IP", "TF_VAR_windows_admin_password")),
+        # Join token and Cloud Grid Management in one grid update
+        Step("grid_settings",
+             script("grid_settings.py", "--gm", "{GM_IP}", "--password", "{TF_VAR_windows_admin_password}"),
+             deps=("terraform", "join_token", "gm1_ready")),
+        # Cloud management is usable once the grid has actually joined CSP
+        Step("csp_connected",
+             script("set_csp_join_token.py", "--gm", "{GM_IP}", "--password", "{TF_VAR_windows_admin_password}",
+                    "--status-only", "--watch"),
+             deps=("grid_settings", "api_key"), outputs=file_contents("csp_join.json")),
+    ]
+
+
+def _placeholders(command):
+    return tuple(sorted({name for arg in command for _, name, _, _ in string.Formatter().parse(arg) if name}))
+
+
+def validate(steps):
+    names = {s.name for s in steps}
+    for s in steps:
+        unknown = [d for d in s.deps if d not in names]
+        if unknown:
+            raise ValueError(f"{s.name} depends on unknown step(s): {', '.join(unknown)}")
+    order, done = [], set()
+    while len(order) < len(steps):
+        ready = [s for s in steps if s.name not in done and all(d in done for d in s.deps)]
+        if not ready:
+            raise ValueError("Dependency cycle between: " + ", ".join(s.name for s in steps if s.name not in done))
+        order += ready
+        done.update(s.name for s in ready)
+    return order
+
+
+class Orchestrator:
+    def __init__(self, steps, env=None, workers=8, log_dir=LOG_DIR, checkpoints=None, keep_going=False):
+        validate(steps)
+        self.steps = {s.name: s for s in steps}
+        self.env = dict(os.environ if env is None else env)
+        self.workers = workers
+        self.log_dir = log_dir
+        self.checkpoints = checkpoints
+        self.keep_going = keep_going   # run dependents of failed steps too
+        self.output_prints = {}   # step name -> output fingerprint of this run
+        self.lock = threading.Lock()
+        self.t0 = None
+        self.key = checkpoints.key if checkpoints else secrets.token_bytes(32)
+        for step in steps:
+            entry = checkpoints.get(step.name) if checkpoints else None
+            if step.status == "cached" and entry:
+                # --skip: dependents see the fingerprint of the last real run
+                self.output_prints[step.name] = entry.get("outputs")
+
+    def input_fingerprint(self, step, env):
+        values = {"command": step.command,
+                  "env": {name: env.get(name) for name in step.inputs + _placeholders(step.command)},
+                  "deps": {dep: self.output_prints.get(dep) for dep in step.deps},
+                  "files": {}}
+        for pattern in step.input_files:
+            for path in sorted(glob.glob(os.path.join(step.cwd, pattern))):
+                with open(path, "rb") as f:
+                    values["files"][os.path.relpath(path, step.cwd)] = hashlib.sha256(f.read()).hexdigest()
+        return fingerprint(values, self.key)
+
+    def _collect_outputs(self, step, env):
+        published = step.publish(env) if step.publish else {}
+        produced = step.outputs() if step.outputs else {}
+        return published, fingerprint({"published": published, "produced": produced}, self.key)
+
+    def _verify(self, step, env, inputs):
+        """True if the checkpoint matches these inputs and the outputs still check out"""
+        if not (step.publish or step.outputs):
+            # Nothing to check the step's effect against
+            return False
+        entry = self.checkpoints.get(step.name) if self.checkpoints else None
+        if not entry or entry.get("inputs") != inputs:
+            return False
+        try:
+            published, outputs = self._collect_outputs(step, env)
+        except Exception:
+            return False
+        if outputs != entry.get("outputs"):
+            return False
+        with self.lock:
+            self.env.update(published)
+            self.output_prints[step.name] = outputs
+        return True
+
+    def _run_step(self, step):
+        """Run (or verify) one step; returns its final status"""
+        with self.lock:
+            env = dict(self.env)
+        inputs = self.input_fingerprint(step, env)
+        if self._verify(step, env, inputs):
+            return "cached"
+        try:
+            command = [arg.format_map(env) for arg in step.command]
+        except KeyError as e:
+            raise RuntimeError(f"missing environment variable {e}")
+        os.makedirs(self.log_dir, exist_ok=True)
+        with open(os.path.join(self.log_dir, f"{step.name}.log"), "w") as log:
+            proc = subprocess.run(command, cwd=step.cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        if proc.returncode != 0:
+            raise RuntimeError(f"exit {proc.returncode}, see {self.log_dir}/{step.name}.log")
+        published, outputs = self._collect_outputs(step, env)
+        with self.lock:
+            self.env.update(published)
+            self.output_prints[step.name] = outputs
+        if self.checkpoints:
+            self.checkpoints.record(step.name, inputs, outputs)
+        return "done"
+
+    def _timed(self, step):
+        step.start = time.monotonic()
+        try:
+            with lab_trace.span(step.name, cat="step"):
+                return self._run_step(step)
+        finally:
+            step.end = time.monotonic()
+
+    def run(self):
+        self.t0 = time.monotonic()
+        pending = {name: s for name, s in self.steps.items() if s.status == "pending"}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while pending or running:
+                for name, step in list(pending.items()):
+                    dep_status = [self.steps[d].status for d in step.deps]
+                    finished = ("done", "cached", "failed", "skipped") if self.keep_going else ("done", "cached")
+                    if not self.keep_going and any(s in ("failed", "skipped") for s in dep_status):
+                        step.status, step.error = "skipped", "dependency failed"
+                        del pending[name]
+                        print(f"⏭️  {name} skipped (dependency failed)", flush=True)
+                    elif all(s in finished for s in dep_status):
+                        step.status = "running"
+                        del pending[name]
+                        print(f"▶️  {name} started at +{time.monotonic() - self.t0:.1f}s", flush=True)
+                        running[pool.submit(self._timed, step)] = step
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    try:
+                        step.status = future.result()
+                        if step.status == "cached":
+                            print(f"♻️  {step.name} verified from checkpoint, skipped", flush=True)
+                        else:
+                            print(f"✅ {step.name} done in {step.duration:.1f}s", flush=True)
+                    except Exception as e:
+                        step.status, step.error = "failed", str(e)
+                        print(f"❌ {step.name} failed after {step.duration:.1f}s: {e}", flush=True)
+        return all(s.status in ("done", "cached") for s in self.steps.values())
+
+    def critical_path(self):
+        """Longest chain of dependent step durations, as a list of steps"""
+        best = {}
+        for step in validate(list(self.steps.values())):
+            prev = max((best[d] for d in step.deps), key=lambda p: p[0], default=(0.0, []))
+            best[step.name] = (prev[0] + step.duration, prev[1] + [step])
+        return max(best.values(), key=lambda p: p[0])[1] if best else []
+
+    def report(self):
+        wall = time.monotonic() - self.t0
+        serial = sum(s.duration for s in self.steps.values())
+        path = self.critical_path()
+        print("\n" + "=" * 60, flush=True)
+        print(f"⏱️  Wall time {wall:.1f}s (steps sum to {serial:.1f}s)", flush=True)
+        print(f"🧭 Critical path ({sum(s.duration for s in path):.1f}s):", flush=True)
+        for step in path:
+            print(f"   {step.name:24s} {step.duration:7.1f}s", flush=True)
+        failed = [s for s in self.steps.values() if s.status in ("failed", "skipped")]
+        if failed:
+            print("⚠️ Not completed:", flush=True)
+        for step in failed:
+            print(f"   ❌ {step.name}: {step.status} ({step.error})", flush=True)
+        print("=" * 60, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Provision the full lab as a parallel dependency graph')
+    parser.add_argument('--sandbox-source', choices=['broker', 'create'], default='broker',
+                        help='Allocate from the broker or create a new sandbox (default: broker)')
+    parser.add_argument('--stream-terraform', action='store_true',
+                        help='Apply via tf_stream.py, creating DNS records as host IPs appear')
+    parser.add_argument('--skip', action='append', default=[], metavar='STEP',
+                        help='Treat a step as already done (repeatable)')
+    parser.add_argument('--workers', type=int, default=8, help='Steps run at the same time (default: 8)')
+    parser.add_argument('--log-dir', default=LOG_DIR, help=f'Per-step logs (default: {LOG_DIR})')
+    parser.add_argument('--dry-run', action='store_true', help='Print the execution plan and exit')
+    parser.add_argument('--checkpoints', default=CHECKPOINT_FILE,
+                        help=f'Checkpoint file (default: {CHECKPOINT_FILE})')
+    parser.add_argument('--fresh', action='store_true', help='Discard checkpoints and run every step')
+    args = parser.parse_args()
+
+    steps = build_steps(args.sandbox_source, args.stream_terraform)
+    for step in steps:
+        if step.name in args.skip:
+            step.status = "cached"
+
+    if args.dry_run:
+        for step in validate(steps):
+            deps = ", ".join(step.deps) or "-"
+            print(f"{step.name:24s} after: {deps}{'  (skipped)' if step.status == 'cached' else ''}")
+        return
+
+    checkpoints = Checkpoints(args.checkpoints)
+    if args.fresh:
+        checkpoints.clear()
+    orchestrator = Orchestrator(steps, workers=args.workers, log_dir=args.log_dir, checkpoints=checkpoints)
+    for step in orchestrator.steps.values():
+        if step.status == "cached":
+            print(f"⏭️  {step.name} skipped (--skip)", flush=True)
+    ok = orchestrator.run()
+    orchestrator.report()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
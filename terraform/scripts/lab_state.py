@@ -0,0 +1,104 @@
+"""
+Single provisioning state document for a lab instance.
+
+Replaces subtenant_id.txt, external_id.txt, sandbox_id.txt, sandbox_name.txt
+and user_id.txt with one JSON file (lab_state.json), written atomically.
+Scripts read it once via LabState.load() and use the typed fields.
+
+If lab_state.json does not exist yet, load() falls back to the legacy text
+files, so state left by an older run can still be read and cleaned up.
+
+save() and update() hold an exclusive lock on lab_state.json.lock, so scripts
+running in parallel (the orchestrator steps) cannot lose each other's fields
+in a concurrent read-modify-write.
+"""
+
+import os
+import json
+import fcntl
+import contextlib
+from dataclasses import dataclass, asdict, fields
+from typing import Optional
+
+from lab_files import write_atomic
+
+STATE_FILE = "lab_state.json"
+
+# Legacy one-value-per-file layout, field -> file name
+LEGACY_FILES = {
+    "subtenant_id": "subtenant_id.txt",
+    "external_id": "sandbox_id.txt",
+    "sandbox_name": "sandbox_name.txt",
+    "user_id": "user_id.txt",
+}
+
+
+@dataclass
+class LabState:
+    subtenant_id: Optional[str] = None    # broker sandbox id (mark-for-deletion)
+    external_id: Optional[str] = None     # CSP account id (account switch, delete)
+    sandbox_name: Optional[str] = None
+    expires_at: Optional[int] = None
+    user_id: Optional[str] = None
+
+    @property
+    def sandbox_id(self) -> Optional[str]:
+        """CSP account id, the value the scripts used to read from sandbox_id.txt"""
+        return self.external_id
+
+    @classmethod
+    def load(cls, path: str = STATE_FILE) -> "LabState":
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                data = json.load(f)
+            known = {f.name for f in fields(cls)}
+            return cls(**{k: v for k, v in data.items() if k in known})
+        return cls._load_legacy(os.path.dirname(path))
+
+    @classmethod
+    def _load_legacy(cls, directory: str = "") -> "LabState":
+        values = {}
+        for field_name, filename in LEGACY_FILES.items():
+            try:
+                with open(os.path.join(directory, filename), "r") as f:
+                    values[field_name] = f.read().strip() or None
+            except FileNotFoundError:
+                pass
+        if not values.get("external_id"):
+            try:
+                with open(os.path.join(directory, "external_id.txt"), "r") as f:
+                    values["external_id"] = f.read().strip() or None
+            except FileNotFoundError:
+                pass
+        return cls(**values)
+
+    def save(self, path: str = STATE_FILE):
+        with _locked(path):
+            self._write(path)
+
+    def _write(self, path: str):
+        write_atomic(path, json.dumps(asdict(self), indent=2, sort_keys=True) + "\n")
+
+    @classmethod
+    def update(cls, path: str = STATE_FILE, **changes) -> "LabState":
+        """Load, apply changes and save in one step, under the state file lock"""
+        unknown = set(changes) - {f.name for f in fields(cls)}
+        if unknown:
+            raise AttributeError(f"Unknown lab state field(s): {', '.join(sorted(unknown))}")
+        with _locked(path):
+            state = cls.load(path)
+            for key, value in changes.items():
+                setattr(state, key, value)
+            state._write(path)
+        return state
+
+
+@contextlib.contextmanager
+def _locked(path: str):
+    """Exclusive flock on <path>.lock; the state file itself is replaced on every write"""
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
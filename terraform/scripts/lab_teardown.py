@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Tear the lab down in dependency order, running independent deletions in parallel.
+
+  clean_dns_niosx ─────────────
+  cleanup_dns_records ─────────
+  delete_security_policies ─┬─ delete_sandbox / cleanup_broker_allocation
+  delete_user ──────────────┘
+
+DNS records have no dependencies. Security policies and the user live in the
+sandbox and are removed before it is deleted (or released to the broker).
+At the end the total time is printed with anything left behind: failed
+steps and ids still recorded in lab_state.json.
+
+Usage:
+  python3 lab_teardown.py                       # broker-allocated sandbox
+  python3 lab_teardown.py --sandbox-source create
+  python3 lab_teardown.py --keep-going          # delete the sandbox even if a step before it failed
+"""
+
+import os
+import sys
+import time
+import argparse
+
+from lab_files import read_bashrc_exports
+from lab_orchestrator import LOG_DIR, Orchestrator, Step, script, validate
+from lab_state import LabState
+import lab_trace
+
+
+def build_steps(sandbox_source="broker"):
+    if sandbox_source == "broker":
+        sandbox = Step("cleanup_broker_allocation", script("cleanup_broker_allocation.py"),
+                       deps=("delete_security_policies", "delete_user"))
+    else:
+        sandbox = Step("delete_sandbox", script("delete_sandbox.py"),
+                       deps=("delete_security_policies", "delete_user"))
+    return [
+        Step("clean_dns_niosx", script("clean_dns_niosx.py")),
+        Step("cleanup_dns_records", script("cleanup_dns_records.py")),
+        Step("delete_security_policies", script("delete_security_policies.py")),
+        Step("delete_user", script("delete_user.py")),
+        sandbox,
+    ]
+
+
+def leftovers(sandbox_source="broker"):
+    """Resources lab_state.json still records after teardown"""
+    state = LabState.load()
+    found = []
+    if state.user_id:
+        found.append(f"user {state.user_id}")
+    if sandbox_source == "broker" and state.subtenant_id:
+        found.append(f"broker sandbox {state.subtenant_id}")
+    if sandbox_source == "create" and state.external_id:
+        found.append(f"sandbox account {state.external_id}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tear down the lab in dependency order, in parallel')
+    parser.add_argument('--sandbox-source', choices=['broker', 'create'], default='broker',
+                        help='Release the sandbox to the broker or delete it (default: broker)')
+    parser.add_argument('--keep-going', action='store_true',
+                        help='Run steps even when a step they depend on failed')
+    parser.add_argument('--workers', type=int, default=8, help='Steps run at the same time (default: 8)')
+    parser.add_argument('--log-dir', default=LOG_DIR, help=f'Per-step logs (default: {LOG_DIR})')
+    parser.add_argument('--dry-run', action='store_true', help='Print the teardown plan and exit')
+    args = parser.parse_args()
+
+    steps = build_steps(args.sandbox_source)
+    if args.dry_run:
+        for step in validate(steps):
+            print(f"{step.name:26s} after: {', '.join(step.deps) or '-'}")
+        return
+
+    # The API key is only in ~/.bashrc when this runs in a fresh shell
+    env = dict(os.environ)
+    for name, value in read_bashrc_exports(("TF_VAR_ddi_api_key",)).items():
+        env.setdefault(name, value)
+
+    start = time.monotonic()
+    orchestrator = Orchestrator(steps, env=env, workers=args.workers, log_dir=args.log_dir,
+                                keep_going=args.keep_going)
+    ok = orchestrator.run()
+    elapsed = time.monotonic() - start
+
+    remaining = leftovers(args.sandbox_source)
+    print("\n" + "=" * 60, flush=True)
+    print(f"⏱️  Teardown took {elapsed:.1f}s", flush=True)
+    for step in orchestrator.steps.values():
+        if step.status in ("failed", "skipped"):
+            print(f"   ❌ {step.name}: {step.status} ({step.error})", flush=True)
+    for item in remaining:
+        print(f"   ⚠️ Left behind: {item}", flush=True)
+    if ok and not remaining:
+        print("✅ Nothing left behind", flush=True)
+    print("=" * 60, flush=True)
+    sys.exit(0 if ok and not remaining else 1)
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
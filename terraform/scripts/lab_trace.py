@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Opt-in tracing for the lab scripts, in Chrome trace-event format.
+
+Set LAB_TRACE_DIR to enable it. Every script calls lab_trace.install(),
+which records:
+  - one span for the whole script run
+  - one span per HTTP call made through requests (CSP, broker, WAPI)
+  - one span per AWS API call made through boto3 (Route 53)
+  - one span per time.sleep() (backoff, settle delays)
+Spans from orchestrated steps and any `with lab_trace.span(...)` block
+are recorded too. Each process writes its own trace-<pid>-<ts>.json
+(<ts> is the start time in microseconds, so a reused pid does not overwrite
+an earlier file) in the trace directory; child processes inherit
+LAB_TRACE_DIR, so a whole run ends up in one place. Timestamps are
+wall-clock microseconds, so files from different processes line up when
+merged.
+
+Without LAB_TRACE_DIR, install() does nothing and span() costs one check.
+
+Usage:
+  export LAB_TRACE_DIR=/tmp/lab-trace
+  python3 lab_orchestrator.py
+  python3 lab_trace.py merge --out lab_trace.json   # open in https://ui.perfetto.dev
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+import contextlib
+import urllib.parse
+
+from lab_files import write_atomic
+
+TRACE_DIR_ENV = "LAB_TRACE_DIR"
+FLUSH_EVERY = 200
+
+_lock = threading.Lock()
+_events = []
+_installed = False
+_path = None
+_original_sleep = time.sleep
+
+
+def enabled():
+    return _installed
+
+
+def _now_us():
+    return time.time_ns() // 1000
+
+
+def _tid():
+    return threading.get_native_id()
+
+
+def _flush():
+    if not _path:
+        return
+    with _lock:
+        data = json.dumps({"traceEvents": list(_events)})
+    write_atomic(_path, data)
+
+
+def _add(event):
+    with _lock:
+        _events.append(event)
+        count = len(_events)
+    if count % FLUSH_EVERY == 0:
+        _flush()
+
+
+def record(name, cat, start_us, end_us, args=None):
+    """Add a complete ("X") event"""
+    if not _installed:
+        return
+    event = {"name": name, "cat": cat, "ph": "X", "ts": start_us, "dur": max(0, end_us - start_us),
+             "pid": os.getpid(), "tid": _tid()}
+    if args:
+        event["args"] = args
+    _add(event)
+
+
+@contextlib.contextmanager
+def span(name, cat="step", **args):
+    """Trace a block of code"""
+    if not _installed:
+        yield
+        return
+    start = _now_us()
+    try:
+        yield
+    finally:
+        record(name, cat, start, _now_us(), args or None)
+
+
+def _patch_sleep():
+    def traced_sleep(seconds):
+        start = _now_us()
+        try:
+            _original_sleep(seconds)
+        finally:
+            record("sleep", "sleep", start, _now_us(), {"seconds": seconds})
+    time.sleep = traced_sleep
+
+
+def _patch_requests():
+    try:
+        import requests
+    except ImportError:
+        return
+    original = requests.Session.request
+
+    def traced_request(self, method, url, *args, **kwargs):
+        start = _now_us()
+        status = None
+        try:
+            response = original(self, method, url, *args, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            host = urllib.parse.urlsplit(url).netloc
+            path = urllib.parse.urlsplit(url).path
+            record(f"{method.upper()} {host}", "http", start, _now_us(), {"url": f"{host}{path}", "status": status})
+    requests.Session.request = traced_request
+
+
+def _patch_boto3():
+    try:
+        import boto3.session
+    except ImportError:
+        return
+    original_init = boto3.session.Session.__init__
+
+    def before_call(model, context, **kwargs):
+        context["lab_trace_start"] = _now_us()
+
+    def after_call(model, context, http_response=None, **kwargs):
+        start = context.get("lab_trace_start")
+        if start is not None:
+            status = getattr(http_response, "status_code", None)
+            record(f"{model.service_model.service_name}.{model.name}", "aws", start, _now_us(), {"status": status})
+
+    def traced_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        self.events.register("before-call", before_call)
+        self.events.register("after-call", after_call)
+    boto3.session.Session.__init__ = traced_init
+
+
+def install(name=None):
+    """Start tracing this process if LAB_TRACE_DIR is set (idempotent)"""
+    global _installed, _path
+    directory = os.environ.get(TRACE_DIR_ENV)
+    if _installed or not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    name = name or os.path.basename(sys.argv[0]) or "python"
+    _path = os.path.join(directory, f"trace-{os.getpid()}-{_now_us()}.json")
+    _installed = True
+    _add({"name": "process_name", "ph": "M", "pid": os.getpid(), "tid": _tid(), "args": {"name": name}})
+    _patch_sleep()
+    _patch_requests()
+    _patch_boto3()
+
+    start = _now_us()
+
+    def finish():
+        record(name, "script", start, _now_us(), {"argv": sys.argv[1:]})
+        _flush()
+    atexit.register(finish)
+
+
+def merge(directory, out):
+    """Combine every per-process trace file into one"""
+    events = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.startswith("trace-") and filename.endswith(".json"):
+            try:
+                with open(os.path.join(directory, filename), "r") as f:
+                    events.extend(json.load(f).get("traceEvents", []))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping {filename}: {e}", flush=True)
+    with open(out, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge lab trace files')
+    sub = parser.add_subparsers(dest='command', required=True)
+    m = sub.add_parser('merge', help='Merge per-process traces into one Chrome trace file')
+    m.add_argument('--dir', default=os.environ.get(TRACE_DIR_ENV), help=f'Trace directory (default: ${TRACE_DIR_ENV})')
+    m.add_argument('--out', default='lab_trace.json', help='Output file (default: lab_trace.json)')
+    args = parser.parse_args()
+    if not args.dir:
+        sys.exit(f"❌ No trace directory: pass --dir or set {TRACE_DIR_ENV}")
+    count = merge(args.dir, args.out)
+    print(f"📈 Merged {count} events into {args.out}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Loads domains from a file into an Infoblox CSP custom (named) list, for use
+by the lab security policies cloned by triple_security_policy.py.
+
+The file is read line by line (one domain or IP per line, '#' comments
+allowed). Entries are normalized and deduplicated locally, then compared
+with the current list contents so that only additions and removals are sent.
+Changes go up in chunks of --chunk-size items, a few chunks in parallel.
+
+Usage:
+  python3 load_named_list.py --name Lab-Blocklist --file domains.txt
+  python3 load_named_list.py --name Lab-Blocklist --file more.txt --append-only
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
+
+from csp_pagination import iter_results
+from http_retry import RetryingSession
+import lab_trace
+
+BASE_URL = "https://csp.infoblox.com"
+NAMED_LISTS_ENDPOINT = f"{BASE_URL}/api/atcfw/v1/named_lists"
+
+# Items per insert/delete request; keeps request bodies well under the CSP limits
+CHUNK_SIZE = 5000
+
+DOMAIN_RE = re.compile(r"^(\*\.)?([a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9_])?\.)*[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?$")
+
+
+def get_api_key():
+    api_key = os.environ.get("TF_VAR_ddi_api_key")
+    if not api_key:
+        print("ERROR: TF_VAR_ddi_api_key not set in environment.")
+        sys.exit(1)
+    return api_key
+
+
+def normalize_item(line):
+    """Normalized domain/IP/CIDR for a list line, or None if blank, comment or invalid"""
+    item = line.split("#", 1)[0].strip().lower()
+    if not item:
+        return None
+    item = item.rstrip(".")
+    try:
+        return str(ipaddress.ip_network(item, strict=False)) if "/" in item else str(ipaddress.ip_address(item))
+    except ValueError:
+        pass
+    try:
+        item = item.encode("idna").decode("ascii")
+    except UnicodeError:
+        return None
+    if len(item) > 253 or not DOMAIN_RE.match(item):
+        return None
+    return item
+
+
+def read_items(path):
+    """Stream the file and return (set of normalized items, invalid line count)"""
+    items = set()
+    invalid = 0
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            item = normalize_item(line)
+            if item:
+                items.add(item)
+            elif line.split("#", 1)[0].strip():
+                invalid += 1
+    return items, invalid
+
+
+def chunked(items, size):
+    items = sorted(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def find_named_list(http, headers, name):
+    params = {"_filter": f'name=="{name}"'}
+    for named_list in iter_results(http, NAMED_LISTS_ENDPOINT, headers=headers, params=params):
+        if named_list.get("name") == name:
+            return named_list
+    return None
+
+
+def create_named_list(http, headers, name, description):
+    payload = {"name": name, "type": "custom_list", "description": description, "items_described": []}
+    resp = http.post(NAMED_LISTS_ENDPOINT, headers=headers, json=payload)
+    resp.raise_for_status()
+    result = resp.json().get("results", resp.json())
+    print(f"Created named list '{name}' (id={result.get('id')})")
+    return result
+
+
+def current_items(http, headers, list_id):
+    """{normalized item: [items as stored in the list]} for the list contents"""
+    resp = http.get(f"{NAMED_LISTS_ENDPOINT}/{list_id}", headers=headers)
+    resp.raise_for_status()
+    named_list = resp.json().get("results", {})
+    items = [d.get("item") for d in named_list.get("items_described") or []]
+    items += named_list.get("items") or []
+    existing = {}
+    for item in items:
+        if item:
+            existing.setdefault(normalize_item(item) or item, []).append(item)
+    return existing
+
+
+def insert_chunk(http, headers, list_id, chunk, description):
+    payload = {"inserted_items_described": [{"item": i, "description": description} for i in chunk]}
+    resp = http.post(f"{NAMED_LISTS_ENDPOINT}/{list_id}/items", headers=headers, json=payload)
+    resp.raise_for_status()
+    return len(chunk)
+
+
+def delete_chunk(http, headers, list_id, chunk):
+    payload = {"deleted_items_described": [{"item": i} for i in chunk]}
+    resp = http.delete(f"{NAMED_LISTS_ENDPOINT}/{list_id}/items", headers=headers, json=payload)
+    resp.raise_for_status()
+    return len(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load a file of domains into a CSP named list')
+    parser.add_argument('--name', required=True, help='Named list name (created if missing)')
+    parser.add_argument('--file', required=True, help='File with one domain or IP per line')
+    parser.add_argument('--description', default='Loaded by load_named_list.py for lab exercise',
+                        help='Description for a newly created list and its items')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help=f'Items per request (default: {CHUNK_SIZE})')
+    parser.add_argument('--parallel', type=int, default=4, help='Chunks uploaded in parallel (default: 4)')
+    parser.add_argument('--append-only', action='store_true', help='Only add items, never remove existing ones')
+    args = parser.parse_args()
+
+    api_key = get_api_key()
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Token {api_key}",
+    }
+    http = RetryingSession(pool_size=args.parallel)
+    start = time.monotonic()
+
+    desired, invalid = read_items(args.file)
+    print(f"Read {len(desired)} unique items from {args.file} ({invalid} invalid lines skipped)")
+
+    named_list = find_named_list(http, headers, args.name)
+    if named_list is None:
+        named_list = create_named_list(http, headers, args.name, args.description)
+        existing = {}
+    else:
+        existing = current_items(http, headers, named_list["id"])
+        print(f"Named list '{args.name}' (id={named_list['id']}) has {len(existing)} items")
+    list_id = named_list["id"]
+
+    additions = desired - existing.keys()
+    # Diff on the normalized form, but delete the items as the list stores them
+    removals = set() if args.append_only else {raw for key in existing.keys() - desired for raw in existing[key]}
+    print(f"Diff: +{len(additions)} -{len(removals)} (unchanged {len(desired & existing.keys())})")
+
+    with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+        # Remove first so the list never goes over its size limit mid-update
+        removed = sum(pool.map(lambda c: delete_chunk(http, headers, list_id, c),
+                               chunked(removals, args.chunk_size)))
+        added = sum(pool.map(lambda c: insert_chunk(http, headers, list_id, c, args.description),
+                             chunked(additions, args.chunk_size)))
+
+    print(f"\nAdded {added}, removed {removed} in {time.monotonic() - start:.1f}s")
+    print("Done.")
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Combined post-switch CSP provisioning.
+
+Replaces running create_user.py, deploy_api_key.py and
+infoblox_create_join_token.py one after another. Signs in and switches into
+the sandbox account once, then creates the user, the API key and the join
+token concurrently on that one session. Artifacts are only written once all
+three calls have returned, each file atomically, and ~/.bashrc is updated in
+a single write.
+
+Usage:
+  python3 provision_csp.py
+  python3 provision_csp.py --skip-user --key-name Instruqt --token-name demo-token
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import create_user
+import deploy_api_key
+import infoblox_create_join_token
+from lab_files import write_atomic, export_to_bashrc
+from lab_state import LabState
+import lab_trace
+
+JOIN_TOKEN_FILE = "join_token.txt"
+
+# Delay before the first call against the freshly switched account, same as create_user.py
+SWITCH_SETTLE_SECONDS = 3
+
+
+class ProvisioningSession(deploy_api_key.InfobloxSession, infoblox_create_join_token.InfobloxSession):
+    """One authenticated CSP session able to create API keys and join tokens"""
+
+
+def timed(label, fn, *args, **kwargs):
+    start = time.monotonic()
+    result = fn(*args, **kwargs)
+    elapsed = time.monotonic() - start
+    print(f"⏱️  {label} finished in {elapsed:.2f}s", flush=True)
+    return result
+
+
+def provision_user(session, user_name, user_email, settle_seconds):
+    time.sleep(settle_seconds)
+    return create_user.create_user(session.session, session._auth_headers(),
+                                   user_name, user_email, session.account_id, session.base_url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create CSP user, API key and join token concurrently')
+    parser.add_argument('--sandbox-id', default=None, help='Sandbox account id (default: from lab state)')
+    parser.add_argument('--key-name', default='Instruqt', help='API key name (default: Instruqt)')
+    parser.add_argument('--key-expiration', default='2026-12-31T23:59:59.000Z', help='API key expiration')
+    parser.add_argument('--token-name', default='demo-token', help='Join token name (default: demo-token)')
+    parser.add_argument('--skip-user', action='store_true', help='Do not create the participant user')
+    parser.add_argument('--settle', type=float, default=SWITCH_SETTLE_SECONDS,
+                        help=f'Seconds to wait after account switch before creating the user (default: {SWITCH_SETTLE_SECONDS})')
+    args = parser.parse_args()
+
+    user_name = os.getenv("INSTRUQT_PARTICIPANT_ID")
+    user_email = os.getenv("INSTRUQT_EMAIL")
+    if not args.skip_user and not (user_name and user_email):
+        print("❌ INSTRUQT_PARTICIPANT_ID and INSTRUQT_EMAIL must be set (or pass --skip-user)")
+        sys.exit(1)
+
+    start = time.monotonic()
+    session = ProvisioningSession()
+    session.login()
+    session.switch_account(args.sandbox_id)
+
+    tasks = {
+        "api_key": (session.create_api_key, (args.key_name, args.key_expiration)),
+        "join_token": (session.create_join_token, (args.token_name,)),
+    }
+    if not args.skip_user:
+        tasks["user"] = (provision_user, (session, user_name, user_email, args.settle))
+
+    results = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        futures = {name: pool.submit(timed, name, fn, *fn_args) for name, (fn, fn_args) in tasks.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors[name] = e
+                print(f"❌ {name} failed: {e}", flush=True)
+
+    # Write artifacts only after every call has returned
+    exports = {}
+    if results.get("user"):
+        LabState.update(user_id=results["user"])
+        print(f"📝 User ID saved to lab state: {results['user']}")
+    elif "user" in results:
+        print("⚠️ User ID not found or unexpected format.")
+    if results.get("join_token"):
+        write_atomic(JOIN_TOKEN_FILE, results["join_token"])
+        exports["INFOBLOX_JOIN_TOKEN"] = results["join_token"]
+        print(f"📝 Join token saved to {JOIN_TOKEN_FILE}")
+    if results.get("api_key"):
+        exports["TF_VAR_ddi_api_key"] = results["api_key"]
+
+    if exports:
+        if export_to_bashrc(exports):
+            print(f"💾 Exported {', '.join(exports)} in ~/.bashrc")
+        subprocess.run(["bash", "-c", "source ~/.bashrc"], check=False)
+
+    print(f"\n⏱️  Provisioning took {time.monotonic() - start:.2f}s")
+    if errors:
+        print(f"❌ Failed: {', '.join(errors)}")
+        sys.exit(1)
+    print("🎉 User, API key and join token ready")
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
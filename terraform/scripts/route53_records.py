@@ -0,0 +1,106 @@
+"""
+Route 53 A records for the lab hosts.
+
+HOST_RECORDS maps the environment variable holding a host's IP to the
+record name the DNS scripts create for it, so a record can be upserted for
+one host as soon as its IP is known. RecordLog is the print-and-append log
+the DNS scripts keep next to their records.
+"""
+
+import os
+import boto3
+from datetime import datetime, timezone
+
+DOMAIN = "iracictechguru.com"
+
+# IP environment variable -> record name ({prefix} is "<participant id>-")
+HOST_RECORDS = {
+    "DC1_IP": "{prefix}client." + DOMAIN + ".",
+    "CLIENT_2_IP": "{prefix}client2." + DOMAIN + ".",
+    "GM_IP": "{prefix}infoblox." + DOMAIN + ".",
+    "GM2_IP": "{prefix}infoblox2." + DOMAIN + ".",
+    "AZURE_WIN11_IP": "{prefix}client3-azure." + DOMAIN + ".",
+    "AZURE_WIN11_2_IP": "{prefix}client4-azure." + DOMAIN + ".",
+    "NIOSX_1_IP": "{prefix}niosx-1." + DOMAIN + ".",
+    "NIOSX_2_IP": "{prefix}niosx-2." + DOMAIN + ".",
+}
+
+
+def route53_client():
+    """Route 53 client from the DEMO_AWS_* environment, or None if credentials are missing"""
+    aws_access_key_id = os.getenv("DEMO_AWS_ACCESS_KEY_ID")
+    aws_secret_access_key = os.getenv("DEMO_AWS_SECRET_ACCESS_KEY")
+    if not aws_access_key_id or not aws_secret_access_key:
+        return None
+    session = boto3.Session(
+        aws_access_key_id=aws_access_key_id,
+        aws_secret_access_key=aws_secret_access_key,
+        region_name=os.getenv("DEMO_AWS_REGION", "us-east-1"),
+    )
+    return session.client("route53")
+
+
+def record_name(ip_var, participant_id=None):
+    participant_id = (participant_id if participant_id is not None
+                      else os.getenv("INSTRUQT_PARTICIPANT_ID", "")).strip()
+    return HOST_RECORDS[ip_var].format(prefix=f"{participant_id}-" if participant_id else "")
+
+
+def upsert_a_record(route53, hosted_zone_id, fqdn, ip, comment=None, ttl=300):
+    """UPSERT one A record; returns the change status"""
+    response = route53.change_resource_record_sets(
+        HostedZoneId=hosted_zone_id,
+        ChangeBatch={
+            "Comment": comment or f"Upsert A record for {fqdn}",
+            "Changes": [
+                {
+                    "Action": "UPSERT",
+                    "ResourceRecordSet": {
+                        "Name": fqdn,
+                        "Type": "A",
+                        "TTL": ttl,
+                        "ResourceRecords": [{"Value": ip}]
+                    }
+                }
+            ]
+        }
+    )
+    return response['ChangeInfo']['Status']
+
+
+def delete_a_record(route53, hosted_zone_id, fqdn, ip, comment=None, ttl=300):
+    """DELETE one A record; returns the change status"""
+    response = route53.change_resource_record_sets(
+        HostedZoneId=hosted_zone_id,
+        ChangeBatch={
+            "Comment": comment or f"Delete A record for {fqdn}",
+            "Changes": [
+                {
+                    "Action": "DELETE",
+                    "ResourceRecordSet": {
+                        "Name": fqdn,
+                        "Type": "A",
+                        "TTL": ttl,
+                        "ResourceRecords": [{"Value": ip}]
+                    }
+                }
+            ]
+        }
+    )
+    return response['ChangeInfo']['Status']
+
+
+class RecordLog:
+    """Print messages and keep them for appending to a log file"""
+
+    def __init__(self, title):
+        timestamp = datetime.now(timezone.utc).isoformat()
+        self.lines = [f"\n--- {title} [{timestamp}] ---\n"]
+
+    def __call__(self, message):
+        print(message)
+        self.lines.append(message + "\n")
+
+    def write(self, path):
+        with open(path, "a") as f:
+            f.writelines(self.lines)
@@ -1,8 +1,11 @@
-import json
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from logging.handlers import RotatingFileHandler
 
+from csp_pagination import iter_results
+from http_retry import RetryingSession
+
 # Setup logging
 logger = logging.getLogger('SandboxAccountLogger')
 logger.setLevel(logging.DEBUG)
@@ -15,11 +18,19 @@ logger.addHandler(handler)
 class SandboxAccountAPI:
     """
     Interacts with the /sandbox/accounts endpoint to manage sandbox accounts.
+
+    All calls share one pooled session with connect/read timeouts; 429, 5xx
+    and connection errors are retried with jittered exponential backoff.
+    Creates are never resent after the server may have committed them: a
+    create that fails that way is looked up by name instead.
     """
 
-    def __init__(self, base_url: str, token: str):
+    def __init__(self, base_url: str, token: str, pool_size: int = 16, retries: int = 4, timeout=(5, 30)):
         self.base_url = base_url.rstrip("/")
         self.token = token
+        self.pool_size = pool_size
+        self.session = RetryingSession(retries=retries, pool_size=pool_size, timeout=timeout, logger=logger)
+        self.session.headers.update(self._headers())
 
     def _headers(self):
         headers = {
@@ -33,46 +44,76 @@ class SandboxAccountAPI:
     def create_sandbox_account(self, sandbox_account_request: dict) -> dict:
         endpoint = f"{self.base_url}/sandbox/accounts"
         try:
-            logger.debug(f"Creating sandbox at {endpoint} with payload: {sandbox_account_request}")
-            response = requests.post(url=endpoint, headers=self._headers(), data=json.dumps(sandbox_account_request))
+            logger.debug("Creating sandbox '%s' at %s", sandbox_account_request.get("name"), endpoint)
+            response = self.session.post(endpoint, json=sandbox_account_request)
             response.raise_for_status()
             result = response.json()
-            logger.info(f"Sandbox created: {json.dumps(result, indent=2)}")
+            logger.info("Sandbox created: %s", sandbox_account_request.get("name"))
+            logger.debug("Create response: %s", result)
             return {"status": "success", "data": result}
         except Exception as e:
-            logger.error(f"Failed to create sandbox: {e}")
+            if self._maybe_committed(e):
+                # The create may have gone through before the failure: look it up instead of resending
+                sandbox_id = self.get_sandbox_account_id_by_name(sandbox_account_request.get("name"))
+                if sandbox_id:
+                    logger.warning("Create of '%s' failed (%s) but the sandbox exists: %s",
+                                   sandbox_account_request.get("name"), e, sandbox_id)
+                    return {"status": "success", "data": {"id": sandbox_id}}
+            logger.error("Failed to create sandbox: %s", e)
             return {"status": "failure", "error": str(e)}
 
+    @staticmethod
+    def _maybe_committed(error) -> bool:
+        """The request reached the server, so the account may exist despite the error"""
+        if isinstance(error, requests.exceptions.HTTPError):
+            return error.response is not None and error.response.status_code >= 500
+        return (isinstance(error, (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError))
+                and not isinstance(error, requests.exceptions.ConnectTimeout))
+
     def get_sandbox_account_id_by_name(self, name: str) -> str:
         endpoint = f"{self.base_url}/sandbox/accounts"
         params = {"_filter": f'name=="{name}"'}
         try:
-            logger.debug(f"Querying sandbox ID with filter: {params}")
-            response = requests.get(endpoint, headers=self._headers(), params=params)
-            response.raise_for_status()
-            result = response.json()
-            if result.get("results"):
-                sandbox_id = result["results"][0]["id"]
-                logger.info(f"Found sandbox ID: {sandbox_id} for name: {name}")
+            logger.debug("Querying sandbox ID with filter: %s", params)
+            for account in iter_results(self.session, endpoint, params=params):
+                sandbox_id = account["id"]
+                logger.info("Found sandbox ID: %s for name: %s", sandbox_id, name)
                 return sandbox_id
-            else:
-                logger.warning(f"No sandbox found with name: {name}")
-                return None
+            logger.warning("No sandbox found with name: %s", name)
+            return None
         except Exception as e:
-            logger.error(f"Error fetching sandbox ID: {e}")
+            logger.error("Error fetching sandbox ID: %s", e)
             return None
 
+    def iter_sandbox_accounts(self, params: dict = None, page_size: int = 500):
+        """Yield every sandbox account, paging through the collection"""
+        endpoint = f"{self.base_url}/sandbox/accounts"
+        logger.debug("Listing sandbox accounts with params: %s", params)
+        yield from iter_results(self.session, endpoint, params=params, page_size=page_size)
+
     def delete_sandbox_account(self, sandbox_id: str) -> bool:
         endpoint = f"{self.base_url}/sandbox/accounts/{sandbox_id}"
         try:
-            logger.debug(f"Deleting sandbox ID: {sandbox_id} at {endpoint}")
-            response = requests.delete(endpoint, headers=self._headers())
+            logger.debug("Deleting sandbox ID: %s at %s", sandbox_id, endpoint)
+            response = self.session.delete(endpoint)
             if response.status_code == 204:
-                logger.info(f"Sandbox ID {sandbox_id} deleted successfully.")
+                logger.info("Sandbox ID %s deleted successfully.", sandbox_id)
                 return True
             else:
-                logger.error(f"Failed to delete sandbox. Status code: {response.status_code}, Response: {response.text}")
+                logger.error("Failed to delete sandbox. Status code: %s, Response: %s", response.status_code, response.text)
                 return False
         except Exception as e:
-            logger.error(f"Error deleting sandbox: {e}")
+            logger.error("Error deleting sandbox: %s", e)
             return False
+
+    def create_many(self, sandbox_account_requests: list, workers: int = None) -> list:
+        """Create several sandbox accounts concurrently; results are in request order"""
+        workers = workers or self.pool_size
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.create_sandbox_account, sandbox_account_requests))
+
+    def delete_many(self, sandbox_ids: list, workers: int = None) -> dict:
+        """Delete several sandbox accounts concurrently; returns {sandbox_id: deleted}"""
+        workers = workers or self.pool_size
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(sandbox_ids, pool.map(self.delete_sandbox_account, sandbox_ids)))
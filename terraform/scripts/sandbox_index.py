@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Local name -> id index of CSP sandbox accounts.
+
+Loads every account in one paged sweep and answers lookups from memory, so
+tools resolving many names do not pay one filtered query per name. The index
+is persisted to sandbox_index.json. Within the TTL, refresh() only asks for
+accounts updated since the last sync. After the TTL it does a full sweep,
+which also drops accounts that have been deleted.
+
+Usage:
+  python3 sandbox_index.py refresh [--full]
+  python3 sandbox_index.py lookup lab-001 lab-002 ...
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+from lab_files import write_atomic
+from sandbox_api import SandboxAccountAPI
+import lab_trace
+
+BASE_URL = "https://csp.infoblox.com/v2"
+INDEX_FILE = "sandbox_index.json"
+DEFAULT_TTL = 3600
+
+# Field used for incremental refresh (server-side filter on last update time)
+UPDATED_FIELD = "updated_at"
+
+
+class SandboxIndex:
+    def __init__(self, api: SandboxAccountAPI, path: str = INDEX_FILE, ttl: int = DEFAULT_TTL):
+        self.api = api
+        self.path = path
+        self.ttl = ttl
+        self.accounts = {}      # name -> id
+        self.last_full = 0.0    # epoch of the last full sweep
+        self.cursor = None      # newest updated_at seen, for incremental refreshes
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            data = json.load(f)
+        self.accounts = data.get("accounts", {})
+        self.last_full = data.get("last_full", 0.0)
+        self.cursor = data.get("cursor")
+
+    def save(self):
+        if not self.path:
+            return
+        data = {"accounts": self.accounts, "last_full": self.last_full, "cursor": self.cursor}
+        write_atomic(self.path, json.dumps(data, indent=2, sort_keys=True))
+
+    def _apply(self, account):
+        name, account_id = account.get("name"), account.get("id")
+        if not name or not account_id:
+            return
+        if account.get("state") == "deleted":
+            self.accounts.pop(name, None)
+        else:
+            self.accounts[name] = account_id
+        updated = account.get(UPDATED_FIELD)
+        if updated and (self.cursor is None or updated > self.cursor):
+            self.cursor = updated
+
+    def refresh(self, full: bool = False) -> int:
+        """Refresh the index; returns the number of accounts fetched"""
+        expired = time.time() - self.last_full > self.ttl
+        if full or expired or self.cursor is None:
+            self.accounts = {}
+            self.cursor = None
+            params = None
+            self.last_full = time.time()
+        else:
+            params = {"_filter": f'{UPDATED_FIELD}>"{self.cursor}"'}
+
+        fetched = 0
+        for account in self.api.iter_sandbox_accounts(params):
+            self._apply(account)
+            fetched += 1
+        self.save()
+        return fetched
+
+    def lookup(self, name: str) -> str:
+        return self.accounts.get(name)
+
+    def lookup_many(self, names) -> dict:
+        return {name: self.accounts.get(name) for name in names}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local name -> id index of CSP sandbox accounts')
+    parser.add_argument('--index', default=INDEX_FILE, help=f'Index file (default: {INDEX_FILE})')
+    parser.add_argument('--ttl', type=int, default=DEFAULT_TTL, help=f'Seconds between full sweeps (default: {DEFAULT_TTL})')
+    sub = parser.add_subparsers(dest='command', required=True)
+    refresh = sub.add_parser('refresh', help='Update the index from CSP')
+    refresh.add_argument('--full', action='store_true', help='Force a full sweep')
+    lookup = sub.add_parser('lookup', help='Print ids for sandbox names')
+    lookup.add_argument('names', nargs='+')
+    args = parser.parse_args()
+
+    token = os.environ.get('Infoblox_Token')
+    if not token:
+        print("ERROR: Infoblox_Token not set in environment.")
+        sys.exit(1)
+
+    index = SandboxIndex(SandboxAccountAPI(base_url=BASE_URL, token=token), args.index, args.ttl)
+
+    if args.command == 'refresh':
+        start = time.monotonic()
+        fetched = index.refresh(full=args.full)
+        print(f"Fetched {fetched} accounts, index has {len(index.accounts)} names ({time.monotonic() - start:.1f}s)")
+    else:
+        if not index.accounts or time.time() - index.last_full > index.ttl:
+            index.refresh()
+        missing = 0
+        for name, account_id in index.lookup_many(args.names).items():
+            print(f"{name} {account_id or '-'}")
+            missing += account_id is None
+        sys.exit(1 if missing else 0)
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
@@ -0,0 +1,24 @@
+"""
+Security policy endpoint and field sets shared by triple_security_policy.py
+(clone, sync) and delete_security_policies.py, so the two agree on which
+fields are read-only and which make up a policy's network scope.
+"""
+
+BASE_URL = "https://csp.infoblox.com"
+POLICIES_ENDPOINT = f"{BASE_URL}/api/atcfw/v1/security_policies"
+
+# Read-only fields to strip when updating a policy via PUT
+READONLY_FIELDS = frozenset({
+    "id", "created_time", "updated_time", "is_default",
+    "agents", "dfps", "migration_status", "scope_expr", "tags",
+})
+
+# Network scope: DFPs and groups are exclusive per non-default policy.
+# Cleared before deletion, and left on the default policy when cloning.
+SCOPE_FIELDS = (
+    "dfp_services", "dfps", "network_lists", "roaming_device_groups",
+    "user_groups", "net_address_dfps",
+)
+
+# Fields to strip before cloning: read-only, scope, and per-policy identity
+STRIP_FIELDS = READONLY_FIELDS | set(SCOPE_FIELDS) | {"policy_id", "precedence", "description"}
@@ -2,17 +2,34 @@
 """
 Set Infoblox CSP Join Token via WAPI
 Connects Grid Master to Infoblox Portal
+
+With --watch, the Grid Master's host in CSP is polled on one keep-alive
+session (with backoff) until CSP reports it online, the same check
+host_readiness.py uses for the NIOS-X hosts. The grid host is looked up by
+its LAN1 address (GM_LAN1_IP from the terraform outputs, or --csp-address).
+The time it took is written to csp_join.json. Needs the CSP API key
+(TF_VAR_ddi_api_key or --api-key). With --status-only --watch the current
+csp_grid_setting is printed first, then the connection is awaited.
 """
 
 import requests
 import urllib3
 import sys
 import os
+import json
+import time
 import argparse
+from http_retry import BackoffPolicy
+from host_readiness import csp_host_probe
+from lab_files import write_atomic
+from tf_outputs import host_ips
+import lab_trace
 
 # Disable SSL warnings for self-signed certs
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+JOIN_RECORD_FILE = "csp_join.json"
+
 
 def read_join_token(token_file: str) -> str:
     """Read join token from file"""
@@ -98,6 +115,35 @@ def get_csp_status(gm_ip: str, username: str, password: str, wapi_version: str =
     return response.json()
 
 
+def watch_csp_connection(api_key: str, address: str, timeout: float = 900,
+                         base_delay: float = 2.0, max_delay: float = 15.0) -> dict:
+    """Poll the grid's CSP host until it is online; returns the timing record"""
+    http = requests.Session()   # one keep-alive connection for every poll
+    probe = csp_host_probe(http, api_key, address)
+    backoff = BackoffPolicy(base_delay, max_delay)
+    start = time.monotonic()
+    polls = 0
+    last = None
+    while True:
+        polls += 1
+        try:
+            connected, detail = probe()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # Errors while services restart after the join only mean "not yet"
+            connected, detail = False, f"error: {e}"
+        elapsed = time.monotonic() - start
+        if detail != last:
+            print(f"  CSP host {address}: {detail} (+{elapsed:.0f}s)", flush=True)
+            last = detail
+        if connected:
+            return {"address": address, "state": detail, "connected": True,
+                    "seconds_to_connect": round(elapsed, 1), "polls": polls}
+        if elapsed >= timeout:
+            return {"address": address, "state": detail, "connected": False,
+                    "seconds_waited": round(elapsed, 1), "polls": polls}
+        time.sleep(backoff.next_delay())
+
+
 def main():
     parser = argparse.ArgumentParser(description='Set Infoblox CSP Join Token')
     parser.add_argument('--gm', required=True, help='Grid Master IP or hostname')
@@ -106,6 +152,11 @@ def main():
     parser.add_argument('--token-file', default='join_token.txt', help='Path to join token file')
     parser.add_argument('--wapi-version', default='v2.12', help='WAPI version (default: v2.12)')
     parser.add_argument('--status-only', action='store_true', help='Only check status, do not set token')
+    parser.add_argument('--watch', action='store_true', help='Wait until the grid is connected to CSP and record how long it took')
+    parser.add_argument('--watch-timeout', type=float, default=900, help='Give up watching after this many seconds (default: 900)')
+    parser.add_argument('--api-key', default=os.getenv("TF_VAR_ddi_api_key"), help='CSP API key for --watch (default: $TF_VAR_ddi_api_key)')
+    parser.add_argument('--csp-address', default=None,
+                        help='Address of the grid host in CSP (default: GM_LAN1_IP from the terraform outputs)')
 
     args = parser.parse_args()
 
@@ -114,6 +165,16 @@ def main():
         print(f"ERROR: Token file not found: {args.token_file}")
         sys.exit(1)
 
+    if args.watch and not args.api_key:
+        print("ERROR: --watch needs the CSP API key (TF_VAR_ddi_api_key or --api-key)")
+        sys.exit(1)
+    csp_address = args.csp_address
+    if args.watch and not csp_address:
+        csp_address = host_ips().get("GM_LAN1_IP")
+        if not csp_address:
+            print("ERROR: --watch needs the grid's CSP address (GM_LAN1_IP from terraform or --csp-address)")
+            sys.exit(1)
+
     try:
         if args.status_only:
             print(f"Checking CSP status on {args.gm}...")
@@ -148,6 +209,17 @@ def main():
                 else:
                     print("  No CSP settings found")
 
+        if args.watch:
+            print(f"\nWaiting for {args.gm} to connect to CSP...")
+            record = watch_csp_connection(args.api_key, csp_address, timeout=args.watch_timeout)
+            record["gm"] = args.gm
+            write_atomic(JOIN_RECORD_FILE, json.dumps(record, indent=2) + "\n")
+            if not record["connected"]:
+                print(f"ERROR: Grid not connected to CSP after {record['seconds_waited']:.0f}s")
+                sys.exit(1)
+            print(f"Grid connected to CSP after {record['seconds_to_connect']:.0f}s "
+                  f"({record['polls']} polls), recorded in {JOIN_RECORD_FILE}")
+
     except requests.exceptions.HTTPError as e:
         print(f"HTTP Error: {e}")
         print(f"Response: {e.response.text}")
@@ -158,4 +230,5 @@ def main():
 
 
 if __name__ == "__main__":
+    lab_trace.install()
     main()
@@ -0,0 +1,38 @@
+import importlib
+
+import pytest
+
+
+@pytest.fixture
+def monitor(tmp_path, monkeypatch):
+    # sandbox_api opens SandboxAccount.log in the working directory on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("broker_pool_monitor")
+
+
+def test_cold_start_tops_up_to_low_watermark(monitor):
+    forecaster = monitor.PoolForecaster(window=300, lead_time=600)
+    forecaster.observe(available=5, allocated=0, now=0)
+
+    assert forecaster.arrival_rate() == 0
+    assert forecaster.shortfall(min_available=20) == 15
+    assert forecaster.shortfall(in_flight=10, min_available=20) == 5
+
+
+def test_drained_pool_without_observed_arrivals_prewarms(monitor):
+    forecaster = monitor.PoolForecaster(window=300, lead_time=600)
+    # The spike drained the pool before the monitor saw any arrivals
+    forecaster.observe(available=0, allocated=30, now=0)
+    forecaster.observe(available=0, allocated=30, now=15)
+
+    assert forecaster.arrival_rate() == 0
+    assert forecaster.shortfall() == 0
+    assert forecaster.shortfall(min_available=20) == 20
+
+
+def test_rate_driven_demand_above_watermark_wins(monitor):
+    forecaster = monitor.PoolForecaster(window=300, lead_time=600, safety=1.0)
+    forecaster.observe(available=10, allocated=0, now=0)
+    forecaster.observe(available=10, allocated=60, now=60)   # 1 allocation/s -> 600 over the lead time
+
+    assert forecaster.shortfall(min_available=20) == 590
@@ -0,0 +1,83 @@
+import random
+import threading
+import time
+
+import triple_security_policy as tsp
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakePolicies:
+    """Security policies kept in precedence order; inserting at a precedence shifts the ones after it"""
+
+    def __init__(self, jitter=0.005):
+        self.lock = threading.Lock()
+        self.order = [{"id": "0", "name": "Default Global Policy", "is_default": True, "rules": []}]
+        self.jitter = jitter
+        self.next_id = 1
+
+    def _place(self, policy, precedence):
+        # The default policy always stays last
+        self.order.insert(min(precedence - 1, len(self.order) - 1), policy)
+        for i, p in enumerate(self.order, start=1):
+            p["precedence"] = i
+
+    def post(self, url, headers=None, json=None):
+        time.sleep(random.uniform(0, self.jitter))
+        with self.lock:
+            if any(p["name"] == json["name"] for p in self.order):
+                return FakeResponse(409)
+            policy = dict(json, id=str(self.next_id))
+            self.next_id += 1
+            self._place(policy, json["precedence"])
+            return FakeResponse(201, {"results": dict(policy)})
+
+    def put(self, url, headers=None, json=None):
+        time.sleep(random.uniform(0, self.jitter))
+        policy_id = url.rsplit("/", 1)[-1]
+        with self.lock:
+            policy = next(p for p in self.order if p["id"] == policy_id)
+            self.order.remove(policy)
+            policy.update(json)
+            self._place(policy, json["precedence"])
+            return FakeResponse(200, {"results": dict(policy)})
+
+    def get(self, url, headers=None, params=None):
+        with self.lock:
+            offset, limit = params.get("_offset", 0), params["_limit"]
+            return FakeResponse(200, {"results": [dict(p) for p in self.order[offset:offset + limit]]})
+
+
+def test_concurrent_clones_end_in_precedence_order():
+    csp = FakePolicies()
+    configs = tsp.build_clone_configs(40)
+    random.seed(7)
+
+    created = tsp.create_clones(csp, {}, csp.order[0], configs, workers=8)
+
+    assert all(created)
+    names = [p["name"] for p in csp.order]
+    assert names == [c["name"] for c in configs] + ["Default Global Policy"]
+    assert [p["precedence"] for p in csp.order[:-1]] == [c["precedence"] for c in configs]
+
+
+def test_rerun_keeps_existing_clones_in_order():
+    csp = FakePolicies(jitter=0)
+    configs = tsp.build_clone_configs(5)
+    tsp.create_clones(csp, {}, csp.order[0], configs, workers=4)
+
+    created = tsp.create_clones(csp, {}, csp.order[0], configs, workers=4)
+
+    assert created == [None] * 5
+    assert [p["name"] for p in csp.order[:-1]] == [c["name"] for c in configs]
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Host IPs from the terraform outputs, shared by every script.
+
+`terraform output -json` runs once per state change: the parsed outputs are
+cached in tf_outputs_cache.json keyed on the lineage and serial of
+terraform.tfstate, which terraform bumps on every write. Later calls (in this
+process or any other script) read the cache while the state is unchanged.
+
+host_ips() maps the outputs to the environment variable names the scripts
+use (DC1_IP, GM_IP, ...). An IP set in the environment wins, as it did
+before the outputs were read; terraform fills in the hosts the environment
+does not set, and is not run at all when the environment sets every one.
+Hosts terraform does not manage, like GM2_IP, only come from the
+environment. Without a local state file (remote backend) nothing is cached
+and terraform runs on every call.
+
+Usage:
+  python3 tf_outputs.py            # print the IP map as export lines
+  python3 tf_outputs.py --refresh  # ignore the cache
+"""
+
+import os
+import re
+import json
+import argparse
+import subprocess
+
+from lab_files import write_atomic
+import lab_trace
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TERRAFORM_DIR = os.path.dirname(SCRIPT_DIR)
+STATE_FILE = os.path.join(TERRAFORM_DIR, "terraform.tfstate")
+CACHE_FILE = os.path.join(SCRIPT_DIR, "tf_outputs_cache.json")
+
+# terraform output -> environment variable read by the scripts
+TERRAFORM_OUTPUT_ENV = {
+    "client_public_ip": "DC1_IP",
+    "client_2_public_ip": "CLIENT_2_IP",
+    "gm_public_ip": "GM_IP",
+    "gm_lan1_private_ip": "GM_LAN1_IP",
+    "niosx_1_public_ip": "NIOSX_1_IP",
+    "niosx_2_public_ip": "NIOSX_2_IP",
+    "azure_win11_public_ip": "AZURE_WIN11_IP",
+    "azure_win11_2_public_ip": "AZURE_WIN11_2_IP",
+}
+
+# Hosts outside this terraform configuration, only ever read from the environment
+EXTERNAL_HOSTS = ("GM2_IP",)
+
+_memo = {}
+
+
+def state_key(state_path=STATE_FILE):
+    """"<lineage>:<serial>" of a local state file, or None without one"""
+    try:
+        with open(state_path, "r") as f:
+            head = f.read(4096)   # terraform writes serial and lineage first
+    except FileNotFoundError:
+        return None
+    serial = re.search(r'"serial":\s*(\d+)', head)
+    lineage = re.search(r'"lineage":\s*"([^"]*)"', head)
+    if not serial:
+        return None
+    return f"{lineage.group(1) if lineage else ''}:{serial.group(1)}"
+
+
+def _read_cache(cache_file, key):
+    try:
+        with open(cache_file, "r") as f:
+            cached = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return cached.get("outputs") if cached.get("state") == key else None
+
+
+def terraform_outputs(terraform_dir=TERRAFORM_DIR, cache_file=CACHE_FILE, refresh=False, env=None):
+    """{output name: value} from `terraform output -json`, cached per state serial"""
+    key = state_key(os.path.join(terraform_dir, "terraform.tfstate"))
+    if key is not None and not refresh:
+        if _memo.get(terraform_dir, (None,))[0] == key:
+            return _memo[terraform_dir][1]
+        outputs = _read_cache(cache_file, key)
+        if outputs is not None:
+            _memo[terraform_dir] = (key, outputs)
+            return outputs
+
+    try:
+        out = subprocess.run(["terraform", "output", "-json"], cwd=terraform_dir, env=env,
+                             capture_output=True, text=True, check=True).stdout
+    except FileNotFoundError:
+        # No terraform binary here: the IPs can only come from the environment
+        return {}
+    outputs = {name: output["value"] for name, output in json.loads(out or "{}").items()
+               if not output.get("sensitive")}
+    if key is not None:
+        write_atomic(cache_file, json.dumps({"state": key, "outputs": outputs}, indent=2) + "\n")
+        _memo[terraform_dir] = (key, outputs)
+    return outputs
+
+
+def host_ips(env=None, **kwargs):
+    """{IP variable: ip} from the environment, with the terraform outputs for unset hosts"""
+    env = os.environ if env is None else env
+    ips = {var: env[var] for var in (*TERRAFORM_OUTPUT_ENV.values(), *EXTERNAL_HOSTS) if env.get(var)}
+    if all(var in ips for var in TERRAFORM_OUTPUT_ENV.values()):
+        return ips
+    try:
+        outputs = terraform_outputs(**kwargs)
+    except subprocess.CalledProcessError as e:
+        print(f"⚠️ terraform output failed, using the environment: {e.stderr.strip()}", flush=True)
+        return ips
+    for name, value in outputs.items():
+        if name in TERRAFORM_OUTPUT_ENV and value:
+            ips.setdefault(TERRAFORM_OUTPUT_ENV[name], str(value))
+    return ips
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the lab host IPs from the terraform outputs')
+    parser.add_argument('--refresh', action='store_true', help='Run terraform output even if the cache is current')
+    args = parser.parse_args()
+
+    for var, ip in sorted(host_ips(refresh=args.refresh).items()):
+        print(f"export {var}={ip}")
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Run `terraform apply` and act on each host as soon as its IP is known.
+
+The apply runs with -json. Whenever a resource that carries a host IP
+(Elastic IPs, NIOS-X instances, Azure public IPs) reports apply_complete,
+its address is read from the local terraform.tfstate, which terraform
+persists periodically during the apply. Anything still unknown when the
+apply ends is taken from the final outputs message. Each IP triggers that
+host's Route 53 A record right away, so DNS for the AWS hosts is done while
+the slow Azure VMs are still being created.
+
+The IP map is written to host_ips.sh for the steps that follow.
+
+Usage:
+  python3 tf_stream.py                    # apply + per-host DNS records
+  python3 tf_stream.py --no-dns           # apply + IP map only
+  TF_STATE_PERSIST_INTERVAL=20 python3 tf_stream.py
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from lab_files import write_atomic
+from tf_outputs import TERRAFORM_DIR, TERRAFORM_OUTPUT_ENV
+from route53_records import record_name, route53_client, upsert_a_record
+import lab_trace
+
+STATE_FILE = os.path.join(TERRAFORM_DIR, "terraform.tfstate")
+IPS_FILE = "host_ips.sh"
+
+# resource address -> (state attribute, IP environment variable)
+IP_RESOURCES = {
+    "aws_eip.client_eip": ("public_ip", "DC1_IP"),
+    "aws_eip.client_2_eip": ("public_ip", "CLIENT_2_IP"),
+    "aws_eip.gm_eip": ("public_ip", "GM_IP"),
+    "aws_instance.niosx_1": ("public_ip", "NIOSX_1_IP"),
+    "aws_instance.niosx_2": ("public_ip", "NIOSX_2_IP"),
+    "azurerm_public_ip.win11": ("ip_address", "AZURE_WIN11_IP"),
+    "azurerm_public_ip.win11_2": ("ip_address", "AZURE_WIN11_2_IP"),
+}
+
+
+def state_attributes(state_path, addresses):
+    """{address: attributes} for managed resources in a local state file"""
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        # Missing, or caught mid-write: try again on the next poll
+        return {}
+    found = {}
+    for resource in state.get("resources", []):
+        if resource.get("mode") != "managed" or resource.get("module"):
+            continue
+        address = f"{resource['type']}.{resource['name']}"
+        if address in addresses and resource.get("instances"):
+            found[address] = resource["instances"][0].get("attributes", {})
+    return found
+
+
+class ApplyWatcher:
+    """Follow a terraform -json apply and call on_ip(var, ip) once per host IP"""
+
+    def __init__(self, on_ip, state_path=STATE_FILE, resources=IP_RESOURCES, poll=2.0):
+        self.on_ip = on_ip
+        self.state_path = state_path
+        self.resources = resources
+        self.poll = poll
+        self.ips = {}
+        self.waiting = set()      # completed resources whose IP is not in the state yet
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.t0 = time.monotonic()
+
+    def _found(self, var, ip):
+        with self.lock:
+            if var in self.ips or not ip:
+                return
+            self.ips[var] = ip
+        print(f"📍 {var}={ip} at +{time.monotonic() - self.t0:.0f}s", flush=True)
+        self.on_ip(var, ip)
+
+    def _poll_state(self):
+        while not self.done.is_set():
+            with self.lock:
+                waiting = set(self.waiting)
+            if waiting:
+                for address, attributes in state_attributes(self.state_path, waiting).items():
+                    attribute, var = self.resources[address]
+                    if attributes.get(attribute):
+                        with self.lock:
+                            self.waiting.discard(address)
+                        self._found(var, attributes[attribute])
+            self.done.wait(self.poll)
+
+    def handle(self, message):
+        kind = message.get("type")
+        if kind == "apply_complete":
+            address = message.get("hook", {}).get("resource", {}).get("addr")
+            if address in self.resources:
+                with self.lock:
+                    self.waiting.add(address)
+        elif kind == "outputs":
+            for name, output in message.get("outputs", {}).items():
+                if name in TERRAFORM_OUTPUT_ENV and not output.get("sensitive"):
+                    self._found(TERRAFORM_OUTPUT_ENV[name], output.get("value"))
+        if message.get("@level") in ("error", "warn") or kind in ("apply_complete", "apply_errored", "change_summary"):
+            print(f"   {message.get('@message', '')}", flush=True)
+
+    def run(self, command, cwd=TERRAFORM_DIR):
+        poller = threading.Thread(target=self._poll_state, daemon=True)
+        poller.start()
+        proc = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, text=True, bufsize=1)
+        try:
+            for line in proc.stdout:
+                try:
+                    self.handle(json.loads(line))
+                except ValueError:
+                    print(line.rstrip(), flush=True)
+            return proc.wait()
+        finally:
+            self.done.set()
+            poller.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='terraform apply with per-host steps as IPs become known')
+    parser.add_argument('--no-dns', action='store_true', help='Do not create Route 53 records')
+    parser.add_argument('--poll', type=float, default=2.0, help='State file poll interval (default: 2s)')
+    parser.add_argument('--ips-file', default=IPS_FILE, help=f'IP map written at the end (default: {IPS_FILE})')
+    args = parser.parse_args()
+
+    route53 = None if args.no_dns else route53_client()
+    hosted_zone_id = os.getenv("DEMO_HOSTED_ZONE_ID")
+    if not args.no_dns and (route53 is None or not hosted_zone_id):
+        sys.exit("❌ DEMO_AWS_ACCESS_KEY_ID, DEMO_AWS_SECRET_ACCESS_KEY and DEMO_HOSTED_ZONE_ID must be set (or --no-dns)")
+
+    pool = ThreadPoolExecutor(max_workers=4)
+    failures = []
+
+    def create_record(var, ip):
+        fqdn = record_name(var)
+        try:
+            status = upsert_a_record(route53, hosted_zone_id, fqdn, ip)
+            print(f"✅ A record {fqdn} -> {ip} ({status})", flush=True)
+        except Exception as e:
+            failures.append(fqdn)
+            print(f"❌ Failed to create A record {fqdn}: {e}", flush=True)
+
+    def on_ip(var, ip):
+        if route53:
+            pool.submit(create_record, var, ip)
+
+    watcher = ApplyWatcher(on_ip, poll=args.poll)
+    rc = watcher.run(["terraform", "apply", "-auto-approve", "-input=false", "-json"])
+    pool.shutdown(wait=True)
+
+    write_atomic(args.ips_file, "".join(f"export {var}={ip}\n" for var, ip in sorted(watcher.ips.items())))
+    print(f"💾 {len(watcher.ips)} host IPs written to {args.ips_file}", flush=True)
+    missing = sorted(var for _, var in IP_RESOURCES.values() if var not in watcher.ips)
+    if missing:
+        print(f"⚠️ No IP seen for: {', '.join(missing)}", flush=True)
+    if rc != 0:
+        sys.exit(f"❌ terraform apply failed (exit {rc})")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    lab_trace.install()
+    main()
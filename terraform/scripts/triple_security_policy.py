@@ -4,31 +4,47 @@ Fetches the default security policy from Infoblox CSP and clones it 3 times
 (TD-Policy-1, TD-Policy-2, TD-Policy-3) for lab exercises.
 Clones inherit all rules (threat feeds, custom lists) but not network scope
 (DFPs, endpoint groups, user groups stay on the default catch-all policy).
+
+For scale testing, --count creates up to MAX_CLONES policies, --workers at
+a time. CSP shifts the other policies when one is inserted at a precedence,
+so concurrent creates can land out of order: afterwards the clones are
+listed and any whose precedence is off is moved with a PUT (concurrently,
+then one at a time in precedence order for whatever is still off), so every
+run ends with the same order:
+  python3 triple_security_policy.py --count 200 --workers 16
+
+--sync re-aligns the rules of existing clones with the default policy after
+it changes. Rule sets are compared by content hash and only clones whose
+hash differs are updated:
+  python3 triple_security_policy.py --sync
 """
 
 import os
 import sys
 import json
+import hashlib
+import argparse
 import requests
+from concurrent.futures import ThreadPoolExecutor
+
+from csp_pagination import iter_results
+from http_retry import RetryingSession
+from security_policies import POLICIES_ENDPOINT, READONLY_FIELDS, STRIP_FIELDS
+import lab_trace
 
-BASE_URL = "https://csp.infoblox.com"
-POLICIES_ENDPOINT = f"{BASE_URL}/api/atcfw/v1/security_policies"
+CLONE_PREFIX = "TD-Policy-"
+MAX_CLONES = 500
 
-# Read-only and default-only fields to strip before cloning.
-# Network scope (dfp_services, roaming_device_groups, user_groups) stays on
-# the default policy since DFPs/groups are exclusive per non-default policy.
-STRIP_FIELDS = {
-    "id", "created_time", "updated_time", "policy_id", "is_default",
-    "agents", "dfps", "migration_status", "scope_expr", "tags",
-    "user_groups", "roaming_device_groups", "dfp_services",
-    "net_address_dfps", "network_lists", "precedence", "description",
-}
 
-CLONE_CONFIGS = [
-    {"name": "TD-Policy-1", "precedence": 1},
-    {"name": "TD-Policy-2", "precedence": 2},
-    {"name": "TD-Policy-3", "precedence": 3},
-]
+def build_clone_configs(count, prefix=CLONE_PREFIX, start_precedence=1):
+    """Clone names and precedences, numbered in order so reruns assign the same precedence"""
+    return [
+        {"name": f"{prefix}{i + 1}", "precedence": start_precedence + i}
+        for i in range(count)
+    ]
+
+
+CLONE_CONFIGS = build_clone_configs(3)
 
 
 def get_api_key():
@@ -41,11 +57,7 @@ def get_api_key():
 
 def fetch_default_policy(headers):
     print("Fetching security policies...")
-    resp = requests.get(POLICIES_ENDPOINT, headers=headers)
-    resp.raise_for_status()
-    results = resp.json().get("results", [])
-
-    for policy in results:
+    for policy in iter_results(requests, POLICIES_ENDPOINT, headers=headers):
         if policy.get("is_default"):
             print(f"Found default policy: '{policy.get('name')}' (id={policy.get('id')})")
             return policy
@@ -54,7 +66,15 @@ def fetch_default_policy(headers):
     sys.exit(1)
 
 
-def clone_policy(headers, base_policy, name, precedence):
+def find_policy(http, headers, name):
+    """The policy with this name, or None"""
+    for policy in iter_results(http, POLICIES_ENDPOINT, headers=headers, params={"_filter": f'name=="{name}"'}):
+        if policy.get("name") == name:
+            return policy
+    return None
+
+
+def clone_policy(headers, base_policy, name, precedence, http=requests):
     payload = {k: v for k, v in base_policy.items() if k not in STRIP_FIELDS}
     payload["name"] = name
     payload["precedence"] = precedence
@@ -67,39 +87,176 @@ def clone_policy(headers, base_policy, name, precedence):
     payload["net_address_dfps"] = []
 
     print(f"Creating policy '{name}' with precedence {precedence}...")
-    resp = requests.post(POLICIES_ENDPOINT, headers=headers, json=payload)
+    try:
+        resp = http.post(POLICIES_ENDPOINT, headers=headers, json=payload)
+    except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
+        # The POST is not resent, since it may have been committed: check whether it was
+        result = find_policy(http, headers, name)
+        if result is None:
+            raise
+        print(f"  Created (found after a failed response, id={result.get('id', 'n/a')})")
+        return result
     if resp.status_code == 409:
         print(f"  Policy '{name}' already exists, skipping.")
         return None
+    if resp.status_code >= 500:
+        result = find_policy(http, headers, name)
+        if result is not None:
+            print(f"  Created (found after HTTP {resp.status_code}, id={result.get('id', 'n/a')})")
+            return result
     resp.raise_for_status()
     result = resp.json().get("results", resp.json())
     print(f"  Created successfully (id={result.get('id', 'n/a')})")
     return result
 
 
+def set_precedence(http, headers, policy, precedence):
+    payload = {k: v for k, v in policy.items() if k not in READONLY_FIELDS}
+    payload["precedence"] = precedence
+    resp = http.put(f"{POLICIES_ENDPOINT}/{policy['id']}", headers=headers, json=payload)
+    resp.raise_for_status()
+
+
+def misplaced_clones(http, headers, configs):
+    """[(policy, wanted precedence)] for clones whose current precedence is off, lowest first"""
+    wanted = {c["name"]: c["precedence"] for c in configs}
+    current = {p["name"]: p for p in iter_results(http, POLICIES_ENDPOINT, headers=headers)
+               if p.get("name") in wanted}
+    return [(current[name], precedence) for name, precedence in sorted(wanted.items(), key=lambda i: i[1])
+            if name in current and current[name].get("precedence") != precedence]
+
+
+def fix_precedences(http, headers, configs, workers=8):
+    """Move clones to their configured precedence; returns how many PUTs it took"""
+    moves = 0
+    misplaced = misplaced_clones(http, headers, configs)
+    if misplaced:
+        print(f"Fixing precedence of {len(misplaced)} clone(s)...")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda m: set_precedence(http, headers, *m), misplaced))
+        moves += len(misplaced)
+    # Concurrent moves shift each other too; whatever is still off is moved
+    # lowest precedence first, which only shifts the clones after it
+    for _ in range(len(configs)):
+        misplaced = misplaced_clones(http, headers, configs)
+        if not misplaced:
+            return moves
+        set_precedence(http, headers, *misplaced[0])
+        moves += 1
+    misplaced = misplaced_clones(http, headers, configs)
+    if misplaced:
+        raise RuntimeError(f"{len(misplaced)} clone(s) still out of precedence order, e.g. "
+                           f"'{misplaced[0][0]['name']}' at {misplaced[0][0].get('precedence')}")
+    return moves
+
+
+def create_clones(http, headers, base_policy, configs, workers=8):
+    """Create the clones concurrently, then put them in precedence order; returns the create results"""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        created = list(pool.map(lambda c: clone_policy(headers, base_policy, c["name"], c["precedence"], http),
+                                configs))
+    fix_precedences(http, headers, configs, workers)
+    return created
+
+
+def normalize_rules(rules):
+    """Rules in order, each with sorted keys and empty values dropped"""
+    return [
+        {k: v for k, v in sorted(rule.items()) if v not in (None, "", [], {})}
+        for rule in rules or []
+    ]
+
+
+def rules_hash(rules):
+    canonical = json.dumps(normalize_rules(rules), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def update_rules(http, headers, policy, rules):
+    payload = {k: v for k, v in policy.items() if k not in READONLY_FIELDS}
+    payload["rules"] = rules
+    print(f"Updating rules of '{policy['name']}' (id={policy['id']})...")
+    resp = http.put(f"{POLICIES_ENDPOINT}/{policy['id']}", headers=headers, json=payload)
+    resp.raise_for_status()
+
+
+def sync_policies(headers, prefix=CLONE_PREFIX, workers=8):
+    """Copy the default policy's rules to every policy named prefix*, where they differ"""
+    print("Fetching security policies...")
+    source = None
+    targets = []
+    for policy in iter_results(requests, POLICIES_ENDPOINT, headers=headers):
+        if policy.get("is_default"):
+            source = policy
+        elif policy.get("name", "").startswith(prefix):
+            targets.append(policy)
+
+    if source is None:
+        print("ERROR: No default security policy found.")
+        sys.exit(1)
+
+    source_hash = rules_hash(source.get("rules"))
+    print(f"Source '{source.get('name')}' rules hash {source_hash[:12]}")
+    stale = [p for p in targets if rules_hash(p.get("rules")) != source_hash]
+    print(f"{len(targets)} policies named '{prefix}*', {len(stale)} out of sync")
+
+    if stale:
+        http = RetryingSession(pool_size=workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda p: update_rules(http, headers, p, source.get("rules", [])), stale))
+
+    print(f"\nSynced {len(stale)}, already in sync {len(targets) - len(stale)}.")
+    print("Done.")
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Clone the default security policy for lab exercises')
+    parser.add_argument('--count', type=int, default=len(CLONE_CONFIGS),
+                        help=f'Number of clones (default: {len(CLONE_CONFIGS)}, max: {MAX_CLONES})')
+    parser.add_argument('--prefix', default=CLONE_PREFIX, help=f'Clone name prefix (default: {CLONE_PREFIX})')
+    parser.add_argument('--start-precedence', type=int, default=1, help='Precedence of the first clone (default: 1)')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent requests (default: 8)')
+    parser.add_argument('--sync', action='store_true',
+                        help='Update rules of existing prefix* policies that differ from the default policy')
+    args = parser.parse_args()
+
+    if not 1 <= args.count <= MAX_CLONES:
+        print(f"ERROR: --count must be between 1 and {MAX_CLONES}.")
+        sys.exit(1)
+
     api_key = get_api_key()
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Token {api_key}",
     }
 
+    if args.sync:
+        sync_policies(headers, args.prefix, args.workers)
+        return
+
     default_policy = fetch_default_policy(headers)
+    configs = build_clone_configs(args.count, args.prefix, args.start_precedence)
 
-    for config in CLONE_CONFIGS:
-        clone_policy(headers, default_policy, config["name"], config["precedence"])
+    http = RetryingSession(pool_size=args.workers)
+    created = create_clones(http, headers, default_policy, configs, args.workers)
 
-    # Verify final state
+    # Summarize from the create responses instead of re-listing every policy
     print("\nFinal policy list:")
-    resp = requests.get(POLICIES_ENDPOINT, headers=headers)
-    resp.raise_for_status()
-    for p in sorted(resp.json()["results"], key=lambda x: x["precedence"]):
-        default = " (DEFAULT)" if p.get("is_default") else ""
-        rules = len(p.get("rules", []))
-        print(f"  prec={p['precedence']}  name='{p['name']}'{default}  rules={rules}")
+    default_rules = len(default_policy.get("rules", []))
+    print(f"  prec={default_policy.get('precedence')}  name='{default_policy.get('name')}' (DEFAULT)  rules={default_rules}")
+    skipped = 0
+    for config, result in zip(configs, created):
+        if result is None:
+            skipped += 1
+            print(f"  prec={config['precedence']}  name='{config['name']}'  (already existed)")
+            continue
+        rules = len(result.get("rules", []))
+        print(f"  prec={config['precedence']}  name='{result.get('name', config['name'])}'  rules={rules}")
 
-    print("\nDone.")
+    print(f"\nCreated {len(configs) - skipped}, skipped {skipped}.")
+    print("Done.")
 
 
 if __name__ == "__main__":
+    lab_trace.install()
     main()